@@ -10,26 +10,89 @@ Version: 3.0.0 - Enterprise Role-Based Access Control System
 
 import json
 import os
-from flask import Flask, jsonify, send_from_directory, request
+import re
+import mmap
+import hmac
+import secrets
+from flask import Flask, jsonify, send_from_directory, request, g, make_response
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
-import hashlib
 import time
 import threading
+import queue
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from collections import defaultdict, namedtuple
 from datetime import datetime
-import pickle
-import numpy as np
+from fast_sha256 import (
+    sha256, sha256_digest, sha256_hexdigest, poh_chain,
+    BACKEND as SHA256_BACKEND, OPENSSL_BACKED, OPENSSL_VERSION
+)
 
 # ============================================================================
 # IMPORT MODULES
 # ============================================================================
 
+if not OPENSSL_BACKED:
+    print("⚠️  hashlib is not backed by OpenSSL. Block hashing runs on the slow built-in SHA-256.")
+elif OPENSSL_VERSION and OPENSSL_VERSION < (3, 0, 0):
+    print(f"⚠️  SHA-256 backend: {SHA256_BACKEND} (OpenSSL {'.'.join(map(str, OPENSSL_VERSION))}; 3.0+ recommended)")
+else:
+    print(f"✅ SHA-256 backend: {SHA256_BACKEND}")
+
+# Import orjson for fast ledger serialization (optional)
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+    print("✅ orjson loaded")
+except ImportError:
+    print("⚠️  orjson not found. Using standard json for ledgers.")
+    ORJSON_AVAILABLE = False
+
+# Import Numba for the JIT-compiled verification kernel (optional)
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+    print("✅ Numba loaded")
+except ImportError:
+    print("⚠️  Numba not found. Chain verification runs in pure Python.")
+    NUMBA_AVAILABLE = False
+
+# Import Flask-Compress for gzip/brotli responses (optional)
+try:
+    from flask_compress import Compress
+    COMPRESSION_AVAILABLE = True
+    print("✅ Flask-Compress loaded")
+except ImportError:
+    print("⚠️  Flask-Compress not found. Responses are sent uncompressed.")
+    COMPRESSION_AVAILABLE = False
+
+# Import MessagePack for the binary archive format (optional)
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+    print("✅ MessagePack loaded")
+except ImportError:
+    print("⚠️  MessagePack not found. Archives are written as JSON.")
+    MSGPACK_AVAILABLE = False
+
+# Import ijson for streaming archive metadata extraction (optional)
+try:
+    import ijson
+    IJSON_AVAILABLE = True
+    print("✅ ijson loaded")
+except ImportError:
+    print("⚠️  ijson not found. Archives are fully parsed for metadata.")
+    IJSON_AVAILABLE = False
+
 # Import authentication database with RBAC
 try:
     from auth_db import (
-        register_user, verify_user, create_session, verify_token, delete_session,
-        get_user_count, get_user_role, is_admin, get_all_users, update_user_role,
+        register_user, verify_user, create_session, verify_session,
+        delete_session, get_user_count, get_user_role, get_all_users, update_user_role,
         toggle_user_status, assign_uav, unassign_uav, get_user_uavs,
-        get_uav_assignments, is_uav_assigned_to_user, log_activity,
+        get_uav_assignments, log_activity,
         get_login_history, get_activity_log, get_system_stats as get_auth_stats
     )
     AUTH_SYSTEM_AVAILABLE = True
@@ -38,6 +101,9 @@ except ImportError as e:
     print(f"⚠️  Authentication system not found: {e}")
     AUTH_SYSTEM_AVAILABLE = False
 
+# Short-lived token cache in front of the auth database
+from auth_cache import TTLCache, token_key
+
 # Import Smart Contracts
 try:
     from smart_contracts import (
@@ -55,7 +121,7 @@ except ImportError:
 
 # Import Anomaly Detection
 try:
-    from anomaly_detection import AnomalyDetector
+    from anomaly_detection import AnomalyDetector, telemetry_columns
     ANOMALY_DETECTION_AVAILABLE = True
     print("✅ Anomaly Detection loaded")
 except ImportError:
@@ -72,6 +138,16 @@ COUNT_FILE = 'flight_count.txt'
 ACTIVE_LEDGERS_DIR = 'active_ledgers'
 MODELS_DIR = 'models'
 STATIC_DIR = 'static'
+LEDGER_FLUSH_INTERVAL = 0.1   # seconds of mined blocks batched into one fsync
+STATIC_MAX_AGE = 300         # seconds browsers may cache static assets (revalidated via ETag)
+STATIC_ASSET_MAX_AGE = 604800  # seconds browsers may cache content-versioned assets (?v=...)
+TRAINING_FLIGHT_LIMIT = 500   # most recent archives used to train the anomaly detector
+ARCHIVE_FORMAT = 'json'       # 'json' or 'msgpack' (smaller, faster to parse; needs msgpack)
+ARCHIVE_EXTENSIONS = ('.json', '.msgpack')  # both formats are always readable
+MMAP_MIN_SIZE = 64 * 1024     # archives below this size are read directly instead of mapped
+RESPONSE_CACHE_TTL = 5        # seconds list_flights / system_status results are reused
+ARCHIVE_LOAD_WORKERS = min(16, (os.cpu_count() or 1) * 2)  # threads loading archives for training
+ARCHIVE_INDEX_FILE = os.path.join(ARCHIVE_DIR, '_index.json')  # persisted flight metadata
 
 # UAV Database (SUPI -> Long-term Key mapping)
 UAV_DB = {
@@ -90,6 +166,52 @@ for directory in [ARCHIVE_DIR, ACTIVE_LEDGERS_DIR, MODELS_DIR, STATIC_DIR]:
 # AUTHENTICATION MIDDLEWARE
 # ============================================================================
 
+# token hash -> (generation, (username, role, assigned UAV set)).
+# Entries are dropped on logout, and every change to a user's role, status
+# or UAV assignments bumps that user's generation so their cached
+# identities go stale immediately instead of after the TTL.
+token_cache = TTLCache(maxsize=10000, ttl=30)
+_user_generations = defaultdict(int)
+_user_generations_lock = threading.Lock()
+
+def invalidate_user(username):
+    """Discards every cached identity of a user."""
+    with _user_generations_lock:
+        _user_generations[username] += 1
+
+def resolve_user(token):
+    """Returns (username, role, frozenset of assigned UAVs) for a valid token, or None."""
+    key = token_key(token)
+    cached = token_cache.get(key)
+    if cached is not None:
+        generation, identity = cached
+        if generation == _user_generations[identity[0]]:
+            return identity
+        username = identity[0]
+    else:
+        # First sight of this token: look up whose it is
+        session = verify_session(token)
+        if not session:
+            return None
+        username = session[0]
+    
+    # Read the generation before the role and UAVs, so a change committed
+    # meanwhile leaves this entry stale instead of caching old data under
+    # the new generation
+    generation = _user_generations[username]
+    session = verify_session(token)
+    if not session:
+        return None
+    
+    username, role = session
+    identity = (
+        username,
+        role,
+        frozenset(uav['uav_supi'] for uav in get_user_uavs(username))
+    )
+    token_cache.set(key, (generation, identity))
+    return identity
+
 def require_auth(f):
     """Decorator to require authentication"""
     def decorated_function(*args, **kwargs):
@@ -100,11 +222,12 @@ def require_auth(f):
         if not token:
             return jsonify({'error': 'No token provided'}), 401
         
-        username = verify_token(token)
-        if not username:
+        identity = resolve_user(token)
+        if not identity:
             return jsonify({'error': 'Invalid or expired token'}), 401
         
-        request.current_user = username
+        request.current_user = identity[0]
+        g.identity = identity
         return f(*args, **kwargs)
     
     decorated_function.__name__ = f.__name__
@@ -120,14 +243,16 @@ def require_admin(f):
         if not token:
             return jsonify({'error': 'No token provided'}), 401
         
-        username = verify_token(token)
-        if not username:
+        identity = resolve_user(token)
+        if not identity:
             return jsonify({'error': 'Invalid or expired token'}), 401
         
-        if not is_admin(username):
+        username, role, _ = identity
+        if role != 'admin':
             return jsonify({'error': 'Admin access required'}), 403
         
         request.current_user = username
+        g.identity = identity
         return f(*args, **kwargs)
     
     decorated_function.__name__ = f.__name__
@@ -137,32 +262,115 @@ def require_admin(f):
 # BLOCKCHAIN & CRYPTOGRAPHIC FUNCTIONS
 # ============================================================================
 
+# Canonical JSON encoder shared by every hash on the chain. Built once because
+# json.dumps() constructs a fresh encoder per call whenever options are passed.
+# The output must stay byte-identical to json.dumps(sort_keys=True,
+# separators=(',', ':')): archived hashes and the browser verifier depend on it.
+# That is why hashing never goes through orjson: it writes non-ASCII as raw
+# UTF-8 where the stdlib escapes it (\u00e9), prints floats such as 1e+16 as
+# 1e16, turns NaN into null and rejects integers beyond 64 bits.
+_canonical_encoder = json.JSONEncoder(sort_keys=True, separators=(',', ':'))
+
+def canonical_json(obj):
+    """Returns the canonical UTF-8 encoded JSON of obj used for hashing."""
+    return _canonical_encoder.encode(obj).encode()
+
+def dumps_json(obj, newline=False):
+    """Serializes obj to compact JSON bytes for ledger files (never for hashing)."""
+    if ORJSON_AVAILABLE:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_APPEND_NEWLINE if newline else None)
+        except TypeError:
+            pass
+    data = json.dumps(obj, separators=(',', ':')).encode()
+    return data + b'\n' if newline else data
+
+def loads_json(data):
+    """Parses JSON text or bytes, using orjson when available."""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def load_chain(path):
+    """Loads an archived chain, parsing straight from a memory-mapped file."""
+    loads = _load_msgpack if path.endswith('.msgpack') else loads_json
+    
+    with open(path, 'rb') as f:
+        # Small archives are cheaper to read than to map (mmap also cannot
+        # map an empty file; the parser reports that case)
+        if os.fstat(f.fileno()).st_size < MMAP_MIN_SIZE:
+            return loads(f.read())
+        
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if ORJSON_AVAILABLE or loads is _load_msgpack:
+                with memoryview(mm) as view:
+                    return loads(view)
+            return json.loads(mm[:])
+
+def _load_msgpack(data):
+    """Parses a MessagePack archive."""
+    if not MSGPACK_AVAILABLE:
+        raise ValueError('MessagePack archive found but msgpack is not installed')
+    return msgpack.unpackb(data, raw=False)
+
+def dump_archive(chain):
+    """Serializes a chain in ARCHIVE_FORMAT; returns (file extension, bytes)."""
+    if ARCHIVE_FORMAT == 'msgpack' and MSGPACK_AVAILABLE:
+        return '.msgpack', msgpack.packb(chain, use_bin_type=True)
+    return '.json', dumps_json(chain)
+
+# Hashed fields of every block mined here, already in sorted key order
+BLOCK_FIELDS = ('event_log', 'index', 'previous_hash', 'timestamp', 'transactions')
+
 def hash_block(block):
     """Calculates the SHA-256 hash of a block."""
-    temp_block = block.copy()
-    if 'current_hash' in temp_block:
-        del temp_block['current_hash'] 
-    block_string = json.dumps(temp_block, sort_keys=True, separators=(',', ':'))
-    return hashlib.sha256(block_string.encode()).hexdigest()
+    # Fast path: gather the known fields directly instead of filtering every
+    # key; blocks with any other shape (e.g. legacy archives) take the
+    # generic path so the hash always covers every key but current_hash
+    if len(block) - ('current_hash' in block) == len(BLOCK_FIELDS):
+        try:
+            return sha256_hexdigest(canonical_json({k: block[k] for k in BLOCK_FIELDS}))
+        except KeyError:
+            pass
+    
+    temp_block = {k: v for k, v in block.items() if k != 'current_hash'}
+    return sha256_hexdigest(canonical_json(temp_block))
+
+def hash_block_payload(block):
+    """
+    Hashes a block that has no current_hash yet.
+
+    Used while mining: the hash is computed before current_hash is stored,
+    so the block is serialized as-is without building a filtered copy.
+    """
+    return sha256_hexdigest(canonical_json(block))
+
+# SHA-256 states already primed with each UAV's long-term key; every
+# derivation copies the state instead of re-hashing the key
+_key_hash_prefix = {key: sha256(key.encode('utf-8')) for key in UAV_DB.values()}
 
-def calculate_session_key_simulated(long_term_key, rand):
-    """Simulates the derivation of the Session Key (KTx)."""
-    combined = (long_term_key + str(rand)).encode('utf-8')
-    return hashlib.sha256(combined).hexdigest()[:16]
+def keyed_sha256_hexdigest(long_term_key, data):
+    """Returns SHA-256(long_term_key + data) as hex, reusing the primed key state."""
+    prefix = _key_hash_prefix.get(long_term_key)
+    h = prefix.copy() if prefix is not None else sha256(long_term_key.encode('utf-8'))
+    h.update(data)
+    return h.hexdigest()
+
+# Pending challenge of a flight between authentication steps 1 and 2;
+# xres_star is kept encoded for the constant-time comparison
+AuthVec = namedtuple('AuthVec', 'xres_star ktx rand')
 
 def generate_auth_vector_simulated(uav_supi, long_term_key):
     """Simulates the server generating the Authentication Vector (AV)."""
-    rand = int(time.time() * 1000) 
-    autn_data = (long_term_key + uav_supi + str(rand)).encode('utf-8')
-    autn = hashlib.sha256(autn_data).hexdigest()
-    xres_data = (long_term_key + str(rand) + 'Expected').encode('utf-8')
-    xres_star = hashlib.sha256(xres_data).hexdigest()[:10]
-    return rand, autn, xres_star, calculate_session_key_simulated(long_term_key, rand)
-
-def calculate_res_star_simulated(long_term_key, rand):
-    """Calculates the expected response (RES*)."""
-    xres_data = (long_term_key + str(rand) + 'Expected').encode('utf-8')
-    return hashlib.sha256(xres_data).hexdigest()[:10]
+    # Unpredictable challenge; 53 bits keeps it exact as a JSON number in the browser
+    rand = secrets.randbits(53)
+    
+    # Clients derive RES* from str(rand), so the decimal form is encoded once and reused
+    rand_bytes = str(rand).encode('ascii')
+    autn = keyed_sha256_hexdigest(long_term_key, uav_supi.encode('utf-8') + rand_bytes)
+    xres_star = keyed_sha256_hexdigest(long_term_key, rand_bytes + b'Expected')[:10]
+    ktx = keyed_sha256_hexdigest(long_term_key, rand_bytes)[:16]
+    return rand, autn, xres_star, ktx
 
 # ============================================================================
 # EPOH CORE ENGINE
@@ -173,34 +381,58 @@ class EPOH_Core:
     
     def __init__(self, difficulty=2):
         self.difficulty = difficulty
-        self.latest_hash = '0' * 64
+        self.latest_hash = bytes(32)  # raw 32-byte PoH state, hex only at the JSON boundary
         self.sequence_count = 0
+    
+    @classmethod
+    def specialize(cls, difficulty):
+        """
+        Returns an EPOH_Core subclass fixed to one difficulty.
         
-    def generate_sequential_hash(self):
-        """Generates the next hash in the PoH sequence."""
-        data = self.latest_hash.encode('utf-8')
-        new_hash = hashlib.sha256(data).hexdigest()
-        self.latest_hash = new_hash
-        self.sequence_count += 1
-        return new_hash
+        For the default difficulty of 2 the PoH step is unrolled into a
+        double SHA-256, avoiding the generic loop for every transaction.
+        """
+        specialized = cls.__dict__.get('_specialized')
+        if specialized is None:
+            specialized = cls._specialized = {}
+        
+        if difficulty not in specialized:
+            if difficulty == 2:
+                def advance(self, state, _sha256=sha256):
+                    return _sha256(_sha256(state).digest()).digest()
+            else:
+                def advance(self, state, _steps=difficulty):
+                    return poh_chain(state, _steps)
+            
+            def __init__(self):
+                cls.__init__(self, difficulty)
+            
+            specialized[difficulty] = type(f'{cls.__name__}_D{difficulty}', (cls,), {
+                '__init__': __init__,
+                'advance': advance
+            })
+        
+        return specialized[difficulty]
+    
+    def advance(self, state):
+        """Applies difficulty sequential hashes to a raw PoH state."""
+        return poh_chain(state, self.difficulty)
         
     def embed_transaction(self, data_payload):
         """Embeds a transaction into the PoH sequence."""
-        data_string = json.dumps(data_payload, sort_keys=True, separators=(',', ':'))
-        combined_data = (self.latest_hash + data_string).encode('utf-8')
-        self.latest_hash = hashlib.sha256(combined_data).hexdigest()
+        self.latest_hash = sha256_digest(self.latest_hash + canonical_json(data_payload))
         self.sequence_count += 1
-        return time.time(), self.latest_hash
+        return time.time(), self.latest_hash.hex()
         
     def create_block(self, transactions, previous_hash, current_chain_length, flight_id):
         """Creates a new blockchain block with EPOH temporal proofs."""
-        self.latest_hash = previous_hash
+        self.latest_hash = bytes.fromhex(previous_hash)
         self.sequence_count = 0
         event_log = []
         
         for tx in transactions:
-            for _ in range(self.difficulty): 
-                self.generate_sequential_hash()
+            self.latest_hash = self.advance(self.latest_hash)
+            self.sequence_count += self.difficulty
             tx_time, tx_hash = self.embed_transaction(tx)
             event_log.append({
                 'event_type': 'TRANSACTION_EMBEDDED', 
@@ -218,11 +450,105 @@ class EPOH_Core:
             'transactions': transactions
         }
         
-        final_block['current_hash'] = hash_block(final_block)
-        self.latest_hash = final_block['current_hash']
+        final_block['current_hash'] = hash_block_payload(final_block)
+        self.latest_hash = bytes.fromhex(final_block['current_hash'])
         
         return final_block
 
+# ============================================================================
+# FLIGHT ACTIVITY
+# ============================================================================
+
+ACTIVITY_TELEMETRY, ACTIVITY_AUTH = 0, 1
+ACTIVITY_HISTORY = 64  # recent activity rows kept per flight
+
+# printf-style templates for the activity feed (formatted in C, no __format__ dispatch)
+COORDINATES_FORMAT = '(%.2f, %.2f)'
+ALTITUDE_FORMAT = '%.2fm'
+SPEED_FORMAT = '%.2f m/s'
+
+class FlightActivity:
+    """
+    Recent activity of an active flight, kept as parallel columns.
+    
+    Rows are appended as blocks are mined, so the activity feed is served
+    from a few flat arrays instead of walking the block dicts each time.
+    """
+    
+    def __init__(self):
+        self.kind = array('b')
+        self.block = array('q')      # chain position of the block holding the row
+        self.timestamp = array('d')
+        self.x = array('d')
+        self.y = array('d')
+        self.z = array('d')
+        self.speed = array('d')
+    
+    def record_block(self, block, position):
+        """Appends the telemetry and authentication transactions of a mined block."""
+        for tx in block['transactions']:
+            if tx.get('type') == 'TELEMETRY_TX':
+                data = tx.get('data', {})
+                try:
+                    row = (float(data.get('x_pos', 0)), float(data.get('y_pos', 0)),
+                           float(data.get('z_alt', 0)), float(data.get('vel_mag', 0)))
+                except (TypeError, ValueError):
+                    continue
+                self._append(ACTIVITY_TELEMETRY, position, block['timestamp'], *row)
+            elif tx.get('status') == 'AUTHENTICATED':
+                self._append(ACTIVITY_AUTH, position, block['timestamp'], 0.0, 0.0, 0.0, 0.0)
+        
+        # Trim in bulk so appends stay amortized O(1)
+        if len(self.kind) > 2 * ACTIVITY_HISTORY:
+            for column in (self.kind, self.block, self.timestamp, self.x, self.y, self.z, self.speed):
+                del column[:-ACTIVITY_HISTORY]
+    
+    def _append(self, kind, position, timestamp, x, y, z, speed):
+        self.kind.append(kind)
+        self.block.append(position)
+        self.timestamp.append(timestamp)
+        self.x.append(x)
+        self.y.append(y)
+        self.z.append(z)
+        self.speed.append(speed)
+    
+    def recent_rows(self, min_block, limit):
+        """
+        Copies the last `limit` rows from chain positions >= min_block.
+        
+        Call with the manager lock held; the copied rows can then be
+        formatted after releasing it.
+        """
+        start = len(self.kind)
+        while start > 0 and self.block[start - 1] >= min_block:
+            start -= 1
+        start = max(start, len(self.kind) - limit)
+        
+        return list(zip(self.kind[start:], self.timestamp[start:],
+                        self.x[start:], self.y[start:], self.z[start:], self.speed[start:]))
+    
+    @staticmethod
+    def format_rows(rows):
+        """Formats activity rows as the entries of the activity feed."""
+        entries = []
+        append = entries.append
+        for kind, timestamp, x, y, z, speed in rows:
+            if kind == ACTIVITY_TELEMETRY:
+                append({
+                    'timestamp': timestamp,
+                    'type': 'telemetry',
+                    'coordinates': COORDINATES_FORMAT % (x, y),
+                    'altitude': ALTITUDE_FORMAT % z,
+                    'speed': SPEED_FORMAT % speed
+                })
+            else:
+                append({
+                    'timestamp': timestamp,
+                    'type': 'authentication',
+                    'message': 'UAV Authenticated Successfully'
+                })
+        return entries
+
 # ============================================================================
 # BLOCKCHAIN MANAGER
 # ============================================================================
@@ -234,20 +560,35 @@ class BlockchainManager:
         self.active_chains = {}  # flight_id -> chain data
         self.pending_auth = {}   # flight_id -> auth challenges
         self.epoh_cores = {}     # flight_id -> EPOH instance
+        self.mine_locks = {}     # flight_id -> per-flight mining lock
         self.lock = threading.Lock()
         
+        # Read-mostly snapshots, replaced (never mutated) under the lock so
+        # readers can use them without locking
+        self.active_ids = frozenset()
+        self.active_count = 0
+        self.flight_count = self._load_flight_count()
+        
+        # Mined blocks are appended to the active ledgers by a single writer thread
+        self.write_queue = queue.Queue()
+        self.writer_thread = threading.Thread(target=self._ledger_writer, daemon=True)
+        self.writer_thread.start()
+    
+    def _load_flight_count(self):
+        """Reads the last issued flight ID from disk (0 if none)."""
+        try:
+            with open(COUNT_FILE, 'r') as f:
+                return int(f.read().strip())
+        except (OSError, ValueError):
+            return 0
+        
     def get_next_flight_id(self):
         """Returns the next available flight ID (starting from 1)."""
         with self.lock:
-            if not os.path.exists(COUNT_FILE):
-                next_id = 1
-            else:
-                try:
-                    with open(COUNT_FILE, 'r') as f:
-                        next_id = int(f.read().strip()) + 1
-                except:
-                    next_id = 1
+            self.flight_count += 1
+            next_id = self.flight_count
             
+            # Write-through so IDs are never reused after a restart
             with open(COUNT_FILE, 'w') as f:
                 f.write(str(next_id))
             
@@ -272,7 +613,7 @@ class BlockchainManager:
             }]
         }
         
-        genesis_block['current_hash'] = hash_block(genesis_block)
+        genesis_block['current_hash'] = hash_block_payload(genesis_block)
         
         with self.lock:
             self.active_chains[flight_id] = {
@@ -281,79 +622,180 @@ class BlockchainManager:
                 'uav_supi': uav_supi,
                 'operator': username or 'system',
                 'session_key': None,
-                'start_time': time.time()
+                'start_time': time.time(),
+                'persisted': 0,  # blocks already queued for the ledger file
+                'activity': FlightActivity()
             }
             
-            self.epoh_cores[flight_id] = EPOH_Core(difficulty=2)
-            self.epoh_cores[flight_id].latest_hash = genesis_block['current_hash']
+            self.epoh_cores[flight_id] = EPOH_Core.specialize(2)()
+            self.mine_locks[flight_id] = threading.Lock()
+            self._publish_active()
+            self.epoh_cores[flight_id].latest_hash = bytes.fromhex(genesis_block['current_hash'])
         
         return genesis_block
     
+    def _publish_active(self):
+        """Refreshes the lock-free active flight snapshots (caller holds the lock)."""
+        self.active_ids = frozenset(self.active_chains)
+        self.active_count = len(self.active_ids)
+    
+    def is_active(self, flight_id):
+        """Lock-free check whether a flight is currently active."""
+        return flight_id in self.active_ids
+    
     def save_chain(self, flight_id):
-        """Saves a flight's blockchain to disk."""
+        """Queues a flight's newly mined blocks for appending to its ledger."""
         with self.lock:
             if flight_id not in self.active_chains:
                 return False
-                
-            ledger_path = os.path.join(ACTIVE_LEDGERS_DIR, f'flight_{flight_id}.json')
-            try:
-                with open(ledger_path, 'w') as f:
-                    json.dump(self.active_chains[flight_id]['chain'], f, indent=4)
-                return True
-            except Exception as e:
-                print(f"Error saving chain for flight {flight_id}: {e}")
-                return False
+            
+            chain_data = self.active_chains[flight_id]
+            new_blocks = chain_data['chain'][chain_data['persisted']:]
+            chain_data['persisted'] = len(chain_data['chain'])
+            
+            # Enqueued under the lock so ledger lines keep chain order
+            if new_blocks:
+                ledger_path = os.path.join(ACTIVE_LEDGERS_DIR, f'flight_{flight_id}.ndjson')
+                self.write_queue.put((ledger_path, new_blocks))
+            return True
+    
+    def flush_ledgers(self):
+        """Blocks until every block queued so far has been written to disk."""
+        done = threading.Event()
+        self.write_queue.put((None, done))
+        done.wait()
+    
+    def _ledger_writer(self):
+        """Background writer: appends queued blocks as one JSON line each."""
+        # Ledger descriptors stay open between batches and are closed on every
+        # flush, so an archived ledger can be removed right after flushing
+        fds = {}
+        
+        while True:
+            batch = [self.write_queue.get()]
+            
+            # Coalesce everything queued within the flush window
+            deadline = time.monotonic() + LEDGER_FLUSH_INTERVAL
+            while True:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self.write_queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            
+            pending = {}
+            waiters = []
+            for ledger_path, item in batch:
+                if ledger_path is None:
+                    waiters.append(item)
+                else:
+                    pending.setdefault(ledger_path, []).extend(item)
+            
+            # One write + fsync per ledger file per batch
+            for ledger_path, blocks in pending.items():
+                try:
+                    fd = fds.get(ledger_path)
+                    if fd is None:
+                        fd = fds[ledger_path] = os.open(ledger_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                    os.write(fd, b''.join([dumps_json(block, newline=True) for block in blocks]))
+                    os.fsync(fd)
+                except Exception as e:
+                    print(f"Error saving ledger {ledger_path}: {e}")
+            
+            if waiters:
+                for fd in fds.values():
+                    os.close(fd)
+                fds.clear()
+            
+            for done in waiters:
+                done.set()
     
     def mine_block(self, flight_id):
         """Mines a new block from the transaction pool."""
         with self.lock:
-            if flight_id not in self.active_chains:
-                return None
+            mine_lock = self.mine_locks.get(flight_id)
+        if mine_lock is None:
+            return None
+        
+        # Blocks of one flight are mined in order; different flights mine
+        # concurrently on the request threads (interleaved, see fast_sha256)
+        with mine_lock:
+            with self.lock:
+                if flight_id not in self.active_chains:
+                    return None
+                    
+                chain_data = self.active_chains[flight_id]
                 
-            chain_data = self.active_chains[flight_id]
-            
-            if not chain_data['transaction_pool']:
-                return None
-            
-            last_hash = chain_data['chain'][-1]['current_hash']
+                if not chain_data['transaction_pool']:
+                    return None
+                
+                transactions = chain_data['transaction_pool']
+                chain_data['transaction_pool'] = []
+                last_hash = chain_data['chain'][-1]['current_hash']
+                chain_length = len(chain_data['chain'])
+                epoh_core = self.epoh_cores[flight_id]
             
-            new_block = self.epoh_cores[flight_id].create_block(
-                chain_data['transaction_pool'],
+            # Hashing runs outside the global lock
+            new_block = epoh_core.create_block(
+                transactions,
                 last_hash,
-                len(chain_data['chain']),
+                chain_length,
                 flight_id
             )
             
-            chain_data['chain'].append(new_block)
-            chain_data['transaction_pool'] = []
-        
-        self.save_chain(flight_id)
+            with self.lock:
+                chain_data['chain'].append(new_block)
+                chain_data['activity'].record_block(new_block, len(chain_data['chain']) - 1)
+            
+            self.save_chain(flight_id)
         
         return new_block['current_hash']
     
     def archive_flight(self, flight_id):
         """Archives a completed flight."""
-        ledger_path = os.path.join(ACTIVE_LEDGERS_DIR, f'flight_{flight_id}.json')
-        archive_path = os.path.join(ARCHIVE_DIR, f'Flight_{flight_id}.json')
+        ledger_path = os.path.join(ACTIVE_LEDGERS_DIR, f'flight_{flight_id}.ndjson')
         
         try:
-            with self.lock:
-                # Mine any remaining transactions
-                if flight_id in self.active_chains and self.active_chains[flight_id]['transaction_pool']:
-                    self.mine_block(flight_id)
-            
-            # Move to archive
-            if os.path.exists(ledger_path):
-                os.rename(ledger_path, archive_path)
+            # Mine any remaining transactions
+            self.mine_block(flight_id)
             
-            # Cleanup
             with self.lock:
-                if flight_id in self.active_chains:
-                    del self.active_chains[flight_id]
-                if flight_id in self.epoh_cores:
-                    del self.epoh_cores[flight_id]
-                if flight_id in self.pending_auth:
-                    del self.pending_auth[flight_id]
+                mine_lock = self.mine_locks.get(flight_id)
+            
+            # Wait for any block still being mined before the ledger moves
+            with mine_lock or nullcontext():
+                self.flush_ledgers()
+                
+                with self.lock:
+                    chain = list(self.active_chains[flight_id]['chain']) if flight_id in self.active_chains else None
+                
+                # Archive as a single JSON array (or MessagePack), written atomically
+                if chain:
+                    extension, archive_data = dump_archive(chain)
+                    archive_path = os.path.join(ARCHIVE_DIR, f'Flight_{flight_id}{extension}')
+                    temp_path = archive_path + '.tmp'
+                    with open(temp_path, 'wb') as f:
+                        f.write(archive_data)
+                    os.replace(temp_path, archive_path)
+                    record_flight_meta(archive_path, chain)
+                    seed_verification(archive_path, chain)
+                    response_cache.clear()
+                
+                if os.path.exists(ledger_path):
+                    os.remove(ledger_path)
+                
+                # Cleanup
+                with self.lock:
+                    if flight_id in self.active_chains:
+                        del self.active_chains[flight_id]
+                    if flight_id in self.epoh_cores:
+                        del self.epoh_cores[flight_id]
+                    if flight_id in self.pending_auth:
+                        del self.pending_auth[flight_id]
+                    self.mine_locks.pop(flight_id, None)
+                    self._publish_active()
             
             return True
         except Exception as e:
@@ -364,35 +806,421 @@ class BlockchainManager:
 # VERIFICATION LOGIC
 # ============================================================================
 
+VERIFY_OK, VERIFY_LINK_BROKEN, VERIFY_CHRONOLOGY = 0, 1, 2
+NUMBA_VERIFY_MIN_BLOCKS = 8  # shorter chains are not worth the array packing
+
+# Links are compared as bytes on the Numba path, so only the exact form
+# hexdigest() produces may be packed; anything else (upper case,
+# whitespace) must fail the string comparison, as in the verifier UI
+_CANONICAL_HASH = re.compile(r'[0-9a-f]{64}')
+
+if NUMBA_AVAILABLE:
+    import numpy as np
+    
+    @njit(cache=True)
+    def _verify_arrays(stored_links, recalculated, timestamps):
+        """Returns (block index, reason) of the first violation, or (-1, VERIFY_OK)."""
+        for i in range(1, timestamps.shape[0]):
+            for j in range(32):
+                if stored_links[i - 1, j] != recalculated[i - 1, j]:
+                    return i, 1
+            if timestamps[i] <= timestamps[i - 1]:
+                return i, 2
+        return -1, 0
+
+def _find_violation(chain, hashes):
+    """Returns (block index, reason) of the first broken link or chronology, or (None, VERIFY_OK)."""
+    if (NUMBA_AVAILABLE and len(chain) >= NUMBA_VERIFY_MIN_BLOCKS
+            and all(type(block['previous_hash']) is str and _CANONICAL_HASH.fullmatch(block['previous_hash'])
+                    for block in chain[1:])):
+        try:
+            stored_links = np.frombuffer(b''.join(bytes.fromhex(block['previous_hash']) for block in chain[1:]), dtype=np.uint8).reshape(-1, 32)
+            recalculated = np.frombuffer(b''.join(bytes.fromhex(h) for h in hashes), dtype=np.uint8).reshape(-1, 32)
+            timestamps = np.array([block['timestamp'] for block in chain], dtype=np.float64)
+        except (ValueError, TypeError):
+            # Malformed timestamps: let the Python loop report them
+            pass
+        else:
+            index, reason = _verify_arrays(stored_links, recalculated, timestamps)
+            return (None, VERIFY_OK) if index < 0 else (int(index), int(reason))
+    
+    for i in range(1, len(chain)):
+        current_block = chain[i]
+        previous_block = chain[i - 1]
+        
+        if current_block['previous_hash'] != hashes[i - 1]:
+            return i, VERIFY_LINK_BROKEN
+        if current_block['timestamp'] <= previous_block['timestamp']:
+            return i, VERIFY_CHRONOLOGY
+    
+    return None, VERIFY_OK
+
+def batch_verify(chains):
+    """
+    Verifies the hash links and chronology of several loaded chains at once.
+
+    Every block hash of every chain is recomputed in one flat pass, then the
+    results are split back per chain and checked against the stored links.
+
+    Args:
+        chains: List of chains (each a list of block dicts)
+
+    Returns:
+        List of verification results, one per chain
+    """
+    # One hash per block except each chain's tip, in a single pass
+    recalculated = list(map(hash_block, [block for chain in chains for block in chain[:-1]]))
+
+    results = []
+    offset = 0
+    for chain in chains:
+        if not chain or len(chain) < 1:
+            results.append({'secured': False, 'message': 'Verification Failed: Chain is empty.', 'hash': None})
+            continue
+
+        hashes = recalculated[offset:offset + len(chain) - 1]
+        offset += len(chain) - 1
+        results.append(_verification_result(chain, hashes))
+
+    return results
+
+def _verification_result(chain, hashes):
+    """Builds the API verification result of a chain from its block hashes."""
+    i, reason = _find_violation(chain, hashes)
+
+    if reason == VERIFY_LINK_BROKEN:
+        return {'secured': False, 'message': f'🚨 TAMPERED DETECTED: Link broken at Block #{i}.', 'hash': chain[i]['previous_hash']}
+    if reason == VERIFY_CHRONOLOGY:
+        return {'secured': False, 'message': f'🚨 TAMPERED DETECTED: Chronology violation at Block #{i}.', 'hash': chain[i]['previous_hash']}
+    return {'secured': True, 'message': '✅ SECURED: Integrity and Chronology Confirmed.', 'hash': chain[-1]['current_hash']}
+
+# Archived ledgers never change once written, so a verification result stays
+# valid until the file itself changes: path -> ((mtime_ns, size), result)
+_verify_cache = {}
+_verify_cache_lock = threading.Lock()
+
 def verify_log(file_path):
     """Internal verification logic for the API."""
     try:
-        with open(file_path, 'r') as f:
-            chain = json.load(f)
+        stat = os.stat(file_path)
+        file_key = (stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        file_key = None
+
+    if file_key is not None:
+        with _verify_cache_lock:
+            cached = _verify_cache.get(file_path)
+        if cached and cached[0] == file_key:
+            return dict(cached[1])
+
+    try:
+        chain = load_chain(file_path)
     except Exception as e:
         return {'secured': False, 'message': f'Verification Failed: Cannot load file. Error: {str(e)}', 'hash': None}
 
-    if not chain or len(chain) < 1:
-        return {'secured': False, 'message': 'Verification Failed: Chain is empty.', 'hash': None}
+    result = batch_verify([chain])[0]
 
-    for i in range(1, len(chain)):
-        current_block = chain[i]
-        previous_block = chain[i - 1]
-        recalculatedHash = hash_block(previous_block)
+    if file_key is not None:
+        with _verify_cache_lock:
+            _verify_cache[file_path] = (file_key, result)
+
+    return dict(result)
+
+def read_verified_archive(file_path):
+    """
+    Returns the raw bytes of an archive whose current version has a cached
+    verification result, or None.
+
+    A cached result means this exact file version parsed as a chain, so the
+    bytes can be sent as-is instead of being parsed and re-serialized.
+    """
+    try:
+        with open(file_path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            with _verify_cache_lock:
+                cached = _verify_cache.get(file_path)
+            if cached and cached[0] == (stat.st_mtime_ns, stat.st_size):
+                return f.read()
+    except OSError:
+        pass
+    return None
+
+def seed_verification(file_path, chain):
+    """
+    Caches the verification result of an archive just written from memory.
+
+    Every block's current_hash was computed from its canonical bytes when it
+    was mined, so the links are checked against those hashes instead of
+    serializing the whole chain again. Any later change to the file changes
+    its (mtime, size) key and forces a full verification from disk.
+    """
+    if not chain:
+        return
+    
+    stat = os.stat(file_path)
+    result = _verification_result(chain, [block['current_hash'] for block in chain[:-1]])
+    with _verify_cache_lock:
+        _verify_cache[file_path] = ((stat.st_mtime_ns, stat.st_size), result)
+
+# ============================================================================
+# FLIGHT ARCHIVE METADATA
+# ============================================================================
+
+# Archived chains are immutable, so each file is summarized once per version:
+# filename -> ((mtime_ns, size), metadata or None)
+# The summaries are persisted to ARCHIVE_INDEX_FILE so a restarted server
+# does not have to re-parse the whole archive either.
+_flight_meta_lock = threading.Lock()
+
+def _load_flight_meta_index():
+    """Loads the persisted metadata index, or an empty one if missing or corrupt."""
+    try:
+        with open(ARCHIVE_INDEX_FILE, 'rb') as f:
+            index = loads_json(f.read())
+        return {
+            filename: ((entry['mtime_ns'], entry['size']), entry['meta'])
+            for filename, entry in index.items()
+        }
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        print(f"⚠️ Rebuilding flight index: {e}")
+        return {}
+
+def _save_flight_meta_index():
+    """Writes the metadata index atomically. Caller must hold _flight_meta_lock."""
+    index = {
+        filename: {'mtime_ns': file_key[0], 'size': file_key[1], 'meta': meta}
+        for filename, (file_key, meta) in _flight_meta_cache.items()
+    }
+    try:
+        temp_path = ARCHIVE_INDEX_FILE + '.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(dumps_json(index))
+        os.replace(temp_path, ARCHIVE_INDEX_FILE)
+    except OSError as e:
+        print(f"⚠️ Could not save flight index: {e}")
+
+_flight_meta_cache = _load_flight_meta_index()
+
+def record_flight_meta(path, chain):
+    """Indexes a freshly written archive from the chain already in memory."""
+    stat = os.stat(path)
+    filename = os.path.basename(path)
+    with _flight_meta_lock:
+        _archive_files.add(filename)
+        _flight_meta_cache[filename] = ((stat.st_mtime_ns, stat.st_size), _extract_flight_meta(filename, chain))
+        _save_flight_meta_index()
+
+def _extract_flight_meta(filename, chain):
+    """Summarizes an archived chain from its genesis block."""
+    if not isinstance(chain, list) or len(chain) == 0:
+        return None
+    
+    genesis_event = chain[0].get('event_log', [{}])[0]
+    return {
+        'filename': filename,
+        'uav_supi': genesis_event.get('uav_supi', 'Unknown'),
+        'operator': genesis_event.get('operator', 'Unknown'),
+        'blocks': len(chain),
+        'timestamp': chain[0].get('timestamp', 0)
+    }
+
+def _read_flight_meta(path):
+    """
+    Summarizes an archive from disk without building the whole chain.
+
+    Only the genesis block is parsed (streamed with ijson); the block count
+    comes from counting the top-level array items in the parser's event
+    stream, so keys inside client-supplied transaction data are never
+    counted. Without ijson the chain is loaded in full.
+    """
+    filename = os.path.basename(path)
+    if not IJSON_AVAILABLE or not filename.endswith('.json'):
+        return _extract_flight_meta(filename, load_chain(path))
+    
+    with open(path, 'rb') as f:
+        genesis = next(ijson.items(f, 'item', use_float=True), None)
+        if not isinstance(genesis, dict):
+            return None
         
-        if current_block['previous_hash'] != recalculatedHash:
-            return {'secured': False, 'message': f'🚨 TAMPERED DETECTED: Link broken at Block #{i}.', 'hash': current_block['previous_hash']}
-        if current_block['timestamp'] <= previous_block['timestamp']:
-            return {'secured': False, 'message': f'🚨 TAMPERED DETECTED: Chronology violation at Block #{i}.', 'hash': current_block['previous_hash']}
+        f.seek(0)
+        blocks = sum(1 for prefix, event, _ in ijson.parse(f) if prefix == 'item' and event == 'start_map')
+    
+    genesis_event = genesis.get('event_log', [{}])[0]
+    return {
+        'filename': filename,
+        'uav_supi': genesis_event.get('uav_supi', 'Unknown'),
+        'operator': genesis_event.get('operator', 'Unknown'),
+        'blocks': blocks,
+        'timestamp': genesis.get('timestamp', 0)
+    }
 
-    return {'secured': True, 'message': '✅ SECURED: Integrity and Chronology Confirmed.', 'hash': chain[-1]['current_hash']}
+def archive_uav_supi(path):
+    """
+    Returns the UAV of an archived flight, reading as little as possible.
+
+    Served from the metadata index when it is current for the file, else
+    streamed from the genesis block with ijson, else read from the full chain.
+    """
+    filename = os.path.basename(path)
+    stat = os.stat(path)
+    with _flight_meta_lock:
+        cached = _flight_meta_cache.get(filename)
+    if cached and cached[1] and cached[0] == (stat.st_mtime_ns, stat.st_size):
+        return cached[1]['uav_supi']
+    
+    if IJSON_AVAILABLE and filename.endswith('.json'):
+        with open(path, 'rb') as f:
+            return next(ijson.items(f, 'item.event_log.item.uav_supi'), 'Unknown')
+    
+    return load_chain(path)[0].get('event_log', [{}])[0].get('uav_supi', 'Unknown')
+
+def _scan_archive_files():
+    """Lists the archived flight filenames in a single directory pass."""
+    if not os.path.exists(ARCHIVE_DIR):
+        return set()
+    
+    with os.scandir(ARCHIVE_DIR) as entries:
+        return {e.name for e in entries if e.name.startswith('Flight_') and e.name.endswith(ARCHIVE_EXTENSIONS)}
+
+# Archived flight filenames: scanned once at startup, then kept current by
+# archive_flight so requests never list the directory
+_archive_files = _scan_archive_files()
+
+def archived_flight_count():
+    """Returns the number of archived flights."""
+    return len(_archive_files)
+
+def list_archive_paths(limit=None):
+    """Returns the paths of the archived flight files, newest first."""
+    with _flight_meta_lock:
+        filenames = list(_archive_files)
+    
+    stamped = []
+    for filename in filenames:
+        path = os.path.join(ARCHIVE_DIR, filename)
+        try:
+            stamped.append((os.stat(path).st_mtime, path))
+        except OSError:
+            continue
+    
+    stamped.sort(reverse=True)
+    paths = [path for _, path in stamped]
+    return paths[:limit] if limit else paths
+
+def _load_telemetry_columns(path):
+    """Loads one archive as telemetry columns, or None if it cannot be read."""
+    try:
+        return telemetry_columns(load_chain(path))
+    except Exception:
+        return None
+
+def iter_archived_flights(paths):
+    """
+    Loads archived flights for the anomaly detector on a thread pool.
+    
+    Each chain is flattened into telemetry columns as soon as it is parsed,
+    so only the compact arrays (not the block dicts) reach the trainer.
+    File reads overlap across threads; flights are yielded in path order.
+    """
+    with ThreadPoolExecutor(max_workers=ARCHIVE_LOAD_WORKERS) as executor:
+        for columns in executor.map(_load_telemetry_columns, paths):
+            if columns is not None:
+                yield columns
+
+def get_archived_flights_meta():
+    """Returns metadata for every archived flight, parsing only new or changed files."""
+    flights = []
+    changed = False
+    
+    with _flight_meta_lock:
+        filenames = list(_archive_files)
+    
+    for filename in filenames:
+        path = os.path.join(ARCHIVE_DIR, filename)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            # Removed behind our back: forget it
+            with _flight_meta_lock:
+                _archive_files.discard(filename)
+            continue
+        except OSError:
+            continue
+        file_key = (stat.st_mtime_ns, stat.st_size)
+        
+        with _flight_meta_lock:
+            cached = _flight_meta_cache.get(filename)
+        
+        if cached and cached[0] == file_key:
+            meta = cached[1]
+        else:
+            try:
+                meta = _read_flight_meta(path)
+            except Exception as e:
+                # Cached as None so a corrupt archive is not re-parsed per request
+                print(f"⚠️ Error reading {filename}: {e}")
+                meta = None
+            
+            with _flight_meta_lock:
+                _flight_meta_cache[filename] = (file_key, meta)
+            changed = True
+        
+        if meta:
+            flights.append(meta)
+    
+    # Forget archives that were removed
+    with _flight_meta_lock:
+        for filename in [name for name in _flight_meta_cache if name not in _archive_files]:
+            del _flight_meta_cache[filename]
+            changed = True
+        
+        if changed:
+            _save_flight_meta_index()
+    
+    return flights
 
 # ============================================================================
 # FLASK API SERVER
 # ============================================================================
 
+class OrjsonProvider(DefaultJSONProvider):
+    """Serves API bodies through orjson, falling back to the stdlib provider."""
+    
+    def dumps(self, obj, **kwargs):
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+        except TypeError:
+            return super().dumps(obj, **kwargs)
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 app = Flask(__name__, static_folder='static', static_url_path='')
+if ORJSON_AVAILABLE:
+    app.json = OrjsonProvider(app)
 CORS(app)  # Enable CORS for frontend access
+app.config['SEND_FILE_MAX_AGE_DEFAULT'] = STATIC_MAX_AGE
+
+# Compress API and static responses (brotli preferred, gzip fallback);
+# tiny bodies are not worth the compression overhead
+if COMPRESSION_AVAILABLE:
+    app.config['COMPRESS_ALGORITHM'] = ['br', 'gzip']
+    app.config['COMPRESS_MIN_SIZE'] = 1024
+    Compress(app)
+
+# Results of read-heavy endpoints polled by every open dashboard, shared
+# across clients for a few seconds and dropped when a flight is archived
+response_cache = TTLCache(maxsize=1024, ttl=RESPONSE_CACHE_TTL)
+
+@app.after_request
+def set_cache_headers(response):
+    """API responses are live data and must never be cached."""
+    if request.path.startswith('/api/'):
+        response.headers['Cache-Control'] = 'no-store'
+    return response
+
 blockchain_manager = BlockchainManager()
 
 # Initialize Smart Contracts (if available)
@@ -410,27 +1238,49 @@ else:
 if ANOMALY_DETECTION_AVAILABLE:
     anomaly_detector = AnomalyDetector()
     
-    # Train on existing historical data if available
-    if os.path.exists(ARCHIVE_DIR):
-        historical_flights = []
-        for filename in os.listdir(ARCHIVE_DIR):
-            if filename.startswith('Flight_') and filename.endswith('.json'):
-                try:
-                    with open(os.path.join(ARCHIVE_DIR, filename), 'r') as f:
-                        flight_data = {'chain': json.load(f)}
-                        historical_flights.append(flight_data)
-                except:
-                    pass
-        
-        if len(historical_flights) >= 5:
-            anomaly_detector.train(historical_flights)
-        else:
-            print(f"⚠️  Only {len(historical_flights)} flights available. Need at least 5 for training.")
+    # Train on the most recent historical data if available
+    archive_paths = list_archive_paths(TRAINING_FLIGHT_LIMIT)
+    if len(archive_paths) >= 5:
+        anomaly_detector.train(iter_archived_flights(archive_paths))
+    else:
+        print(f"⚠️  Only {len(archive_paths)} flights available. Need at least 5 for training.")
     
     print("🤖 AI Anomaly Detection System Initialized")
 else:
     anomaly_detector = None
 
+# Background retraining after flights end: at most one run at a time, and a
+# request arriving mid-run triggers exactly one more run afterwards
+_retraining = threading.Event()
+_retrain_pending = threading.Event()
+_retrain_lock = threading.Lock()
+
+def schedule_retrain():
+    """Retrains the anomaly detector in the background without blocking the caller."""
+    with _retrain_lock:
+        if _retraining.is_set():
+            _retrain_pending.set()
+            return
+        _retraining.set()
+    
+    threading.Thread(target=_retrain_if_enough, daemon=True).start()
+
+def _retrain_if_enough():
+    """Trains on the most recent archives once at least 5 exist."""
+    while True:
+        _retrain_pending.clear()
+        try:
+            archive_paths = list_archive_paths(TRAINING_FLIGHT_LIMIT)
+            if len(archive_paths) >= 5:
+                anomaly_detector.train(iter_archived_flights(archive_paths))
+        except Exception as e:
+            print(f"⚠️ Anomaly detector retraining failed: {e}")
+        
+        with _retrain_lock:
+            if not _retrain_pending.is_set():
+                _retraining.clear()
+                return
+
 # ============================================================================
 # USER AUTHENTICATION ENDPOINTS
 # ============================================================================
@@ -506,10 +1356,10 @@ def api_verify_token():
     data = request.get_json()
     token = data.get('token')
     
-    username = verify_token(token)
+    session = verify_session(token)
     
-    if username:
-        role = get_user_role(username)
+    if session:
+        username, role = session
         return jsonify({
             'valid': True,
             'username': username,
@@ -529,6 +1379,7 @@ def api_logout():
     
     if token:
         delete_session(token)
+        token_cache.pop(token_key(token))
         print(f"🚪 User logged out (token: {token[:10]}...)")
     
     return jsonify({'success': True, 'message': 'Logged out successfully'})
@@ -558,7 +1409,7 @@ def get_user_profile():
 @require_auth
 def user_get_my_uavs():
     """Get user's assigned UAVs"""
-    role = get_user_role(request.current_user)
+    role = g.identity[1]
     
     if role == 'admin':
         # Admin sees all UAVs
@@ -580,30 +1431,17 @@ def user_get_my_uavs():
 @require_auth
 def user_get_my_flights():
     """Get user's flights (filtered by UAV assignment)"""
-    role = get_user_role(request.current_user)
+    _, role, user_uavs = g.identity
     
     # Get all flights
-    all_flights = []
-    for filename in os.listdir(ARCHIVE_DIR):
-        if filename.startswith('Flight_') and filename.endswith('.json'):
-            filepath = os.path.join(ARCHIVE_DIR, filename)
-            try:
-                with open(filepath, 'r') as f:
-                    chain = json.load(f)
-                    if chain and len(chain) > 0:
-                        uav_supi = chain[0].get('event_log', [{}])[0].get('uav_supi', 'Unknown')
-                        operator = chain[0].get('event_log', [{}])[0].get('operator', 'Unknown')
-                        
-                        all_flights.append({
-                            'filename': filename,
-                            'flight_id': filename.replace('Flight_', '').replace('.json', ''),
-                            'uav_supi': uav_supi,
-                            'operator': operator,
-                            'blocks': len(chain),
-                            'timestamp': chain[0].get('timestamp', 0)
-                        })
-            except:
-                pass
+    all_flights = [{
+        'filename': meta['filename'],
+        'flight_id': os.path.splitext(meta['filename'])[0].replace('Flight_', ''),
+        'uav_supi': meta['uav_supi'],
+        'operator': meta['operator'],
+        'blocks': meta['blocks'],
+        'timestamp': meta['timestamp']
+    } for meta in get_archived_flights_meta()]
     
     # Filter based on role
     if role == 'admin':
@@ -611,7 +1449,6 @@ def user_get_my_flights():
         filtered_flights = all_flights
     else:
         # Normal user sees only their UAV flights
-        user_uavs = [uav['uav_supi'] for uav in get_user_uavs(request.current_user)]
         filtered_flights = [f for f in all_flights if f['uav_supi'] in user_uavs]
     
     return jsonify({
@@ -651,6 +1488,8 @@ def admin_update_user_role(username):
     new_role = data.get('role')
     
     result = update_user_role(request.current_user, username, new_role)
+    if result['success']:
+        invalidate_user(username)
     
     return jsonify(result), 200 if result['success'] else 400
 
@@ -659,6 +1498,8 @@ def admin_update_user_role(username):
 def admin_toggle_user_status(username):
     """Admin: Enable/disable user account"""
     result = toggle_user_status(request.current_user, username)
+    if result['success']:
+        invalidate_user(username)
     
     return jsonify(result), 200 if result['success'] else 400
 
@@ -677,6 +1518,8 @@ def admin_assign_uav():
         return jsonify({'success': False, 'message': 'Invalid UAV SUPI'}), 400
     
     result = assign_uav(request.current_user, username, uav_supi)
+    if result['success']:
+        invalidate_user(username)
     
     return jsonify(result), 200 if result['success'] else 400
 
@@ -692,6 +1535,8 @@ def admin_unassign_uav():
         return jsonify({'success': False, 'message': 'Missing username or uav_supi'}), 400
     
     result = unassign_uav(request.current_user, username, uav_supi)
+    if result['success']:
+        invalidate_user(username)
     
     return jsonify(result), 200 if result['success'] else 400
 
@@ -713,10 +1558,9 @@ def admin_get_uav_assignments():
 def admin_system_stats():
     """Admin: Get comprehensive system statistics"""
     # Gather system-wide statistics
-    archived_count = len([f for f in os.listdir(ARCHIVE_DIR) if f.startswith('Flight_')]) if os.path.exists(ARCHIVE_DIR) else 0
+    archived_count = archived_flight_count()
     
-    with blockchain_manager.lock:
-        active_count = len(blockchain_manager.active_chains)
+    active_count = blockchain_manager.active_count
     
     auth_stats = get_auth_stats()
     
@@ -736,9 +1580,10 @@ def admin_system_stats():
 def admin_get_login_history():
     """Admin: Get login history"""
     limit = request.args.get('limit', 50, type=int)
+    offset = request.args.get('offset', 0, type=int)
     username = request.args.get('username', None)
     
-    history = get_login_history(username, limit)
+    history = get_login_history(username, limit, offset)
     
     log_activity(request.current_user, 'VIEW_LOGIN_HISTORY', username, f'Viewed login history')
     
@@ -752,9 +1597,10 @@ def admin_get_login_history():
 def admin_get_activity_log():
     """Admin: Get activity log"""
     limit = request.args.get('limit', 100, type=int)
+    offset = request.args.get('offset', 0, type=int)
     username = request.args.get('username', None)
     
-    activities = get_activity_log(username, limit)
+    activities = get_activity_log(username, limit, offset)
     
     return jsonify({
         'activities': activities,
@@ -765,11 +1611,15 @@ def admin_get_activity_log():
 @require_admin
 def admin_get_available_uavs():
     """Admin: Get list of all UAVs in system"""
+    # Group active assignments by UAV in one pass
+    assigned_by_uav = defaultdict(list)
+    for a in get_uav_assignments():
+        if a['is_active']:
+            assigned_by_uav[a['uav_supi']].append(a['username'])
+    
     uavs = []
     for uav_supi, key in UAV_DB.items():
-        # Count how many users have this UAV assigned
-        assignments = get_uav_assignments()
-        assigned_users = [a['username'] for a in assignments if a['uav_supi'] == uav_supi and a['is_active']]
+        assigned_users = assigned_by_uav.get(uav_supi, [])
         
         uavs.append({
             'uav_supi': uav_supi,
@@ -787,42 +1637,82 @@ def admin_get_available_uavs():
 # STATIC FILE SERVING
 # ============================================================================
 
+# Pages link these assets with a content hash (?v=...), so browsers can keep
+# them for a week and still pick up every change on the next page load
+VERSIONED_ASSETS = ('styles.css', 'app.js')
+_static_page_cache = {}  # filename -> (mtimes of page and assets, rendered bytes)
+
+def render_static_page(filename):
+    """Returns an HTML page with its asset links pointing at versioned URLs."""
+    paths = [os.path.join(app.static_folder, name) for name in (filename,) + VERSIONED_ASSETS]
+    file_key = tuple(os.stat(path).st_mtime_ns for path in paths)
+    
+    cached = _static_page_cache.get(filename)
+    if cached and cached[0] == file_key:
+        return cached[1]
+    
+    with open(paths[0], 'rb') as f:
+        body = f.read()
+    for name, path in zip(VERSIONED_ASSETS, paths[1:]):
+        with open(path, 'rb') as f:
+            versioned = f'{name}?v={sha256_hexdigest(f.read())[:12]}'.encode()
+        body = body.replace(b'href="' + name.encode() + b'"', b'href="' + versioned + b'"')
+        body = body.replace(b'src="' + name.encode() + b'"', b'src="' + versioned + b'"')
+    
+    _static_page_cache[filename] = (file_key, body)
+    return body
+
+def send_static_page(filename):
+    """Serves an HTML page that is always revalidated (ETag / 304)."""
+    response = make_response(render_static_page(filename))
+    response.headers['Content-Type'] = 'text/html; charset=utf-8'
+    response.headers['Cache-Control'] = 'no-cache'
+    response.add_etag()
+    return response.make_conditional(request)
+
+def send_static_asset(filename, content_type):
+    """Serves a CSS/JS asset, cached long-term when requested by versioned URL."""
+    versioned = 'v' in request.args
+    response = send_from_directory('static', filename,
+                                   max_age=STATIC_ASSET_MAX_AGE if versioned else STATIC_MAX_AGE,
+                                   conditional=True)
+    response.headers['Content-Type'] = content_type
+    if versioned:
+        response.headers['Cache-Control'] = f'public, max-age={STATIC_ASSET_MAX_AGE}, immutable'
+    return response
+
 @app.route('/')
 def index():
     """Serves the audit platform HTML."""
-    return send_from_directory('static', 'audit_platform.html')
+    return send_static_page('audit_platform.html')
 
 @app.route('/login.html')
 def serve_login():
     """Serves the login page."""
-    return send_from_directory('static', 'login.html')
+    return send_static_page('login.html')
 
 @app.route('/register.html')
 def serve_register():
     """Serves the registration page."""
-    return send_from_directory('static', 'register.html')
+    return send_static_page('register.html')
 
 @app.route('/admin.html')
 def serve_admin():
     """Serves the admin panel (if exists)."""
     try:
-        return send_from_directory('static', 'admin.html')
+        return send_static_page('admin.html')
     except:
         return jsonify({'error': 'Admin panel not found'}), 404
 
 @app.route('/styles.css')
 def serve_css():
     """Serves the CSS file."""
-    response = send_from_directory('static', 'styles.css')
-    response.headers['Content-Type'] = 'text/css; charset=utf-8'
-    return response
+    return send_static_asset('styles.css', 'text/css; charset=utf-8')
 
 @app.route('/app.js')
 def serve_js():
     """Serves the JavaScript file."""
-    response = send_from_directory('static', 'app.js')
-    response.headers['Content-Type'] = 'application/javascript; charset=utf-8'
-    return response
+    return send_static_asset('app.js', 'application/javascript; charset=utf-8')
 
 # ============================================================================
 # FLIGHT DATA ENDPOINTS (With Role-Based Filtering)
@@ -839,10 +1729,11 @@ def list_flights():
         # Get authentication token
         token = request.headers.get('Authorization')
         if token and AUTH_SYSTEM_AVAILABLE:
-            username = verify_token(token)
-            if username:
-                role = get_user_role(username)
-                user_uavs = [uav['uav_supi'] for uav in get_user_uavs(username)] if role != 'admin' else None
+            identity = resolve_user(token)
+            if identity:
+                _, role, user_uavs = identity
+                if role == 'admin':
+                    user_uavs = None
             else:
                 # Invalid token, return public data only
                 role = 'user'
@@ -852,31 +1743,25 @@ def list_flights():
             role = 'user'
             user_uavs = []
         
-        files = os.listdir(ARCHIVE_DIR)
-        flight_files = [f for f in files if f.startswith('Flight_') and f.endswith('.json')]
+        cache_key = ('list_flights', None if role == 'admin' or user_uavs is None else frozenset(user_uavs))
+        flight_data = response_cache.get(cache_key)
+        if flight_data is not None:
+            return jsonify(flight_data)
+        
+        flight_metas = get_archived_flights_meta()
         
         flight_data = []
-        for f in sorted(flight_files, key=lambda x: int(x.split('_')[1].split('.')[0])): 
-            file_path = os.path.join(ARCHIVE_DIR, f)
-            try:
-                if os.path.exists(file_path):
-                    with open(file_path, 'r') as test_file:
-                        chain_data = json.load(test_file)
-                        
-                        if isinstance(chain_data, list) and len(chain_data) > 0:
-                            uav_supi = chain_data[0].get('event_log', [{}])[0].get('uav_supi', 'Unknown')
-                            
-                            # Filter based on role
-                            if role == 'admin' or user_uavs is None or uav_supi in user_uavs:
-                                flight_data.append({
-                                    'id': f, 
-                                    'name': f.replace('.json', ''),
-                                    'blocks': len(chain_data),
-                                    'uav_supi': uav_supi
-                                })
-            except Exception as e:
-                print(f"⚠️ Error reading {f}: {e}")
+        for meta in sorted(flight_metas, key=lambda m: int(m['filename'].split('_')[1].split('.')[0])): 
+            # Filter based on role
+            if role == 'admin' or user_uavs is None or meta['uav_supi'] in user_uavs:
+                flight_data.append({
+                    'id': meta['filename'], 
+                    'name': os.path.splitext(meta['filename'])[0],
+                    'blocks': meta['blocks'],
+                    'uav_supi': meta['uav_supi']
+                })
         
+        response_cache.set(cache_key, flight_data)
         return jsonify(flight_data)
         
     except Exception as e:
@@ -903,29 +1788,31 @@ def get_log(filename):
     # Check access permissions
     token = request.headers.get('Authorization')
     if token and AUTH_SYSTEM_AVAILABLE:
-        username = verify_token(token)
-        if username:
-            role = get_user_role(username)
+        identity = resolve_user(token)
+        if identity:
+            _, role, user_uavs = identity
             
-            # Load chain to check UAV
+            # Check the UAV before the chain is verified or loaded
             try:
-                with open(file_path, 'r') as f:
-                    chain_data = json.load(f)
-                    uav_supi = chain_data[0].get('event_log', [{}])[0].get('uav_supi', 'Unknown')
-                    
-                    # Check if user has access
-                    if role != 'admin':
-                        user_uavs = [uav['uav_supi'] for uav in get_user_uavs(username)]
-                        if uav_supi not in user_uavs:
-                            return jsonify({'error': 'Access denied'}), 403
+                uav_supi = archive_uav_supi(file_path)
+                
+                # Check if user has access
+                if role != 'admin':
+                    if uav_supi not in user_uavs:
+                        return jsonify({'error': 'Access denied'}), 403
             except:
                 pass
     
     verification_result = verify_log(file_path)
     
+    # Splice JSON archive bytes straight into the response when possible
+    raw_chain = read_verified_archive(file_path) if filename.endswith('.json') else None
+    if raw_chain is not None:
+        body = b'{"verification":' + dumps_json(verification_result) + b',"chain":' + raw_chain + b'}'
+        return app.response_class(body, mimetype='application/json')
+    
     try:
-        with open(file_path, 'r') as f:
-            chain_data = json.load(f)
+        chain_data = load_chain(file_path)
     except Exception as e:
         chain_data = []
         verification_result = {'secured': False, 'message': f'Failed to load chain data: {str(e)}', 'hash': None}
@@ -948,13 +1835,13 @@ def start_flight():
     token = request.headers.get('Authorization')
     username = None
     if token and AUTH_SYSTEM_AVAILABLE:
-        username = verify_token(token)
+        identity = resolve_user(token)
         
         # Check if user has access to this UAV (unless admin)
-        if username:
-            role = get_user_role(username)
+        if identity:
+            username, role, user_uavs = identity
             if role != 'admin':
-                if not is_uav_assigned_to_user(username, uav_supi):
+                if uav_supi not in user_uavs:
                     return jsonify({'error': 'UAV not assigned to user'}), 403
     
     flight_id = blockchain_manager.get_next_flight_id()
@@ -980,18 +1867,14 @@ def authenticate():
     uav_supi = data.get('uav_supi')
     step = data.get('step')
     
-    if flight_id not in blockchain_manager.active_chains:
+    if not blockchain_manager.is_active(flight_id):
         return jsonify({'error': 'Invalid flight ID'}), 400
     
     if step == 1:
         long_term_key = UAV_DB[uav_supi]
         rand, autn, xres_star, ktx = generate_auth_vector_simulated(uav_supi, long_term_key)
         
-        blockchain_manager.pending_auth[flight_id] = {
-            'xres_star': xres_star,
-            'ktx': ktx,
-            'rand': rand
-        }
+        blockchain_manager.pending_auth[flight_id] = AuthVec(xres_star.encode('utf-8'), ktx, rand)
         
         return jsonify({
             'status': 'CHALLENGE_ISSUED',
@@ -1003,15 +1886,17 @@ def authenticate():
         res_star_received = data.get('res_star')
         pending = blockchain_manager.pending_auth.get(flight_id)
         
-        if pending and res_star_received == pending['xres_star']:
-            session_key = pending['ktx']
+        # Constant-time comparison so the response check leaks no timing
+        if (pending and isinstance(res_star_received, str) and
+                hmac.compare_digest(res_star_received.encode('utf-8'), pending.xres_star)):
+            session_key = pending.ktx
             
             auth_tx = {
                 'tx_id': f'AUTH_SUCCESS_{uav_supi}_{int(time.time())}',
                 'uav_supi': uav_supi,
                 'status': 'AUTHENTICATED',
                 'session_key_sim': session_key,
-                'auth_rand': pending['rand']
+                'auth_rand': pending.rand
             }
             
             with blockchain_manager.lock:
@@ -1032,20 +1917,15 @@ def authenticate():
                 'reason': 'RES* mismatch'
             }), 401
 
-@app.route('/api/log_telemetry', methods=['POST'])
-def log_telemetry():
-    """Logs telemetry data transaction with smart contract and anomaly detection"""
-    data = request.json
-    flight_id = data.get('flight_id')
-    telemetry = data.get('telemetry')
-    
-    if flight_id not in blockchain_manager.active_chains:
-        return jsonify({'error': 'Invalid flight ID'}), 400
-    
+TELEMETRY_BULK_MAX = 256  # records accepted in one /api/log_telemetry_bulk request
+
+def evaluate_telemetry(flight_id, telemetry):
+    """Runs the smart contracts and anomaly detector on one telemetry record."""
     violations = []
     if contract_manager:
         telemetry['flight_id'] = flight_id
-        violations = contract_manager.evaluate_all(telemetry)
+        # Plain dicts: violations are stored in the ledger transaction
+        violations = [v.as_dict() for v in contract_manager.evaluate_all(telemetry)]
     
     anomaly_result = {'anomaly': False}
     if anomaly_detector and anomaly_detector.trained:
@@ -1057,19 +1937,50 @@ def log_telemetry():
             print(f"   Severity: {anomaly_result.get('severity')}")
             print(f"   Reasons: {', '.join(anomaly_result.get('reasons', []))}")
     
+    return violations, anomaly_result
+
+def pool_telemetry(flight_id, records):
+    """
+    Adds evaluated telemetry records to a flight's transaction pool.
+    
+    Args:
+        flight_id: Active flight identifier
+        records: List of (telemetry, tx_id, violations, anomaly_result)
+    
+    Returns:
+        Pool size after adding, or None if the flight is no longer active
+    """
     with blockchain_manager.lock:
-        telemetry_tx = {
-            'type': 'TELEMETRY_TX',
-            'uav_supi': blockchain_manager.active_chains[flight_id]['uav_supi'],
-            'session_key': blockchain_manager.active_chains[flight_id]['session_key'],
-            'data': telemetry,
-            'tx_id': data.get('tx_id', f'TELEM_{int(time.time())}'),
-            'contract_violations': violations,
-            'anomaly': anomaly_result
-        }
+        chain_data = blockchain_manager.active_chains.get(flight_id)
+        if chain_data is None:
+            return None
         
-        blockchain_manager.active_chains[flight_id]['transaction_pool'].append(telemetry_tx)
-        pool_size = len(blockchain_manager.active_chains[flight_id]['transaction_pool'])
+        for telemetry, tx_id, violations, anomaly_result in records:
+            chain_data['transaction_pool'].append({
+                'type': 'TELEMETRY_TX',
+                'uav_supi': chain_data['uav_supi'],
+                'session_key': chain_data['session_key'],
+                'data': telemetry,
+                'tx_id': tx_id or f'TELEM_{int(time.time())}',
+                'contract_violations': violations,
+                'anomaly': anomaly_result
+            })
+        return len(chain_data['transaction_pool'])
+
+@app.route('/api/log_telemetry', methods=['POST'])
+def log_telemetry():
+    """Logs telemetry data transaction with smart contract and anomaly detection"""
+    data = request.json
+    flight_id = data.get('flight_id')
+    telemetry = data.get('telemetry')
+    
+    if not blockchain_manager.is_active(flight_id):
+        return jsonify({'error': 'Invalid flight ID'}), 400
+    
+    violations, anomaly_result = evaluate_telemetry(flight_id, telemetry)
+    pool_size = pool_telemetry(flight_id, [(telemetry, data.get('tx_id'), violations, anomaly_result)])
+    if pool_size is None:
+        return jsonify({'error': 'Invalid flight ID'}), 400
     
     if pool_size >= 3:
         current_hash = blockchain_manager.mine_block(flight_id)
@@ -1086,13 +1997,53 @@ def log_telemetry():
             'anomaly': anomaly_result
         })
 
+@app.route('/api/log_telemetry_bulk', methods=['POST'])
+def log_telemetry_bulk():
+    """Logs a batch of telemetry records from one flight in a single request"""
+    data = request.json
+    flight_id = data.get('flight_id')
+    batch = data.get('batch')
+    
+    if not blockchain_manager.is_active(flight_id):
+        return jsonify({'error': 'Invalid flight ID'}), 400
+    
+    if not isinstance(batch, list) or not batch:
+        return jsonify({'error': 'batch must be a non-empty list'}), 400
+    
+    if len(batch) > TELEMETRY_BULK_MAX:
+        return jsonify({'error': f'At most {TELEMETRY_BULK_MAX} records per batch'}), 400
+    
+    if not all(isinstance(record, dict) and isinstance(record.get('telemetry'), dict) for record in batch):
+        return jsonify({'error': 'Every record needs a telemetry object'}), 400
+    
+    # Contracts and anomaly detection run outside the chain lock, in order
+    records = []
+    results = []
+    for record in batch:
+        telemetry = record['telemetry']
+        violations, anomaly_result = evaluate_telemetry(flight_id, telemetry)
+        records.append((telemetry, record.get('tx_id'), violations, anomaly_result))
+        results.append({'tx_id': record.get('tx_id'), 'violations': violations, 'anomaly': anomaly_result})
+    
+    pool_size = pool_telemetry(flight_id, records)
+    if pool_size is None:
+        return jsonify({'error': 'Invalid flight ID'}), 400
+    
+    response = {'status': 'TX_RECEIVED', 'count': len(records), 'results': results}
+    if pool_size >= 3:
+        current_hash = blockchain_manager.mine_block(flight_id)
+        response['status'] = 'TX_BLOCK_ACK'
+        response['hash'] = current_hash[:10] if current_hash else None
+    
+    return jsonify(response)
+
 @app.route('/api/end_flight', methods=['POST'])
 def end_flight():
     """Archives a completed flight"""
     data = request.json
     flight_id = data.get('flight_id')
     
-    if flight_id not in blockchain_manager.active_chains:
+    if not blockchain_manager.is_active(flight_id):
         return jsonify({'error': 'Invalid flight ID'}), 400
     
     success = blockchain_manager.archive_flight(flight_id)
@@ -1100,20 +2051,9 @@ def end_flight():
     if success:
         print(f"📦 Flight {flight_id} archived successfully at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
         
-        # Retrain anomaly detector if needed
-        if anomaly_detector and os.path.exists(ARCHIVE_DIR):
-            historical_flights = []
-            for filename in os.listdir(ARCHIVE_DIR):
-                if filename.startswith('Flight_') and filename.endswith('.json'):
-                    try:
-                        with open(os.path.join(ARCHIVE_DIR, filename), 'r') as f:
-                            flight_data = {'chain': json.load(f)}
-                            historical_flights.append(flight_data)
-                    except:
-                        pass
-            
-            if len(historical_flights) >= 5:
-                threading.Thread(target=anomaly_detector.train, args=(historical_flights,)).start()
+        # Retrain anomaly detector if needed, entirely off the request path
+        if anomaly_detector:
+            schedule_retrain()
         
         return jsonify({'status': 'success', 'message': f'Flight {flight_id} archived'})
     else:
@@ -1130,29 +2070,35 @@ def get_active_flights():
     role = 'user'
     
     if token and AUTH_SYSTEM_AVAILABLE:
-        username = verify_token(token)
-        if username:
-            role = get_user_role(username)
+        identity = resolve_user(token)
+        if identity:
+            role = identity[1]
             if role != 'admin':
-                user_uavs = [uav['uav_supi'] for uav in get_user_uavs(username)]
+                user_uavs = identity[2]
     
+    # Snapshot under the lock, build the response after releasing it
     with blockchain_manager.lock:
-        for flight_id, chain_data in blockchain_manager.active_chains.items():
-            uav_supi = chain_data.get('uav_supi', 'Unknown')
+        snapshot = [
+            (flight_id, chain_data.get('uav_supi', 'Unknown'), chain_data.get('operator', 'Unknown'),
+             len(chain_data['chain']), chain_data.get('start_time'))
+            for flight_id, chain_data in blockchain_manager.active_chains.items()
+        ]
+    
+    now = time.time()
+    for flight_id, uav_supi, operator, chain_length, start_time in snapshot:
+        # Filter based on user permissions
+        if role == 'admin' or user_uavs is None or uav_supi in user_uavs:
+            if start_time is None:
+                start_time = now
             
-            # Filter based on user permissions
-            if role == 'admin' or user_uavs is None or uav_supi in user_uavs:
-                chain_length = len(chain_data['chain'])
-                start_time = chain_data.get('start_time', time.time())
-                
-                active_data.append({
-                    'flight_id': flight_id,
-                    'uav_supi': uav_supi,
-                    'operator': chain_data.get('operator', 'Unknown'),
-                    'blocks': chain_length,
-                    'start_time': start_time,
-                    'duration': int(time.time() - start_time)
-                })
+            active_data.append({
+                'flight_id': flight_id,
+                'uav_supi': uav_supi,
+                'operator': operator,
+                'blocks': chain_length,
+                'start_time': start_time,
+                'duration': int(now - start_time)
+            })
     
     return jsonify({
         'active_flights': active_data,
@@ -1162,34 +2108,20 @@ def get_active_flights():
 @app.route('/api/flight_activity/<int:flight_id>', methods=['GET'])
 def get_flight_activity(flight_id):
     """Returns recent activity for an active flight"""
-    if flight_id not in blockchain_manager.active_chains:
+    if not blockchain_manager.is_active(flight_id):
         return jsonify({'error': 'Flight not active'}), 404
     
     with blockchain_manager.lock:
-        chain = blockchain_manager.active_chains[flight_id]['chain']
+        chain_data = blockchain_manager.active_chains.get(flight_id)
+        if chain_data is None:
+            return jsonify({'error': 'Flight not active'}), 404
         
-        recent_activity = []
-        for block in chain[-5:]:
-            for tx in block['transactions']:
-                if tx.get('type') == 'TELEMETRY_TX':
-                    data = tx.get('data', {})
-                    recent_activity.append({
-                        'timestamp': block['timestamp'],
-                        'type': 'telemetry',
-                        'coordinates': f"({data.get('x_pos', 0):.2f}, {data.get('y_pos', 0):.2f})",
-                        'altitude': f"{data.get('z_alt', 0):.2f}m",
-                        'speed': f"{data.get('vel_mag', 0):.2f} m/s"
-                    })
-                elif tx.get('status') == 'AUTHENTICATED':
-                    recent_activity.append({
-                        'timestamp': block['timestamp'],
-                        'type': 'authentication',
-                        'message': 'UAV Authenticated Successfully'
-                    })
+        # Activity of the last 5 blocks, newest 10 entries
+        rows = chain_data['activity'].recent_rows(len(chain_data['chain']) - 5, 10)
     
     return jsonify({
         'flight_id': flight_id,
-        'activity': recent_activity[-10:]
+        'activity': FlightActivity.format_rows(rows)
     })
 
 # ============================================================================
@@ -1215,11 +2147,11 @@ def contract_violations():
     for contract in contract_manager.contracts:
         all_violations.extend(contract.violations)
     
-    all_violations.sort(key=lambda x: x['timestamp'], reverse=True)
+    all_violations.sort(key=lambda x: x.timestamp, reverse=True)
     
     return jsonify({
         'total': len(all_violations),
-        'violations': all_violations[:50]
+        'violations': [v.as_dict() for v in all_violations[:50]]
     })
 
 @app.route('/api/anomaly/stats', methods=['GET'])
@@ -1237,23 +2169,15 @@ def retrain_anomaly_detector():
     if not anomaly_detector:
         return jsonify({'error': 'Anomaly detection not available'}), 503
     
-    historical_flights = []
+    archive_paths = list_archive_paths(TRAINING_FLIGHT_LIMIT)
     
-    for filename in os.listdir(ARCHIVE_DIR):
-        if filename.startswith('Flight_') and filename.endswith('.json'):
-            try:
-                with open(os.path.join(ARCHIVE_DIR, filename), 'r') as f:
-                    flight_data = {'chain': json.load(f)}
-                    historical_flights.append(flight_data)
-            except:
-                pass
-    
-    if anomaly_detector.train(historical_flights):
-        log_activity(request.current_user, 'AI_MODEL_RETRAINED', None, f'Retrained on {len(historical_flights)} flights')
+    if anomaly_detector.train(iter_archived_flights(archive_paths)):
+        training_samples = anomaly_detector.training_samples
+        log_activity(request.current_user, 'AI_MODEL_RETRAINED', None, f'Retrained on {training_samples} flights')
         
         return jsonify({
             'status': 'success',
-            'message': f'Model retrained on {len(historical_flights)} flights'
+            'message': f'Model retrained on {training_samples} flights'
         })
     else:
         return jsonify({
@@ -1268,32 +2192,33 @@ def retrain_anomaly_detector():
 @app.route('/api/system_status', methods=['GET'])
 def system_status():
     """Returns system health and statistics"""
-    archived_count = len([f for f in os.listdir(ARCHIVE_DIR) if f.startswith('Flight_')]) if os.path.exists(ARCHIVE_DIR) else 0
-    
-    with blockchain_manager.lock:
-        active_count = len(blockchain_manager.active_chains)
-    
-    features = {
-        'smart_contracts': SMART_CONTRACTS_AVAILABLE,
-        'anomaly_detection': ANOMALY_DETECTION_AVAILABLE and anomaly_detector.trained if anomaly_detector else False,
-        '2d_visualization': True,
-        'user_authentication': AUTH_SYSTEM_AVAILABLE,
-        'role_based_access': AUTH_SYSTEM_AVAILABLE
-    }
-    
-    user_count = get_user_count() if AUTH_SYSTEM_AVAILABLE else 0
+    status = response_cache.get('system_status')
+    if status is None:
+        archived_count = archived_flight_count()
+        
+        features = {
+            'smart_contracts': SMART_CONTRACTS_AVAILABLE,
+            'anomaly_detection': ANOMALY_DETECTION_AVAILABLE and anomaly_detector.trained if anomaly_detector else False,
+            '2d_visualization': True,
+            'user_authentication': AUTH_SYSTEM_AVAILABLE,
+            'role_based_access': AUTH_SYSTEM_AVAILABLE
+        }
+        
+        user_count = get_user_count() if AUTH_SYSTEM_AVAILABLE else 0
+        
+        status = {
+            'status': 'online',
+            'archived_flights': archived_count,
+            'registered_uavs': len(UAV_DB),
+            'registered_users': user_count,
+            'features': features,
+            'version': '3.0.0',
+            'author': 'Muntasir Al Mamun (@Muntasir-Mamun7)'
+        }
+        response_cache.set('system_status', status)
     
-    return jsonify({
-        'status': 'online',
-        'timestamp': time.time(),
-        'active_flights': active_count,
-        'archived_flights': archived_count,
-        'registered_uavs': len(UAV_DB),
-        'registered_users': user_count,
-        'features': features,
-        'version': '3.0.0',
-        'author': 'Muntasir Al Mamun (@Muntasir-Mamun7)'
-    })
+    # Live values are never served from the cache
+    return jsonify(dict(status, timestamp=time.time(), active_flights=blockchain_manager.active_count))
 
 @app.route('/api/user_stats', methods=['GET'])
 def api_user_stats():
@@ -1346,4 +2271,6 @@ if __name__ == '__main__':
         print("⚠️  Install it for full authentication features.")
         print("=" * 80 + "\n")
     
+    # Development server; for production use: gunicorn wsgi:app
+    # (settings in gunicorn.conf.py)
     app.run(host='0.0.0.0', port=API_PORT, threaded=True, debug=False)
\ No newline at end of file
@@ -1,11 +1,37 @@
-import airsim
 import json
 import time 
 import hashlib
+import hmac
 import os
 import sys
 import datetime
 import socket
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import math
+from math import hypot, isfinite
+
+from fast_sha256 import sha256, poh_chain
+
+# Import Numba for the JIT-compiled telemetry packer (optional)
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+    print("✅ Numba loaded")
+except ImportError:
+    print("⚠️  Numba not found. Telemetry is packed in pure Python.")
+    NUMBA_AVAILABLE = False
+
+# Import orjson for fast ledger serialization (optional, never used for hashing)
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+    print("✅ orjson loaded")
+except ImportError:
+    print("⚠️  orjson not found. Using standard json for the ledger.")
+    ORJSON_AVAILABLE = False
 
 # ============================================================================
 # UAV BLOCKCHAIN AUTHENTICATION CLIENT WITH EPOH (Enhanced Proof of History)
@@ -23,16 +49,29 @@ API_PORT = 5000                     # The GCS_LeaderNode.py API port
 UAV_SUPI = 'UAV_A1'                 # UAV Subscriber Permanent Identifier
 LONG_TERM_KEY = 'K_LongTerm_A1'     # Long-term authentication key
 
-LEDGER_FILE = 'epoh_ledger.json'    # Live blockchain ledger
+LEDGER_FILE = 'epoh_ledger.ndjson'  # Live blockchain ledger (one block per line)
+MANIFEST_FILE = 'epoh_manifest.json' # Tip of the live ledger
 ARCHIVE_DIR = 'flight_archives'     # Archived flight logs directory
 COUNT_FILE = 'flight_count.txt'     # Flight counter
 UAV_DB = {'UAV_A1': 'K_LongTerm_A1', 'UAV_B2': 'K_LongTerm_B2'}
+
+# AUTH_SUCCESS transaction id prefix of every known UAV, built once
+AUTH_TX_PREFIXES = {supi: f'AUTH_SUCCESS_{supi}_' for supi in UAV_DB}
+
+BLOCK_BATCH_SIZE = 16               # Telemetry TXs per mined block
+MAX_BLOCK_AGE = 10.0                # Seconds before a partial batch is mined anyway
 # -----------------------------------
 
 # =============================================================================
 # SECTION 1: CORE BLOCKCHAIN & CRYPTOGRAPHIC FUNCTIONS
 # =============================================================================
 
+# One shared encoder: json.dumps() builds a new one per call when options are
+# passed. Hashes depend on this exact output (the GCS and the browser verifier
+# recompute them); it mirrors canonical_json in GCS_LeaderNode.py, which
+# explains why it is not orjson.
+_canonical_encoder = json.JSONEncoder(sort_keys=True, separators=(',', ':'))
+
 def hash_block(block):
     """
     Calculates the SHA-256 hash of a block for blockchain linking.
@@ -48,9 +87,112 @@ def hash_block(block):
     if 'current_hash' in temp_block:
         del temp_block['current_hash']
     # CRITICAL: Use separators to remove whitespace (consistent with verification)
-    block_string = json.dumps(temp_block, sort_keys=True, separators=(',', ':'))
+    block_string = _canonical_encoder.encode(temp_block)
     return hashlib.sha256(block_string.encode()).hexdigest()
 
+# Hashed fields of every block mined here, in canonical (sorted) key order
+BLOCK_FIELDS = ('event_log', 'index', 'previous_hash', 'timestamp', 'transactions')
+
+def stream_block_digest(block, payloads=None):
+    """
+    Calculates the raw SHA-256 digest of hash_block(block) in pieces.
+    
+    The block is walked in canonical key order and each event and
+    transaction is hashed as soon as it is encoded, so the full block
+    string is never built. Transactions reuse their cached canonical bytes
+    when given. The digest matches hash_block().
+    
+    Args:
+        block (dict): Block dictionary
+        payloads (list): canonical_payload() of each of block['transactions']
+        
+    Returns:
+        bytes: SHA-256 digest of the block
+    """
+    timestamp = block.get('timestamp')
+    # Any other block shape (or a non-finite timestamp) takes the generic path
+    if (len(block) - ('current_hash' in block) != len(BLOCK_FIELDS)
+            or not all(k in block for k in BLOCK_FIELDS)
+            or type(timestamp) is not float or not isfinite(timestamp)
+            or type(block['index']) is not int
+            or type(block['previous_hash']) is not str):
+        return bytes.fromhex(hash_block(block))
+    
+    if payloads is None:
+        payloads = [canonical_payload(tx) for tx in block['transactions']]
+    
+    encode = _canonical_encoder.encode
+    h = sha256()
+    update = h.update
+    
+    update(b'{"event_log":[')
+    for i, event in enumerate(block['event_log']):
+        if i:
+            update(b',')
+        update(encode(event).encode('utf-8'))
+    update(b'],"index":%d,"previous_hash":' % block['index'])
+    update(_encode_string(block['previous_hash']).encode('utf-8'))
+    update(b',"timestamp":' + repr(timestamp).encode('ascii'))
+    update(b',"transactions":[')
+    for i, payload in enumerate(payloads):
+        if i:
+            update(b',')
+        update(payload)
+    update(b']}')
+    return h.digest()
+
+# Canonical form of the fixed-shape telemetry transaction, keys pre-sorted.
+# Must produce exactly what _canonical_encoder would for the same dict.
+TELEMETRY_TX_TEMPLATE = '{"data":%s,"session_key":%s,"tx_id":%s,"type":"TELEMETRY_TX","uav_supi":%s}'
+TELEMETRY_DATA_TEMPLATE = '{"vel_mag":%r,"x_pos":%r,"y_pos":%r,"z_alt":%r}'
+TELEMETRY_TX_KEYS = frozenset(('data', 'session_key', 'tx_id', 'type', 'uav_supi'))
+TELEMETRY_DATA_KEYS = frozenset(('vel_mag', 'x_pos', 'y_pos', 'z_alt'))
+_encode_string = json.encoder.encode_basestring_ascii
+
+def _canonical_telemetry(tx):
+    """
+    Fills the telemetry templates, or returns None if tx has any other shape.
+    
+    Args:
+        tx (dict): Transaction data
+        
+    Returns:
+        str or None: Canonical JSON of the transaction
+    """
+    data = tx.get('data')
+    if tx.keys() != TELEMETRY_TX_KEYS or type(data) is not dict or data.keys() != TELEMETRY_DATA_KEYS:
+        return None
+    
+    values = (data['vel_mag'], data['x_pos'], data['y_pos'], data['z_alt'])
+    # repr() matches the encoder only for finite floats
+    if not all(type(v) is float and isfinite(v) for v in values):
+        return None
+    
+    strings = (tx['session_key'], tx['tx_id'], tx['uav_supi'])
+    if not all(type(v) is str for v in strings):
+        return None
+    
+    return TELEMETRY_TX_TEMPLATE % (
+        TELEMETRY_DATA_TEMPLATE % values,
+        _encode_string(strings[0]), _encode_string(strings[1]), _encode_string(strings[2])
+    )
+
+def canonical_payload(data):
+    """
+    Serializes a transaction into the canonical bytes embedded in the PoH sequence.
+    
+    Args:
+        data (dict): Transaction data
+        
+    Returns:
+        bytes: Compact, key-sorted JSON encoding
+    """
+    if data.get('type') == 'TELEMETRY_TX':
+        canon = _canonical_telemetry(data)
+        if canon is not None:
+            return canon.encode('utf-8')
+    return _canonical_encoder.encode(data).encode('utf-8')
+
 def calculate_session_key_simulated(long_term_key, rand):
     """
     Simulates the derivation of the Session Key (KTx).
@@ -135,10 +277,47 @@ def get_next_flight_number():
     
     return next_id
 
+def ledger_line(block):
+    """
+    Serializes a block as one JSON Lines ledger entry.
+    
+    Args:
+        block (dict): Block to persist
+        
+    Returns:
+        bytes: Compact JSON followed by a newline
+    """
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(block, option=orjson.OPT_APPEND_NEWLINE)
+    return (json.dumps(block) + '\n').encode('utf-8')
+
+def load_ledger(path=LEDGER_FILE):
+    """
+    Rebuilds a chain from the live JSON Lines ledger, one block at a time.
+    
+    Args:
+        path (str): Ledger file to read
+        
+    Returns:
+        list: Blocks in chain order (empty if the ledger does not exist)
+    """
+    chain = []
+    if not os.path.exists(path):
+        return chain
+    loads = orjson.loads if ORJSON_AVAILABLE else json.loads
+    with open(path, 'rb') as f:
+        for line in f:
+            if line.strip():
+                chain.append(loads(line))
+    return chain
+
 def archive_current_ledger(flight_id):
     """
     Archives the current flight's blockchain ledger to permanent storage.
     
+    The live ledger is JSON Lines; archives stay a single JSON array so the
+    GCS and the audit dashboard read them unchanged.
+    
     Args:
         flight_id (int): Flight identifier number
         
@@ -150,8 +329,15 @@ def archive_current_ledger(flight_id):
         archive_path = os.path.join(ARCHIVE_DIR, archive_name)
         
         try:
-            # Move the file from the live ledger to the archive folder
-            os.rename(LEDGER_FILE, archive_path)
+            # Convert the live ledger into the archive folder, then drop it
+            chain = load_ledger(LEDGER_FILE)
+            tmp_path = archive_path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(chain, f, separators=(',', ':'))
+            os.replace(tmp_path, archive_path)
+            os.remove(LEDGER_FILE)
+            if os.path.exists(MANIFEST_FILE):
+                os.remove(MANIFEST_FILE)
             print(f"📦 Archiver: Successfully archived log as {archive_name}")
             return archive_name
         except Exception as e:
@@ -182,8 +368,18 @@ class EPOH_Core:
             difficulty (int): Number of sequential hashes per transaction
         """
         self.difficulty = difficulty
-        self.latest_hash = '0' * 64
+        self.latest_hash = bytes(32)  # raw 32-byte chain state
         self.sequence_count = 0
+        self.last_timestamp = 0.0
+
+    @property
+    def latest_hash_hex(self):
+        """Hex form of the chain state, as published in blocks and event logs."""
+        return self.latest_hash.hex()
+
+    @latest_hash_hex.setter
+    def latest_hash_hex(self, value):
+        self.latest_hash = bytes.fromhex(value)
         
     def generate_sequential_hash(self):
         """
@@ -191,10 +387,9 @@ class EPOH_Core:
         This creates a verifiable delay function (VDF).
         
         Returns:
-            str: Next sequential hash
+            bytes: Next sequential hash (raw 32-byte digest)
         """
-        data = self.latest_hash.encode('utf-8')
-        new_hash = hashlib.sha256(data).hexdigest()
+        new_hash = sha256(self.latest_hash).digest()
         self.latest_hash = new_hash
         self.sequence_count += 1
         return new_hash
@@ -208,16 +403,46 @@ class EPOH_Core:
             data_payload (dict): Transaction data to embed
             
         Returns:
-            tuple: (timestamp, hash_at_event)
+            tuple: (sequence, hash_at_event)
+        """
+        return self.embed_canonical(canonical_payload(data_payload))
+
+    def embed_canonical(self, data_bytes):
+        """
+        Embeds an already canonicalized transaction into the PoH sequence.
+        
+        Args:
+            data_bytes (bytes): Output of canonical_payload()
+            
+        Returns:
+            tuple: (sequence, hash_at_event) - the PoH sequence count is the
+                   event's logical timestamp within the block
         """
-        # CRITICAL: Use separators to remove whitespace
-        data_string = json.dumps(data_payload, sort_keys=True, separators=(',', ':'))
-        combined_data = (self.latest_hash + data_string).encode('utf-8')
-        self.latest_hash = hashlib.sha256(combined_data).hexdigest()
+        # Feed state and payload as two updates rather than concatenating
+        h = sha256(self.latest_hash)
+        h.update(data_bytes)
+        self.latest_hash = h.digest()
         self.sequence_count += 1
-        return time.time(), self.latest_hash
+        return self.sequence_count, self.latest_hash_hex
+
+    def next_timestamp(self):
+        """
+        Samples the wall clock once for a new block, never going backwards.
+        
+        time.time() can step back (NTP corrections); block timestamps must
+        stay strictly increasing for chain verification, so a backwards
+        reading is clamped to just after the previous block.
         
-    def create_block(self, transactions, previous_hash, current_chain_length, flight_id):
+        Returns:
+            float: Block timestamp in seconds since the epoch
+        """
+        now = time.time()
+        if now <= self.last_timestamp:
+            now = self.last_timestamp + 0.001
+        self.last_timestamp = now
+        return now
+        
+    def create_block(self, transactions, previous_hash, current_chain_length, flight_id, payloads=None):
         """
         Creates a new blockchain block with EPOH temporal proofs.
         
@@ -230,47 +455,59 @@ class EPOH_Core:
             previous_hash (str): Hash of the previous block
             current_chain_length (int): Current length of the chain
             flight_id (int): Flight identifier
+            payloads (list): Cached canonical_payload() of each transaction
             
         Returns:
             dict: Complete block structure
         """
-        self.latest_hash = previous_hash
+        # Phase 1: serialize every transaction up front. This work is
+        # independent per transaction, unlike the hash chain below.
+        if payloads is None:
+            payloads = [canonical_payload(tx) for tx in transactions]
+        
+        self.latest_hash_hex = previous_hash
         self.sequence_count = 0
-        event_log = []
+        # Sized up front: one event per transaction
+        event_log = [None] * len(transactions)
         
-        # Process each transaction with PoH
-        for tx in transactions:
+        # One clock sample per block; events are ordered by PoH sequence
+        block_time = self.next_timestamp()
+        
+        # Phase 2: process each transaction with PoH, strictly in order
+        for i, (tx, payload) in enumerate(zip(transactions, payloads)):
             # Generate sequential hashes (VDF - Verifiable Delay Function)
-            for _ in range(self.difficulty): 
-                self.generate_sequential_hash()
+            self.latest_hash = poh_chain(self.latest_hash, self.difficulty)
+            self.sequence_count += self.difficulty
             
             # Embed the transaction into PoH sequence
-            tx_time, tx_hash = self.embed_transaction(tx)
+            tx_sequence, tx_hash = self.embed_canonical(payload)
             
             # Record the event with temporal proof
-            event_log.append({
+            event_log[i] = {
                 'event_type': 'TRANSACTION_EMBEDDED', 
-                'timestamp': tx_time, 
+                'timestamp': block_time, 
+                'sequence': tx_sequence,  # PoH sequence count (logical time)
                 'hash_at_event': tx_hash,  # PoH hash (temporal proof)
                 'tx_id': tx.get('tx_id'), 
                 'flight_id': flight_id
-            })
+            }
             
         # Build the block structure
         final_block = {
             'index': current_chain_length + 1, 
-            'timestamp': time.time(),
+            'timestamp': block_time,
             'previous_hash': previous_hash, 
             'event_log': event_log,
             'transactions': transactions
         }
         
-        # CRITICAL: Use standard hash_block() for blockchain linking
-        # This ensures verification consistency across Python and JavaScript
-        final_block['current_hash'] = hash_block(final_block)
+        # CRITICAL: Same bytes as the standard hash_block() for blockchain
+        # linking, so verification stays consistent across Python and JavaScript
+        block_digest = stream_block_digest(final_block, payloads)
+        final_block['current_hash'] = block_digest.hex()
         
-        # Update EPOH state for continuity
-        self.latest_hash = final_block['current_hash']
+        # Update EPOH state for continuity (already raw, no hex round trip)
+        self.latest_hash = block_digest
         
         return final_block
 
@@ -300,16 +537,120 @@ class LeaderNodeLocal:
         self.flight_id = flight_id
         self.chain = []
         self.transaction_pool = []
+        self.payload_pool = []  # canonical bytes of each pooled transaction
         self.pending_auth_challenges = {}
+        self.last_mine = time.monotonic()
         self.epoh = EPOH_Core(difficulty=2)
+        
+        # Mined blocks are written to the ledger by a background thread so
+        # disk I/O never stalls the flight loop
+        self._persist_q = queue.Queue()
+        self._persist_thread = threading.Thread(target=self._persist_worker, daemon=True)
+        self._persist_thread.start()
+        
         self.create_genesis_block()
 
     def save_chain(self):
         """
-        Persists the blockchain to disk.
+        Rewrites the whole ledger from memory (used when a flight starts).
+        """
+        with open(LEDGER_FILE, 'wb') as f:
+            f.write(b''.join(ledger_line(block) for block in self.chain))
+        self.save_manifest(len(self.chain), self.chain[-1]['current_hash'] if self.chain else None)
+
+    def append_block(self, block):
+        """
+        Queues one newly mined block for appending to the ledger.
+        
+        Args:
+            block (dict): Block just added to the chain
+        """
+        self._persist_q.put((block, len(self.chain)))
+
+    def flush(self):
+        """
+        Blocks until every queued block has been written to the ledger.
+        """
+        self._persist_q.join()
+
+    def _persist_worker(self):
+        """
+        Background thread appending queued blocks to the ledger file.
         """
-        with open(LEDGER_FILE, 'w') as f:
-            json.dump(self.chain, f, indent=4)
+        while True:
+            items = [self._persist_q.get()]
+            # Drain whatever else is queued so a burst costs one write + fsync
+            while True:
+                try:
+                    items.append(self._persist_q.get_nowait())
+                except queue.Empty:
+                    break
+            
+            try:
+                with open(LEDGER_FILE, 'ab') as f:
+                    f.write(b''.join(ledger_line(block) for block, _ in items))
+                    f.flush()
+                    os.fsync(f.fileno())
+                block, length = items[-1]
+                self.save_manifest(length, block['current_hash'])
+            except Exception as e:
+                print(f"❌ LeaderNode: FAILED to persist block(s). Details: {e}")
+            finally:
+                for _ in items:
+                    self._persist_q.task_done()
+
+    def save_manifest(self, length, tip_hash):
+        """
+        Atomically records the ledger tip, so a reader never sees a partial file.
+        
+        Args:
+            length (int): Number of blocks in the ledger
+            tip_hash (str): Hash of the last block in the ledger
+        """
+        manifest = {
+            'flight_id': self.flight_id,
+            'length': length,
+            'tip_hash': tip_hash
+        }
+        tmp_path = MANIFEST_FILE + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, MANIFEST_FILE)
+
+    def verify_chain(self):
+        """
+        Verifies the whole chain: block links, block hashes and PoH event hashes.
+        
+        Every mined block re-seeds the PoH sequence from its previous_hash, so
+        each block's event hashes are re-derived from that block alone.
+        
+        Returns:
+            bool: True if the chain is intact
+        """
+        chain = self.chain
+        if not chain or chain[0]['current_hash'] != hash_block(chain[0]):
+            return False
+        
+        for previous_block, block in zip(chain, chain[1:]):
+            try:
+                if (block['previous_hash'] != previous_block['current_hash']
+                        or hash_block(block) != block['current_hash']):
+                    return False
+                
+                transactions = block['transactions']
+                events = block['event_log']
+                if len(events) != len(transactions):
+                    return False
+                
+                state = bytes.fromhex(block['previous_hash'])
+                for event, tx in zip(events, transactions):
+                    state = poh_chain(state, self.epoh.difficulty)
+                    state = sha256(state + canonical_payload(tx)).digest()
+                    if event.get('hash_at_event') != state.hex():
+                        return False
+            except (KeyError, TypeError, ValueError, AttributeError):
+                return False
+        return True
 
     def create_genesis_block(self):
         """
@@ -328,7 +669,8 @@ class LeaderNodeLocal:
         genesis_block['current_hash'] = hash_block(genesis_block)
         
         # Update EPOH state to match
-        self.epoh.latest_hash = genesis_block['current_hash']
+        self.epoh.latest_hash_hex = genesis_block['current_hash']
+        self.epoh.last_timestamp = genesis_block['timestamp']
         
         self.chain.append(genesis_block)
         self.save_chain()
@@ -351,14 +693,17 @@ class LeaderNodeLocal:
             self.transaction_pool, 
             last_hash, 
             len(self.chain), 
-            self.flight_id
+            self.flight_id,
+            self.payload_pool
         )
         
         self.chain.append(new_block)
-        self.save_chain()
+        self.append_block(new_block)
         print(f"⛏️  LeaderNode: ✅ EPOH Block #{new_block['index']} Mined.")
         
         self.transaction_pool = []
+        self.payload_pool = []
+        self.last_mine = time.monotonic()
         return new_block['current_hash']
 
     def handle_auth_request_1(self, uav_supi):
@@ -372,12 +717,16 @@ class LeaderNodeLocal:
         Returns:
             dict: Authentication challenge containing RAND and AUTN
         """
-        long_term_key = UAV_DB[uav_supi]
+        long_term_key = UAV_DB.get(uav_supi)
+        if long_term_key is None:
+            return {'status': 'AUTH_FAILURE', 'reason': 'Unknown UAV SUPI'}
+        
         rand, autn, xres_star, ktx = generate_auth_vector_simulated(uav_supi, long_term_key)
         
-        # Store pending challenge for verification
+        # Store pending challenge for verification (XRES* pre-encoded for
+        # the constant-time comparison)
         self.pending_auth_challenges[uav_supi] = {
-            'xres_star': xres_star, 
+            'xres_star': xres_star.encode('utf-8'), 
             'ktx_sim': ktx, 
             'rand': rand
         }
@@ -402,12 +751,14 @@ class LeaderNodeLocal:
         """
         pending_challenge = self.pending_auth_challenges.get(uav_supi)
         
-        if pending_challenge and res_star_received == pending_challenge['xres_star']:
+        # Constant-time comparison so the response check leaks no timing
+        if (pending_challenge and isinstance(res_star_received, str) and
+                hmac.compare_digest(res_star_received.encode('utf-8'), pending_challenge['xres_star'])):
             session_key = pending_challenge['ktx_sim']
             
             # Create authentication success transaction
             success_tx = {
-                'tx_id': f'AUTH_SUCCESS_{uav_supi}_{int(time.time())}',
+                'tx_id': AUTH_TX_PREFIXES[uav_supi] + str(int(time.time())),
                 'uav_supi': uav_supi, 
                 'status': 'AUTHENTICATED',
                 'session_key_sim': session_key, 
@@ -415,6 +766,7 @@ class LeaderNodeLocal:
             }
             
             self.transaction_pool.append(success_tx)
+            self.payload_pool.append(canonical_payload(success_tx))
             del self.pending_auth_challenges[uav_supi]
             
             # Mine block with authentication transaction
@@ -435,9 +787,12 @@ class LeaderNodeLocal:
             dict: Transaction receipt
         """
         self.transaction_pool.append(telemetry_tx)
+        self.payload_pool.append(canonical_payload(telemetry_tx))
         
-        # Mine block when pool reaches threshold (batching)
-        if len(self.transaction_pool) >= 3:
+        # Mine block when pool reaches the batch size, or when the oldest
+        # pooled telemetry has waited too long (bounds logging latency)
+        if (len(self.transaction_pool) >= BLOCK_BATCH_SIZE
+                or time.monotonic() - self.last_mine >= MAX_BLOCK_AGE):
             current_hash = self.mine_block()
             return {'status': 'TX_BLOCK_ACK', 'hash': current_hash[:10]}
         else:
@@ -447,6 +802,19 @@ class LeaderNodeLocal:
 # SECTION 5: UAV FLIGHT CONTROL & DATA COLLECTION
 # =============================================================================
 
+def _pack_telemetry(x, y, z, vx, vy, vz):
+    """Returns the rounded position and velocity magnitude of one sample."""
+    return round(x, 3), round(y, 3), round(z, 3), round(hypot(vx, vy, vz), 3)
+
+if NUMBA_AVAILABLE:
+    @njit(cache=True)
+    def _pack_telemetry(x, y, z, vx, vy, vz):
+        """Returns the rounded position and velocity magnitude of one sample."""
+        return round(x, 3), round(y, 3), round(z, 3), round(math.sqrt(vx * vx + vy * vy + vz * vz), 3)
+    
+    # Compile now rather than on the first telemetry sample of the flight
+    _pack_telemetry(0.0, 0.0, 0.0, 0.0, 0.0, 0.0)
+
 def get_telemetry_data(client):
     """
     Fetches key telemetry data from AirSim.
@@ -457,15 +825,19 @@ def get_telemetry_data(client):
     Returns:
         dict: Telemetry data including position and velocity
     """
-    state = client.getMultirotorState()
-    pos = state.kinematics_estimated.position
-    vel = state.kinematics_estimated.linear_velocity
+    kin = client.getMultirotorState().kinematics_estimated
+    pos = kin.position
+    vel = kin.linear_velocity
+    
+    x_pos, y_pos, z_alt, vel_mag = _pack_telemetry(
+        pos.x_val, pos.y_val, pos.z_val, vel.x_val, vel.y_val, vel.z_val
+    )
     
     telemetry = {
-        'x_pos': round(pos.x_val, 3),
-        'y_pos': round(pos.y_val, 3),
-        'z_alt': round(pos.z_val, 3), 
-        'vel_mag': round((vel.x_val**2 + vel.y_val**2 + vel.z_val**2)**0.5, 3)
+        'x_pos': x_pos,
+        'y_pos': y_pos,
+        'z_alt': z_alt, 
+        'vel_mag': vel_mag
     }
     return telemetry
 
@@ -473,6 +845,23 @@ def get_telemetry_data(client):
 # SECTION 6: MAIN FLIGHT EXECUTION & ARCHIVING
 # =============================================================================
 
+def report_telemetry_result(telemetry_count, future):
+    """
+    Reports the outcome of a telemetry transaction handled in the background.
+    
+    Args:
+        telemetry_count (int): Telemetry sequence number of the transaction
+        future: Completed future of LeaderNodeLocal.handle_telemetry_tx
+    """
+    error = future.exception()
+    if error is not None:
+        print(f"❌ Ledger Error on TX {telemetry_count}: {error}")
+        return
+    
+    result = future.result()
+    if result['status'] == 'TX_BLOCK_ACK':
+        print(f"📦 Block mined | TX Count: {telemetry_count} | Hash: {result['hash']}")
+
 def run_uav_archiver():
     """
     Main flight execution function.
@@ -502,6 +891,9 @@ def run_uav_archiver():
     # --- PHASE 2: AIRSIM CONNECTION AND TAKEOFF ---
     print("\n--- Phase 2: AirSim Connection ---")
     try:
+        # Imported here so the ledger and hashing helpers can be imported
+        # without the AirSim client stack
+        import airsim
         airsim_client = airsim.MultirotorClient(ip=AIRSIM_HOST_IP)
         airsim_client.confirmConnection()
         print("✅ AirSim API Connection Confirmed.")
@@ -527,6 +919,8 @@ def run_uav_archiver():
         # Step 1: Request Challenge from GCS
         print("📤 Sending authentication request to GCS...")
         response_1 = local_leader_node.handle_auth_request_1(UAV_SUPI)
+        if response_1.get('status') != 'CHALLENGE_ISSUED':
+            raise Exception(f"Authentication Failed - {response_1.get('reason')}")
         print(f"📥 Received challenge: RAND={response_1['rand']}")
         
         # Step 2: Calculate and Send Response
@@ -562,44 +956,49 @@ def run_uav_archiver():
         (0, 0, -10)      # Point D (back to start)
     ]
     
-    start_time = time.time()
+    start_time = time.monotonic()
     path_index = 0
     telemetry_count = 0
     
     print("🛰️  Starting telemetry data collection...\n")
     
-    while time.time() - start_time < TOTAL_FLIGHT_TIME:
-        # Navigate to next waypoint
-        wp_x, wp_y, wp_z = PATH_SEGMENTS[path_index % len(PATH_SEGMENTS)]
-        path_index += 1
-        
-        airsim_client.moveToPositionAsync(wp_x, wp_y, wp_z, 5, timeout_sec=1).join()
-        
-        # Log telemetry twice per waypoint
-        for i in range(2): 
-            if time.time() - start_time >= TOTAL_FLIGHT_TIME: 
-                break
+    # Ledger work (PoH hashing, block mining, disk writes) runs on one worker
+    # thread, so it overlaps the wait between samples while the main thread
+    # keeps driving AirSim. A single worker keeps transactions in order.
+    with ThreadPoolExecutor(max_workers=1) as ledger_worker:
+        while time.monotonic() - start_time < TOTAL_FLIGHT_TIME:
+            # Navigate to next waypoint
+            wp_x, wp_y, wp_z = PATH_SEGMENTS[path_index % len(PATH_SEGMENTS)]
+            path_index += 1
             
-            # Collect telemetry
-            telemetry_data = get_telemetry_data(airsim_client)
-            telemetry_count += 1
+            airsim_client.moveToPositionAsync(wp_x, wp_y, wp_z, 5, timeout_sec=1).join()
             
-            # Create telemetry transaction
-            telemetry_tx = {
-                'type': 'TELEMETRY_TX', 
-                'uav_supi': UAV_SUPI, 
-                'session_key': session_key, 
-                'data': telemetry_data,
-                'tx_id': f'TELEM_{telemetry_count}'
-            }
-            
-            # Add to blockchain
-            result = local_leader_node.handle_telemetry_tx(telemetry_tx)
-            
-            if result['status'] == 'TX_BLOCK_ACK':
-                print(f"📦 Block mined | TX Count: {telemetry_count} | Hash: {result['hash']}")
-            
-            time.sleep(LOG_INTERVAL)
+            # Log telemetry twice per waypoint
+            for i in range(2): 
+                if time.monotonic() - start_time >= TOTAL_FLIGHT_TIME: 
+                    break
+                
+                # Collect telemetry
+                telemetry_data = get_telemetry_data(airsim_client)
+                telemetry_count += 1
+                
+                # Create telemetry transaction
+                telemetry_tx = {
+                    'type': 'TELEMETRY_TX', 
+                    'uav_supi': UAV_SUPI, 
+                    'session_key': session_key, 
+                    'data': telemetry_data,
+                    'tx_id': f'TELEM_{telemetry_count}'
+                }
+                
+                # Add to blockchain in the background
+                future = ledger_worker.submit(local_leader_node.handle_telemetry_tx, telemetry_tx)
+                future.add_done_callback(partial(report_telemetry_result, telemetry_count))
+                
+                # Sleep until this sample's slot ends; the cadence is fixed to
+                # the flight clock, so time spent working does not accumulate
+                next_deadline = start_time + telemetry_count * LOG_INTERVAL
+                time.sleep(max(0.0, next_deadline - time.monotonic()))
     
     print(f"\n✅ Flight path completed. Total telemetry entries: {telemetry_count}")
 
@@ -620,6 +1019,15 @@ def run_uav_archiver():
         'tx_id': 'LANDING_FINAL'
     }
     local_leader_node.handle_telemetry_tx(final_tx)
+    
+    # Mine whatever is left of the last batch before archiving
+    local_leader_node.mine_block()
+    local_leader_node.flush()
+    
+    if local_leader_node.verify_chain():
+        print("🔍 Local chain verified: links, block hashes and PoH events intact")
+    else:
+        print("⚠️  Warning: Local chain failed verification")
 
     # Cleanup
     airsim_client.armDisarm(False)
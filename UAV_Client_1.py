@@ -8,10 +8,22 @@ Works with GCS_LeaderNode.py REST API (port 5000)
 
 import airsim
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import time
 import hashlib
+import itertools
 import math
+import queue
 import sys
+import threading
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    import json
+    ORJSON_AVAILABLE = False
 
 # =============================================================================
 # CONFIGURATION
@@ -21,6 +33,7 @@ import sys
 UAV_ID = 'UAV_1'
 UAV_SUPI = 'UAV_A1'
 LONG_TERM_KEY = 'K_LongTerm_A1'
+LONG_TERM_KEY_BYTES = LONG_TERM_KEY.encode('utf-8')
 FLIGHT_DURATION = 30  # Reduced to 30 seconds for quick testing
 
 # API Configuration
@@ -28,11 +41,34 @@ GCS_API_BASE = 'http://127.0.0.1:5000/api'
 
 # AirSim Configuration
 AIRSIM_HOST_IP = "192.168.43.231"  # Your AirSim IP
+AIRSIM_POLL_INTERVAL = 0.2   # seconds between background state polls
+AIRSIM_STATE_MAX_AGE = 3 * AIRSIM_POLL_INTERVAL  # older polled states are re-read directly
 
 # Flight Pattern Configuration
 TAKEOFF_ALTITUDE = 10.0  # meters
 FLIGHT_VELOCITY = 5.0    # m/s
 LOG_INTERVAL = 2.0       # seconds between telemetry logs
+TELEMETRY_QUEUE_SIZE = 64  # unsent telemetry kept while the GCS is slow (oldest dropped)
+TELEMETRY_BATCH_SIZE = 8   # samples coalesced into one /log_telemetry_bulk POST
+TELEMETRY_MAX_DELAY = 4 * LOG_INTERVAL  # seconds a sample may wait for its batch to fill
+TELEMETRY_BACKOFF_BASE = 0.5  # seconds; doubled for each consecutive failed send
+TELEMETRY_BACKOFF_MAX = 30.0  # longest pause after repeated failures
+TELEMETRY_FLUSH_TIMEOUT = TELEMETRY_BACKOFF_MAX + 15.0  # end_flight's wait for queued telemetry
+
+
+# =============================================================================
+# JSON ENCODING
+# =============================================================================
+
+if ORJSON_AVAILABLE:
+    json_dumps = orjson.dumps
+    json_loads = orjson.loads
+else:
+    def json_dumps(obj):
+        """Serialize a request body to compact UTF-8 JSON bytes."""
+        return json.dumps(obj, separators=(',', ':')).encode('utf-8')
+    
+    json_loads = json.loads
 
 
 # =============================================================================
@@ -47,12 +83,50 @@ class UAVClient:
         self.uav_id = UAV_ID
         self.uav_supi = UAV_SUPI
         self.long_term_key = LONG_TERM_KEY
+        # SHA-256 state after absorbing the long-term key; RES* only adds RAND
+        self._res_prefix = hashlib.sha256(LONG_TERM_KEY_BYTES)
         self.flight_duration = FLIGHT_DURATION
         
         self.flight_id = None
         self.session_key = None
         self.authenticated = False
-        self.start_time = None
+        self._mono_start = None  # time.monotonic() at flight start; durations only
+        self._tx_seq = itertools.count()  # unique per-client tx id suffix
+        
+        # One pooled keep-alive session for every GCS request; connection
+        # errors are retried, POSTs are never re-sent after reaching the GCS.
+        # HTTP/1.1 is enough: telemetry goes out from a single sender thread
+        # in bulk batches, so there are never overlapping requests to
+        # multiplex, and the gunicorn/Flask GCS does not speak HTTP/2.
+        self.http = requests.Session()
+        self.http.headers.update({'Content-Type': 'application/json', 'Connection': 'keep-alive'})
+        adapter = HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=8,
+            max_retries=Retry(total=2, backoff_factor=0.1, status_forcelist=[502, 503, 504])
+        )
+        self.http.mount(GCS_API_BASE.split('://', 1)[0] + '://', adapter)
+        
+        # Telemetry is posted by a background sender so the flight loop
+        # never waits on a GCS round trip
+        self._tx_queue = queue.Queue(maxsize=TELEMETRY_QUEUE_SIZE)
+        self._bulk_supported = True
+        # /log_telemetry body reused for every single send; only the sender
+        # thread fills and encodes it
+        self._tx_template = {'flight_id': None, 'telemetry': None, 'tx_id': None}
+        # Circuit breaker: after a timeout or connection error the sender
+        # pauses until _send_paused_until instead of hammering a stuck GCS;
+        # samples keep queueing meanwhile and the first send afterwards
+        # probes it again
+        self._send_failures = 0
+        self._send_paused_until = 0.0
+        self._sender = threading.Thread(target=self._telemetry_sender, daemon=True)
+        self._sender.start()
+        
+        # Latest (x, y, z, vx, vy, vz, wall_time, monotonic_time) from the
+        # AirSim poller; replaced as a whole so readers never see a torn sample
+        self._latest_state = None
+        self._poll_stop = threading.Event()
         
         # Initialize AirSim connection
         self.airsim_client = None
@@ -79,11 +153,41 @@ class UAVClient:
             self.airsim_client.armDisarm(True)
             print("✅ UAV Armed and Ready")
             
+            # Keep the newest vehicle state ready for telemetry
+            threading.Thread(target=self._poll_airsim, daemon=True).start()
+            
         except Exception as e:
             print(f"❌ Failed to connect to AirSim: {e}")
             print("⚠️  Make sure AirSim/Unreal Engine is running!")
             raise
     
+    @staticmethod
+    def read_airsim_state(client):
+        """Read position and velocity from AirSim as a flat state tuple."""
+        state = client.getMultirotorState()
+        pos = state.kinematics_estimated.position
+        vel = state.kinematics_estimated.linear_velocity
+        return (pos.x_val, pos.y_val, pos.z_val,
+                vel.x_val, vel.y_val, vel.z_val,
+                time.time(), time.monotonic())
+    
+    def _poll_airsim(self):
+        """Background loop publishing the latest AirSim state."""
+        # The msgpack-rpc client is not thread-safe, so polling uses its own
+        # connection instead of the one driving the flight
+        try:
+            client = airsim.MultirotorClient(ip=AIRSIM_HOST_IP)
+        except Exception as e:
+            print(f"⚠️  AirSim state poller disabled: {e}")
+            return
+        
+        while not self._poll_stop.is_set():
+            try:
+                self._latest_state = self.read_airsim_state(client)
+            except Exception:
+                pass  # get_telemetry reads directly once the state goes stale
+            self._poll_stop.wait(AIRSIM_POLL_INTERVAL)
+    
     # =========================================================================
     # GCS COMMUNICATION
     # =========================================================================
@@ -95,16 +199,16 @@ class UAVClient:
             print(f"📡 Connecting to GCS at {GCS_API_BASE}...")
             print(f"{'='*70}")
             
-            response = requests.post(
+            response = self.http.post(
                 f"{GCS_API_BASE}/start_flight", 
-                json={'uav_supi': self.uav_supi},
+                data=json_dumps({'uav_supi': self.uav_supi}),
                 timeout=10
             )
             
             if response.status_code == 200:
-                data = response.json()
+                data = json_loads(response.content)
                 self.flight_id = data['flight_id']
-                self.start_time = time.time()
+                self._mono_start = time.monotonic()
                 
                 print(f"✅ Connected to GCS Leader Node")
                 print(f"✈️  Flight {self.flight_id} started")
@@ -135,13 +239,13 @@ class UAVClient:
             print(f"{'='*70}")
             
             # Step 1: Request challenge
-            response = requests.post(
+            response = self.http.post(
                 f"{GCS_API_BASE}/authenticate", 
-                json={
+                data=json_dumps({
                     'flight_id': self.flight_id,
                     'uav_supi': self.uav_supi,
                     'step': 1
-                },
+                }),
                 timeout=10
             )
             
@@ -149,31 +253,33 @@ class UAVClient:
                 print(f"❌ Authentication challenge failed")
                 return False
             
-            challenge = response.json()
+            challenge = json_loads(response.content)
             rand = challenge['rand']
             
             print(f"📥 Received challenge (RAND: {str(rand)[:16]}...)")
             
             # Step 2: Calculate response (RES*)
-            xres_data = (self.long_term_key + str(rand) + 'Expected').encode('utf-8')
-            res_star = hashlib.sha256(xres_data).hexdigest()[:10]
+            h = self._res_prefix.copy()
+            h.update(str(rand).encode('ascii'))
+            h.update(b'Expected')
+            res_star = h.hexdigest()[:10]
             
             print(f"🔢 Calculated RES*: {res_star}...")
             
             # Step 3: Send response
-            response = requests.post(
+            response = self.http.post(
                 f"{GCS_API_BASE}/authenticate", 
-                json={
+                data=json_dumps({
                     'flight_id': self.flight_id,
                     'uav_supi': self.uav_supi,
                     'step': 2,
                     'res_star': res_star
-                },
+                }),
                 timeout=10
             )
             
             if response.status_code == 200:
-                auth_result = response.json()
+                auth_result = json_loads(response.content)
                 if auth_result['status'] == 'AUTH_SUCCESS':
                     self.session_key = auth_result['session_key']
                     self.authenticated = True
@@ -194,67 +300,226 @@ class UAVClient:
     # =========================================================================
     
     def get_telemetry(self):
-        """Get current telemetry from AirSim."""
-        state = self.airsim_client.getMultirotorState()
-        pos = state.kinematics_estimated.position
-        vel = state.kinematics_estimated.linear_velocity
+        """Get current telemetry from the latest polled AirSim state."""
+        sample = self._latest_state
+        if sample is None or time.monotonic() - sample[7] > AIRSIM_STATE_MAX_AGE:
+            sample = self.read_airsim_state(self.airsim_client)
+        x, y, z, vx, vy, vz, timestamp, _ = sample
         
         return {
-            'x_pos': round(pos.x_val, 3),
-            'y_pos': round(pos.y_val, 3),
-            'z_alt': round(pos.z_val, 3),
-            'vel_mag': round((vel.x_val**2 + vel.y_val**2 + vel.z_val**2)**0.5, 3),
-            'timestamp': time.time()
+            'x_pos': round(x, 3),
+            'y_pos': round(y, 3),
+            'z_alt': round(z, 3),
+            'vel_mag': round(math.hypot(vx, vy, vz), 3),
+            'timestamp': timestamp
         }
     
     def log_telemetry(self, show_details=False):
-        """Log telemetry to blockchain."""
+        """Sample telemetry and queue it for logging to the blockchain."""
         if not self.authenticated:
             return False
         
+        self.queue_telemetry(self.get_telemetry(), f'TELEM_{self.uav_id}_{next(self._tx_seq)}', show_details)
+        return True
+    
+    def queue_telemetry(self, telemetry, tx_id, show_details=False):
+        """Queue a telemetry record for the sender, dropping the oldest if full."""
+        # Records already have the /log_telemetry_bulk batch entry shape
+        record = {'telemetry': telemetry, 'tx_id': tx_id}
+        while True:
+            try:
+                self._tx_queue.put_nowait((record, show_details))
+                return
+            except queue.Full:
+                try:
+                    self._tx_queue.get_nowait()
+                    self._tx_queue.task_done()
+                except queue.Empty:
+                    pass
+    
+    def flush_telemetry(self, timeout=TELEMETRY_FLUSH_TIMEOUT):
+        """
+        Send any partial batch now and wait until all queued telemetry is sent.
+        
+        Waits out a circuit-breaker pause, but gives up after timeout seconds
+        when the GCS stays unreachable.
+        
+        Returns:
+            bool: True if everything queued before the call was sent
+        """
+        done = threading.Event()  # queue marker, set once the sender passes it
+        deadline = time.monotonic() + timeout
         try:
-            telemetry = self.get_telemetry()
+            self._tx_queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        if done.wait(max(0.0, deadline - time.monotonic())):
+            return True
+        print("⚠️  Telemetry still queued for the GCS after the flush timeout")
+        return False
+    
+    def _telemetry_sender(self):
+        """Background thread posting queued telemetry to the GCS in batches, in order."""
+        while True:
+            items = [self._tx_queue.get()]
+            deadline = time.monotonic() + TELEMETRY_MAX_DELAY
+            
+            # Fill the batch until it is full, its oldest sample is due or a
+            # flush is requested
+            while not isinstance(items[-1], threading.Event) and len(items) < TELEMETRY_BATCH_SIZE:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    items.append(self._tx_queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
             
-            response = requests.post(
+            try:
+                # Records the GCS never received are kept and retried once
+                # the circuit breaker lets telemetry through again
+                batch = [item for item in items if not isinstance(item, threading.Event)]
+                while batch:
+                    self._wait_out_pause()
+                    batch = self.send_telemetry_batch(batch)
+            except Exception as e:
+                # Keep the sender alive for the rest of the flight
+                print(f"⚠️  Telemetry sender error: {e}")
+            finally:
+                for item in items:
+                    if isinstance(item, threading.Event):
+                        item.set()
+                    self._tx_queue.task_done()
+    
+    def _wait_out_pause(self):
+        """Sleep until the circuit breaker lets telemetry through again."""
+        if self._send_failures > 0:
+            delay = self._send_paused_until - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+    
+    def _send_failed(self):
+        """Open the circuit breaker with exponential back-off."""
+        self._send_failures += 1
+        pause = min(TELEMETRY_BACKOFF_MAX, TELEMETRY_BACKOFF_BASE * 2 ** self._send_failures)
+        self._send_paused_until = time.monotonic() + pause
+        print(f"⚠️  GCS not responding, pausing telemetry for {pause:.0f}s")
+    
+    def send_telemetry_batch(self, batch):
+        """
+        Post queued (record, show_details) pairs in one bulk request.
+        
+        Returns:
+            list: The pairs still to send. They are pairs the GCS could not be
+            reached for, so re-sending them cannot log them twice.
+        """
+        if self._bulk_supported and len(batch) > 1:
+            try:
+                response = self.http.post(
+                    f"{GCS_API_BASE}/log_telemetry_bulk",
+                    data=json_dumps({
+                        'flight_id': self.flight_id,
+                        'batch': [record for record, _ in batch]
+                    }),
+                    timeout=10
+                )
+                
+                if response.status_code == 200:
+                    self._send_failures = 0
+                    result = json_loads(response.content)
+                    if result['status'] == 'TX_BLOCK_ACK':
+                        print(f"📦 Block mined | Hash: {result['hash'][:10]}...")
+                    for (record, show_details), tx_result in zip(batch, result.get('results', [])):
+                        self.report_telemetry_result(record['telemetry'], tx_result, show_details)
+                    return []
+                
+                if response.status_code != 404:
+                    print(f"⚠️  Telemetry batch failed: {response.status_code}")
+                    return []
+                
+                # Older GCS without the bulk endpoint: send one by one from now on
+                self._bulk_supported = False
+            except requests.exceptions.ConnectionError:
+                self._send_failed()
+                return batch
+            except requests.exceptions.Timeout:
+                # The GCS may have logged the batch already and does not
+                # deduplicate tx_ids, so it is not sent again
+                self._send_failed()
+                return []
+            except Exception as e:
+                print(f"⚠️  Telemetry batch error: {e}")
+                return []
+        
+        for i, (record, show_details) in enumerate(batch):
+            if self._send_failures > 0 and time.monotonic() < self._send_paused_until:
+                return batch[i:]
+            if self.send_telemetry(record, show_details) is None:
+                return batch[i:]
+        return []
+    
+    def report_telemetry_result(self, telemetry, result, show_details=False):
+        """Print the violations and anomalies the GCS reported for one sample."""
+        if show_details:
+            print(f"📤 TX sent | Pos: ({telemetry['x_pos']:.1f}, {telemetry['y_pos']:.1f}, {telemetry['z_alt']:.1f})")
+        
+        # Show violations (important only)
+        if result.get('violations'):
+            for violation in result['violations']:
+                if violation.get('severity') in ['WARNING', 'CRITICAL']:
+                    print(f"⚠️  {violation['contract']}: {violation['message']}")
+        
+        # Show critical anomalies only
+        if result.get('anomaly', {}).get('anomaly'):
+            anomaly = result['anomaly']
+            if anomaly.get('severity') == 'CRITICAL':
+                print(f"🚨 CRITICAL ANOMALY DETECTED")
+    
+    def send_telemetry(self, record, show_details=False):
+        """
+        Post one queued telemetry record to the blockchain.
+        
+        Returns:
+            bool: Whether the GCS accepted the record, or None if it could not
+            be reached and the record is safe to send again
+        """
+        telemetry = record['telemetry']
+        payload = self._tx_template
+        payload['flight_id'] = self.flight_id
+        payload['telemetry'] = telemetry
+        payload['tx_id'] = record['tx_id']
+        try:
+            response = self.http.post(
                 f"{GCS_API_BASE}/log_telemetry", 
-                json={
-                    'flight_id': self.flight_id,
-                    'telemetry': telemetry,
-                    'tx_id': f'TELEM_{self.uav_id}_{int(time.time() * 1000)}'
-                },
+                data=json_dumps(payload),
                 timeout=10
             )
             
             if response.status_code == 200:
-                result = response.json()
+                self._send_failures = 0
+                result = json_loads(response.content)
                 
                 # Show block confirmations
                 if result['status'] == 'TX_BLOCK_ACK':
                     print(f"📦 Block mined | Hash: {result['hash'][:10]}...")
-                elif show_details:
-                    print(f"📤 TX sent | Pos: ({telemetry['x_pos']:.1f}, {telemetry['y_pos']:.1f}, {telemetry['z_alt']:.1f})")
-                
-                # Show violations (important only)
-                if result.get('violations'):
-                    for violation in result['violations']:
-                        if violation.get('severity') in ['WARNING', 'CRITICAL']:
-                            print(f"⚠️  {violation['contract']}: {violation['message']}")
-                
-                # Show critical anomalies only
-                if result.get('anomaly', {}).get('anomaly'):
-                    anomaly = result['anomaly']
-                    if anomaly.get('severity') == 'CRITICAL':
-                        print(f"🚨 CRITICAL ANOMALY DETECTED")
+                    show_details = False
                 
+                self.report_telemetry_result(telemetry, result, show_details)
                 return True
             else:
                 if show_details:
                     print(f"⚠️  Telemetry failed: {response.status_code}")
                 return False
                 
+        except requests.exceptions.ConnectionError:
+            if show_details:
+                print(f"⚠️  GCS unreachable, telemetry kept for retry")
+            self._send_failed()
+            return None
         except requests.exceptions.Timeout:
             if show_details:
                 print(f"⚠️  Telemetry timeout (continuing...)")
+            self._send_failed()
             return False
         except Exception as e:
             if show_details:
@@ -316,15 +581,15 @@ class UAVClient:
                 time.sleep(LOG_INTERVAL)
             
             # Show remaining time
-            elapsed = time.time() - self.start_time
+            elapsed = time.monotonic() - self._mono_start
             remaining = max(0, self.flight_duration - elapsed)
             if remaining > 0:
                 print(f"⏳ {int(remaining)}s remaining in flight...\n")
     
     def hover_and_log(self):
         """Hover and continue logging for remaining duration."""
-        elapsed = time.time() - self.start_time
-        remaining = max(0, self.flight_duration - elapsed)
+        deadline = self._mono_start + self.flight_duration
+        remaining = max(0, deadline - time.monotonic())
         
         if remaining > 5:
             print(f"\n{'='*70}")
@@ -332,22 +597,28 @@ class UAVClient:
             print(f"{'='*70}")
             print(f"Remaining time: {int(remaining)}s\n")
             
-            logs_remaining = int(remaining / LOG_INTERVAL)
+            # Ticks are scheduled from the first log, so time spent sampling
+            # and queueing does not stretch the interval
+            next_tick = time.monotonic()
+            i = 0
             
-            for i in range(logs_remaining):
+            while True:
                 self.log_telemetry(show_details=(i % 5 == 0))  # Show details every 5th log
+                i += 1
                 
-                elapsed = time.time() - self.start_time
-                remaining = self.flight_duration - elapsed
+                next_tick += LOG_INTERVAL
+                remaining = deadline - time.monotonic()
                 
-                if remaining <= 0:
+                if remaining <= 0 or next_tick >= deadline:
                     break
                 
                 # Show countdown every 10 seconds
                 if int(remaining) % 10 == 0:
                     print(f"⏳ {int(remaining)}s remaining...")
                 
-                time.sleep(LOG_INTERVAL)
+                sleep_for = next_tick - time.monotonic()
+                if sleep_for > 0:
+                    time.sleep(sleep_for)
     
     def land(self):
         """Land the drone."""
@@ -355,25 +626,16 @@ class UAVClient:
         print(f"🛬 LANDING SEQUENCE")
         print(f"{'='*70}")
         
-        # Get current position for logging
-        pos = self.get_telemetry()
-        print(f"Landing position: ({pos['x_pos']:.2f}, {pos['y_pos']:.2f}, {abs(pos['z_alt']):.2f}m)")
+        # One sample serves both the printout and the final telemetry
+        telemetry = self.get_telemetry()
+        print(f"Landing position: ({telemetry['x_pos']:.2f}, {telemetry['y_pos']:.2f}, {abs(telemetry['z_alt']):.2f}m)")
         
-        # Log final telemetry with landing status
+        # Log final telemetry with landing status (queued behind the rest)
         try:
-            telemetry = self.get_telemetry()
             telemetry['status'] = 'LANDING_FINAL'
             
-            requests.post(
-                f"{GCS_API_BASE}/log_telemetry", 
-                json={
-                    'flight_id': self.flight_id,
-                    'telemetry': telemetry,
-                    'tx_id': f'LAND_{self.uav_id}_{int(time.time())}'
-                },
-                timeout=10
-            )
-            print("📤 Final telemetry logged")
+            self.queue_telemetry(telemetry, f'LAND_{self.uav_id}_{next(self._tx_seq)}')
+            print("📤 Final telemetry queued")
         except:
             pass
         
@@ -404,11 +666,14 @@ class UAVClient:
         print(f"Archiving to: {GCS_API_BASE}/end_flight")
         
         try:
+            # Telemetry still in the queue must reach the chain before it is archived
+            self.flush_telemetry()
+            
             print("⏳ Sending archive request (timeout: 30s)...")
             
-            response = requests.post(
+            response = self.http.post(
                 f"{GCS_API_BASE}/end_flight", 
-                json={'flight_id': self.flight_id},
+                data=json_dumps({'flight_id': self.flight_id}),
                 timeout=30  # Increased timeout for AI retraining
             )
             
@@ -416,7 +681,7 @@ class UAVClient:
             print(f"   Status Code: {response.status_code}")
             
             if response.status_code == 200:
-                result = response.json()
+                result = json_loads(response.content)
                 print(f"   Message: {result.get('message', 'Success')}")
                 print(f"✅ Flight {self.flight_id} archived successfully!")
                 print(f"📁 File: flight_archives/Flight_{self.flight_id}.json")
@@ -439,6 +704,11 @@ class UAVClient:
             import traceback
             traceback.print_exc()
             return False
+        finally:
+            # The flight is over: stop polling AirSim and release the pooled
+            # GCS connections
+            self._poll_stop.set()
+            self.http.close()
     
     # =========================================================================
     # MAIN FLIGHT EXECUTION
@@ -489,7 +759,7 @@ class UAVClient:
             self.end_flight()
             
             # Final summary
-            elapsed = time.time() - self.start_time
+            elapsed = time.monotonic() - self._mono_start
             print(f"\n{'='*70}")
             print(f"✅ FLIGHT COMPLETED SUCCESSFULLY")
             print(f"{'='*70}")
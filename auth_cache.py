@@ -0,0 +1,62 @@
+"""
+Short-Lived Authentication Cache for the GCS API
+Author: Muntasir Al Mamun
+Date: 2025-11-03
+
+Bounded LRU cache with a per-entry TTL. Used to skip the session and role
+lookups in auth_db for tokens seen within the last few seconds. Keys are
+SHA-256 digests of the tokens, never the raw tokens.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+def token_key(token):
+    """Returns the cache key for a session token."""
+    return hashlib.sha256(token.encode('utf-8')).digest()
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire after a fixed TTL"""
+
+    def __init__(self, maxsize=10000, ttl=5.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Returns the cached value, or default if missing or expired."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            if entry[0] <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value):
+        """Stores a value, evicting the least recently used entry when full."""
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        """Removes and returns a cached value."""
+        with self._lock:
+            entry = self._data.pop(key, None)
+            return default if entry is None else entry[1]
+
+    def clear(self):
+        """Drops every cached entry."""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
@@ -7,11 +7,138 @@ Version: 2.0.0 - Enterprise Role System with UAV Assignment
 
 import sqlite3
 import hashlib
+import hmac
 import secrets
+import threading
+import queue
+import atexit
+import time
 from datetime import datetime
 import os
 
 DB_FILE = 'uav_users.db'
+SCHEMA_VERSION = 3         # stored in PRAGMA user_version; see migrate_db()
+PBKDF2_ITERATIONS = 100000
+LEGACY_SALT = "UAV_AUTH_SYSTEM_SALT_2025"  # shared salt of pre-v1 password hashes
+LOG_FLUSH_INTERVAL = 0.1   # seconds audit log rows may wait to share a commit
+LOG_BATCH_MAX = 500        # audit log rows written per commit at most
+DB_CACHE_KIB = 65536       # page cache per connection; only grows as pages are read
+DB_MMAP_SIZE = 256 * 1024 * 1024  # bytes of the database file read through mmap
+SESSION_TTL = 24 * 3600    # seconds a session token stays valid
+SESSION_GC_BATCH = 32      # expired sessions removed per new session at most
+
+# RETURNING clauses (SQLite 3.35+) fold a read-then-write into one statement
+SQLITE_HAS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+# ============================================================================
+# SQL STATEMENTS
+# ============================================================================
+
+# sqlite3 keeps a per-connection cache of compiled statements keyed by the
+# SQL text, so the hot queries live here as constants and are never built
+# dynamically; with per-thread connections they are parsed once per thread.
+SQL_USER_CREDENTIALS = 'SELECT password_hash, password_salt FROM users WHERE username = ?'
+SQL_INSERT_USER = 'INSERT INTO users (username, password_hash, password_salt, email, role, is_active) VALUES (?, ?, ?, ?, ?, ?)'
+SQL_INSERT_FIRST_USER = 'INSERT INTO users (username, password_hash, password_salt, email, role, is_active) SELECT ?, ?, ?, ?, ?, ? WHERE NOT EXISTS (SELECT 1 FROM users)'
+SQL_UPDATE_PASSWORD = 'UPDATE users SET password_hash = ?, password_salt = ? WHERE username = ?'
+SQL_RECORD_LOGIN = 'UPDATE users SET last_login = CURRENT_TIMESTAMP WHERE username = ? AND is_active = 1'
+SQL_USER_INFO = 'SELECT username, email, role, is_active, created_at, last_login FROM users WHERE username = ?'
+SQL_USER_ROLE = 'SELECT role FROM users WHERE username = ?'
+SQL_CREATE_SESSION = "INSERT INTO sessions (token_hash, token, username, expires_at, ip_address, user_agent) VALUES (?, ?, ?, CAST(strftime('%s', 'now') AS INTEGER) + ?, ?, ?)"
+SQL_VERIFY_SESSION = 'SELECT s.username, s.expires_at, u.role FROM sessions s JOIN users u ON u.username = s.username WHERE s.token_hash = ? AND s.token = ?'
+SQL_SESSION_USER = 'SELECT username FROM sessions WHERE token_hash = ? AND token = ?'
+SQL_DELETE_SESSION = 'DELETE FROM sessions WHERE token_hash = ? AND token = ?'
+SQL_DELETE_SESSION_RETURNING = 'DELETE FROM sessions WHERE token_hash = ? AND token = ? RETURNING username'
+SQL_TOGGLE_USER_RETURNING = 'UPDATE users SET is_active = NOT is_active WHERE username = ? RETURNING is_active'
+SQL_USER_UAVS = 'SELECT uav_supi, assigned_at, assigned_by FROM uav_assignments WHERE username = ? AND is_active = 1'
+SQL_ASSIGN_UAV = 'INSERT OR IGNORE INTO uav_assignments (username, uav_supi, assigned_by, is_active) VALUES (?, ?, ?, 1)'
+SQL_UAV_ASSIGNED = 'SELECT id FROM uav_assignments WHERE username = ? AND uav_supi = ? AND is_active = 1'
+SQL_LOG_LOGIN = 'INSERT INTO login_history (username, ip_address, user_agent, success) VALUES (?, ?, ?, ?)'
+SQL_LOG_ACTIVITY = 'INSERT INTO activity_log (username, action, target, details) VALUES (?, ?, ?, ?)'
+SQL_LOGIN_HISTORY_USER = 'SELECT username, login_time, ip_address, user_agent, success FROM login_history WHERE username = ? ORDER BY login_time DESC LIMIT ? OFFSET ?'
+SQL_LOGIN_HISTORY_ALL = 'SELECT username, login_time, ip_address, user_agent, success FROM login_history ORDER BY login_time DESC LIMIT ? OFFSET ?'
+SQL_ACTIVITY_LOG_USER = 'SELECT username, action, target, details, timestamp FROM activity_log WHERE username = ? ORDER BY timestamp DESC LIMIT ? OFFSET ?'
+SQL_ACTIVITY_LOG_ALL = 'SELECT username, action, target, details, timestamp FROM activity_log ORDER BY timestamp DESC LIMIT ? OFFSET ?'
+
+# Sessions are keyed by a 64-bit hash of the token: an INTEGER PRIMARY KEY is
+# the table's rowid, so lookups are integer compares in the table B-tree itself
+# and no separate index over the 43-character tokens is kept. The token is
+# still stored and compared to rule out hash collisions.
+SQL_CREATE_SESSIONS_TABLE = '''
+    CREATE TABLE IF NOT EXISTS sessions (
+        token_hash INTEGER PRIMARY KEY,
+        token TEXT NOT NULL,
+        username TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        expires_at INTEGER,
+        ip_address TEXT,
+        user_agent TEXT,
+        FOREIGN KEY (username) REFERENCES users(username) ON DELETE CASCADE
+    )
+'''
+
+# expires_at holds Unix epoch seconds. The inner SELECT walks
+# idx_sessions_expires from the oldest entry, so each insert does at most
+# SESSION_GC_BATCH deletes.
+SQL_CREATE_SESSIONS_GC_TRIGGER = f'''
+    CREATE TRIGGER IF NOT EXISTS trg_sessions_gc AFTER INSERT ON sessions
+    BEGIN
+        DELETE FROM sessions WHERE rowid IN (
+            SELECT rowid FROM sessions
+            WHERE expires_at < CAST(strftime('%s', 'now') AS INTEGER)
+            LIMIT {SESSION_GC_BATCH}
+        );
+    END
+'''
+
+SQL_SYSTEM_STATS = '''
+    SELECT
+        (SELECT COUNT(*) FROM users WHERE is_active = 1),
+        (SELECT COUNT(*) FROM users WHERE role = 'admin' AND is_active = 1),
+        (SELECT COUNT(*) FROM sessions WHERE expires_at > CAST(strftime('%s', 'now') AS INTEGER)),
+        (SELECT COUNT(*) FROM uav_assignments WHERE is_active = 1),
+        (SELECT COUNT(*) FROM login_history WHERE login_time > datetime('now', '-24 hours') AND success = 1)
+'''
+
+# ============================================================================
+# CONNECTION MANAGEMENT
+# ============================================================================
+
+# One connection per thread, opened on first use and kept for the life of the
+# thread (sqlite3 connections must not be shared across threads). WAL lets
+# readers run while another thread writes.
+_local = threading.local()
+_generation = 0  # bumped by reset_database() so every thread reconnects
+
+def get_connection():
+    """
+    Returns this thread's database connection, opening it on first use.
+    
+    Use it as a context manager (with get_connection() as conn:) so the
+    statements inside commit together, or roll back on an exception.
+    The connection itself stays open for the next call.
+    """
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and _local.generation != _generation:
+        close_connection()
+        conn = None
+    if conn is None:
+        conn = sqlite3.connect(DB_FILE, timeout=10, cached_statements=256)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        conn.execute(f'PRAGMA cache_size=-{DB_CACHE_KIB}')
+        conn.execute(f'PRAGMA mmap_size={DB_MMAP_SIZE}')
+        _local.conn = conn
+        _local.generation = _generation
+    return conn
+
+def close_connection():
+    """Closes this thread's database connection, if open."""
+    conn = getattr(_local, 'conn', None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
 
 # ============================================================================
 # DATABASE INITIALIZATION
@@ -19,109 +146,158 @@ DB_FILE = 'uav_users.db'
 
 def init_db():
     """Initialize the database with users, sessions, and UAV assignment tables"""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    
-    # Users table with role support
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            password_hash TEXT NOT NULL,
-            email TEXT,
-            role TEXT DEFAULT 'user',
-            is_active BOOLEAN DEFAULT 1,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            last_login TIMESTAMP
-        )
-    ''')
-    
-    # Sessions table for token-based authentication
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS sessions (
-            token TEXT PRIMARY KEY,
-            username TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            expires_at TIMESTAMP,
-            ip_address TEXT,
-            user_agent TEXT,
-            FOREIGN KEY (username) REFERENCES users(username) ON DELETE CASCADE
-        )
-    ''')
-    
-    # UAV assignments table (many-to-many relationship)
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS uav_assignments (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT NOT NULL,
-            uav_supi TEXT NOT NULL,
-            assigned_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            assigned_by TEXT,
-            is_active BOOLEAN DEFAULT 1,
-            FOREIGN KEY (username) REFERENCES users(username) ON DELETE CASCADE,
-            UNIQUE(username, uav_supi)
-        )
-    ''')
-    
-    # Login history for security auditing
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS login_history (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT NOT NULL,
-            login_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            ip_address TEXT,
-            user_agent TEXT,
-            success BOOLEAN,
-            FOREIGN KEY (username) REFERENCES users(username) ON DELETE CASCADE
-        )
-    ''')
-    
-    # Activity log for admin auditing
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS activity_log (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT NOT NULL,
-            action TEXT NOT NULL,
-            target TEXT,
-            details TEXT,
-            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (username) REFERENCES users(username) ON DELETE CASCADE
-        )
-    ''')
-    
-    conn.commit()
-    
-    # Create default admin user if no users exist
-    cursor.execute('SELECT COUNT(*) FROM users')
-    user_count = cursor.fetchone()[0]
-    
-    if user_count == 0:
-        print("📝 Creating default admin account...")
-        admin_password = 'admin123'  # Change this in production!
-        password_hash = hash_password(admin_password)
+    with get_connection() as conn:
+        cursor = conn.cursor()
         
-        cursor.execute(
-            'INSERT INTO users (username, password_hash, email, role, is_active) VALUES (?, ?, ?, ?, ?)',
-            ('admin', password_hash, 'admin@uav-system.local', 'admin', 1)
+        # Users table with role support
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS users (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                username TEXT UNIQUE NOT NULL,
+                password_hash TEXT NOT NULL,
+                password_salt TEXT,
+                email TEXT,
+                role TEXT DEFAULT 'user',
+                is_active BOOLEAN DEFAULT 1,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                last_login TIMESTAMP
+            )
+        ''')
+        
+        # Sessions table for token-based authentication
+        cursor.execute(SQL_CREATE_SESSIONS_TABLE)
+        
+        # UAV assignments table (many-to-many relationship)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS uav_assignments (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                username TEXT NOT NULL,
+                uav_supi TEXT NOT NULL,
+                assigned_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                assigned_by TEXT,
+                is_active BOOLEAN DEFAULT 1,
+                FOREIGN KEY (username) REFERENCES users(username) ON DELETE CASCADE,
+                UNIQUE(username, uav_supi)
+            )
+        ''')
+        
+        # Login history for security auditing
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS login_history (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                username TEXT NOT NULL,
+                login_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                ip_address TEXT,
+                user_agent TEXT,
+                success BOOLEAN,
+                FOREIGN KEY (username) REFERENCES users(username) ON DELETE CASCADE
+            )
+        ''')
+        
+        # Activity log for admin auditing
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS activity_log (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                username TEXT NOT NULL,
+                action TEXT NOT NULL,
+                target TEXT,
+                details TEXT,
+                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (username) REFERENCES users(username) ON DELETE CASCADE
+            )
+        ''')
+    
+    migrate_db()
+    
+    with get_connection() as conn:
+        # Indexes for the per-request lookups, session cleanup, newest-first
+        # history pages and the statistics counts (created after migrate_db()
+        # so tables it rebuilds get theirs too)
+        conn.executescript('''
+            CREATE INDEX IF NOT EXISTS idx_sessions_username ON sessions(username);
+            CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions(expires_at);
+            CREATE INDEX IF NOT EXISTS idx_uav_user_supi_active ON uav_assignments(username, uav_supi, is_active);
+            CREATE INDEX IF NOT EXISTS idx_users_role_active ON users(role, is_active);
+            CREATE INDEX IF NOT EXISTS idx_login_history_user_time ON login_history(username, login_time DESC);
+            CREATE INDEX IF NOT EXISTS idx_login_history_time ON login_history(login_time DESC);
+            CREATE INDEX IF NOT EXISTS idx_activity_user_time ON activity_log(username, timestamp DESC);
+            CREATE INDEX IF NOT EXISTS idx_activity_time ON activity_log(timestamp DESC);
+        ''')
+        
+        # Expired sessions are collected a few at a time as new ones are
+        # created, so the table never needs a full cleanup pass
+        conn.execute(SQL_CREATE_SESSIONS_GC_TRIGGER)
+    
+    # Create default admin user if no users exist; the check and the insert
+    # are one statement, so two processes starting together cannot both add it
+    admin_password = 'admin123'  # Change this in production!
+    password_hash, salt = hash_password(admin_password)
+    
+    with get_connection() as conn:
+        cursor = conn.execute(
+            SQL_INSERT_FIRST_USER,
+            ('admin', password_hash, salt, 'admin@uav-system.local', 'admin', 1)
         )
-        conn.commit()
         
-        print("✅ Default admin account created:")
-        print("   Username: admin")
-        print("   Password: admin123")
-        print("   ⚠️  CHANGE THIS PASSWORD IMMEDIATELY!")
+        if cursor.rowcount == 1:
+            print("✅ Default admin account created:")
+            print("   Username: admin")
+            print("   Password: admin123")
+            print("   ⚠️  CHANGE THIS PASSWORD IMMEDIATELY!")
     
-    conn.close()
     print("✅ Database initialized with RBAC system")
 
+def migrate_db():
+    """Bring an existing database up to SCHEMA_VERSION"""
+    with get_connection() as conn:
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        
+        if version < 1:
+            # v1: per-user password salts (legacy rows keep NULL until next login)
+            columns = {row[1] for row in conn.execute('PRAGMA table_info(users)')}
+            if 'password_salt' not in columns:
+                conn.execute('ALTER TABLE users ADD COLUMN password_salt TEXT')
+        
+        if version < 2:
+            # v2: sessions keyed by token hash; open sessions are dropped and
+            # their users simply log in again
+            columns = {row[1] for row in conn.execute('PRAGMA table_info(sessions)')}
+            if 'token_hash' not in columns:
+                conn.execute('DROP TABLE sessions')
+                conn.execute(SQL_CREATE_SESSIONS_TABLE)
+        
+        if version < 3:
+            # v3: session expiry as INTEGER epoch seconds; sessions written
+            # with ISO strings are dropped along with the trigger comparing them
+            conn.execute("DELETE FROM sessions WHERE typeof(expires_at) != 'integer'")
+            conn.execute('DROP TRIGGER IF EXISTS trg_sessions_gc')
+        
+        if version < SCHEMA_VERSION:
+            conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
 # ============================================================================
 # PASSWORD HASHING
 # ============================================================================
 
-def hash_password(password):
-    """Hash a password using SHA-256 with salt"""
-    salt = "UAV_AUTH_SYSTEM_SALT_2025"  # In production, use per-user salt
-    return hashlib.sha256((password + salt).encode()).hexdigest()
+def hash_password(password, salt=None):
+    """
+    Hash a password with PBKDF2-HMAC-SHA256 (OpenSSL) and a per-user salt
+    
+    Returns (hash_hex, salt_hex); a fresh random salt is drawn if none is given.
+    """
+    if salt is None:
+        salt = secrets.token_hex(16)
+    derived = hashlib.pbkdf2_hmac('sha256', password.encode(), bytes.fromhex(salt), PBKDF2_ITERATIONS)
+    return derived.hex(), salt
+
+def legacy_hash_password(password):
+    """Pre-v1 hash (single SHA-256, shared salt); only checked to upgrade old rows"""
+    return hashlib.sha256((password + LEGACY_SALT).encode()).hexdigest()
+
+def hash_token(token):
+    """64-bit signed BLAKE2b digest of a session token (the sessions rowid)"""
+    digest = hashlib.blake2b(token.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'big', signed=True)
 
 # ============================================================================
 # USER MANAGEMENT
@@ -130,9 +306,6 @@ def hash_password(password):
 def register_user(username, password, email=None, role='user'):
     """Register a new user"""
     try:
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        
         # Validate username
         if len(username) < 3:
             return {'success': False, 'message': 'Username must be at least 3 characters'}
@@ -141,15 +314,13 @@ def register_user(username, password, email=None, role='user'):
         if len(password) < 6:
             return {'success': False, 'message': 'Password must be at least 6 characters'}
         
-        password_hash = hash_password(password)
+        password_hash, salt = hash_password(password)
         
-        cursor.execute(
-            'INSERT INTO users (username, password_hash, email, role, is_active) VALUES (?, ?, ?, ?, ?)',
-            (username, password_hash, email, role, 1)
-        )
-        
-        conn.commit()
-        conn.close()
+        with get_connection() as conn:
+            conn.execute(
+                SQL_INSERT_USER,
+                (username, password_hash, salt, email, role, 1)
+            )
         
         # Log activity
         log_activity('system', 'USER_REGISTERED', username, f'New user registered with role: {role}')
@@ -163,55 +334,34 @@ def register_user(username, password, email=None, role='user'):
 
 def verify_user(username, password):
     """Verify username and password"""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    
-    password_hash = hash_password(password)
-    
-    cursor.execute(
-        'SELECT username, is_active FROM users WHERE username = ? AND password_hash = ?',
-        (username, password_hash)
-    )
-    
-    result = cursor.fetchone()
-    conn.close()
+    result = get_connection().execute(SQL_USER_CREDENTIALS, (username,)).fetchone()
     
     if result:
-        # Check if user is active
-        if not result[1]:
+        stored_hash, salt = result
+        
+        if salt:
+            if not hmac.compare_digest(hash_password(password, salt)[0], stored_hash):
+                return False
+        elif not hmac.compare_digest(legacy_hash_password(password), stored_hash):
             return False
         
-        # Update last login time
-        update_last_login(username)
-        return True
+        with get_connection() as conn:
+            if not salt:
+                # Correct password on a pre-v1 row: re-hash it with its own salt
+                conn.execute(SQL_UPDATE_PASSWORD, (*hash_password(password), username))
+            
+            # Stamps the login time on active accounts only; no row updated
+            # means the account is disabled
+            return conn.execute(SQL_RECORD_LOGIN, (username,)).rowcount == 1
     
     return False
 
-def update_last_login(username):
-    """Update user's last login timestamp"""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    
-    cursor.execute(
-        'UPDATE users SET last_login = ? WHERE username = ?',
-        (datetime.now(), username)
-    )
-    
-    conn.commit()
-    conn.close()
-
 def get_user_info(username):
     """Get detailed user information"""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    
-    cursor.execute(
-        'SELECT username, email, role, is_active, created_at, last_login FROM users WHERE username = ?',
+    result = get_connection().execute(
+        SQL_USER_INFO,
         (username,)
-    )
-    
-    result = cursor.fetchone()
-    conn.close()
+    ).fetchone()
     
     if result:
         return {
@@ -226,13 +376,8 @@ def get_user_info(username):
 
 def get_user_role(username):
     """Get user's role"""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
+    result = get_connection().execute(SQL_USER_ROLE, (username,)).fetchone()
     
-    cursor.execute('SELECT role FROM users WHERE username = ?', (username,))
-    result = cursor.fetchone()
-    
-    conn.close()
     return result[0] if result else 'user'
 
 def is_admin(username):
@@ -241,26 +386,21 @@ def is_admin(username):
 
 def get_all_users():
     """Get all users (admin only)"""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    
-    cursor.execute(
+    cursor = get_connection().execute(
         'SELECT username, email, role, is_active, created_at, last_login FROM users ORDER BY created_at DESC'
     )
     
-    users = []
-    for row in cursor.fetchall():
-        users.append({
-            'username': row[0],
-            'email': row[1],
-            'role': row[2],
-            'is_active': bool(row[3]),
-            'created_at': row[4],
-            'last_login': row[5]
-        })
-    
-    conn.close()
-    return users
+    return [
+        {
+            'username': username,
+            'email': email,
+            'role': role,
+            'is_active': bool(is_active),
+            'created_at': created_at,
+            'last_login': last_login
+        }
+        for username, email, role, is_active, created_at, last_login in cursor
+    ]
 
 def update_user_role(admin_username, target_username, new_role):
     """Update user role (admin only)"""
@@ -271,16 +411,11 @@ def update_user_role(admin_username, target_username, new_role):
         return {'success': False, 'message': 'Invalid role. Must be "user" or "admin"'}
     
     try:
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        
-        cursor.execute(
-            'UPDATE users SET role = ? WHERE username = ?',
-            (new_role, target_username)
-        )
-        
-        conn.commit()
-        conn.close()
+        with get_connection() as conn:
+            conn.execute(
+                'UPDATE users SET role = ? WHERE username = ?',
+                (new_role, target_username)
+            )
         
         log_activity(admin_username, 'ROLE_CHANGED', target_username, f'Role changed to: {new_role}')
         
@@ -295,25 +430,31 @@ def toggle_user_status(admin_username, target_username):
         return {'success': False, 'message': 'Unauthorized: Admin access required'}
     
     try:
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        
-        # Get current status
-        cursor.execute('SELECT is_active FROM users WHERE username = ?', (target_username,))
-        result = cursor.fetchone()
-        
-        if not result:
-            return {'success': False, 'message': 'User not found'}
-        
-        new_status = not bool(result[0])
-        
-        cursor.execute(
-            'UPDATE users SET is_active = ? WHERE username = ?',
-            (new_status, target_username)
-        )
-        
-        conn.commit()
-        conn.close()
+        with get_connection() as conn:
+            if SQLITE_HAS_RETURNING:
+                # Flip and read back the new status in one statement
+                rows = conn.execute(SQL_TOGGLE_USER_RETURNING, (target_username,)).fetchall()
+                
+                if not rows:
+                    return {'success': False, 'message': 'User not found'}
+                
+                new_status = bool(rows[0][0])
+            else:
+                cursor = conn.cursor()
+                
+                # Get current status
+                cursor.execute('SELECT is_active FROM users WHERE username = ?', (target_username,))
+                result = cursor.fetchone()
+                
+                if not result:
+                    return {'success': False, 'message': 'User not found'}
+                
+                new_status = not bool(result[0])
+                
+                cursor.execute(
+                    'UPDATE users SET is_active = ? WHERE username = ?',
+                    (new_status, target_username)
+                )
         
         status_text = 'enabled' if new_status else 'disabled'
         log_activity(admin_username, 'USER_STATUS_CHANGED', target_username, f'Account {status_text}')
@@ -325,14 +466,9 @@ def toggle_user_status(admin_username, target_username):
 
 def get_user_count():
     """Get total number of registered users"""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    
-    cursor.execute('SELECT COUNT(*) FROM users WHERE is_active = 1')
-    count = cursor.fetchone()[0]
-    
-    conn.close()
-    return count
+    return get_connection().execute(
+        'SELECT COUNT(*) FROM users WHERE is_active = 1'
+    ).fetchone()[0]
 
 # ============================================================================
 # SESSION MANAGEMENT
@@ -342,95 +478,87 @@ def create_session(username, ip_address=None, user_agent=None):
     """Create a new session token for a user"""
     token = secrets.token_urlsafe(32)
     
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    
-    # Set expiration time (24 hours from now)
-    from datetime import timedelta
-    expires_at = datetime.now() + timedelta(hours=24)
-    
-    cursor.execute(
-        'INSERT INTO sessions (token, username, expires_at, ip_address, user_agent) VALUES (?, ?, ?, ?, ?)',
-        (token, username, expires_at, ip_address, user_agent)
-    )
-    
-    conn.commit()
-    conn.close()
+    # SQLite sets expires_at to SESSION_TTL seconds from now
+    with get_connection() as conn:
+        conn.execute(
+            SQL_CREATE_SESSION,
+            (hash_token(token), token, username, SESSION_TTL, ip_address, user_agent)
+        )
     
     # Log login
     log_login(username, ip_address, user_agent, success=True)
     
     return token
 
-def verify_token(token):
-    """Check if a token is valid and return username"""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
+def verify_session(token):
+    """
+    Check if a token is valid and return (username, role)
     
-    cursor.execute(
-        'SELECT username, expires_at FROM sessions WHERE token = ?',
-        (token,)
-    )
-    result = cursor.fetchone()
-    
-    conn.close()
+    The role is joined in from the users table on the same lookup, so callers
+    gating on role do not need a second query. It is read live rather than
+    copied into the session, so role changes apply to existing sessions.
+    """
+    result = get_connection().execute(
+        SQL_VERIFY_SESSION,
+        (hash_token(token), token)
+    ).fetchone()
     
     if result:
-        username, expires_at = result
+        username, expires_at, role = result
         
         # Check if token expired
-        if expires_at:
-            expiry_time = datetime.fromisoformat(expires_at)
-            if datetime.now() > expiry_time:
-                delete_session(token)
-                return None
+        if expires_at is not None and expires_at < time.time():
+            delete_session(token)
+            return None
         
-        return username
+        return username, role
     
     return None
 
+def verify_token(token):
+    """Check if a token is valid and return username"""
+    session = verify_session(token)
+    return session[0] if session else None
+
 def delete_session(token):
     """Delete a session (logout)"""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    
-    # Get username before deleting
-    cursor.execute('SELECT username FROM sessions WHERE token = ?', (token,))
-    result = cursor.fetchone()
-    
-    cursor.execute('DELETE FROM sessions WHERE token = ?', (token,))
-    
-    conn.commit()
-    conn.close()
+    key = (hash_token(token), token)
+    
+    with get_connection() as conn:
+        if SQLITE_HAS_RETURNING:
+            # fetchall() runs the DELETE to completion before the commit
+            rows = conn.execute(SQL_DELETE_SESSION_RETURNING, key).fetchall()
+            result = rows[0] if rows else None
+        else:
+            cursor = conn.cursor()
+            
+            # Get username before deleting
+            cursor.execute(SQL_SESSION_USER, key)
+            result = cursor.fetchone()
+            
+            cursor.execute(SQL_DELETE_SESSION, key)
     
     if result:
         log_activity(result[0], 'LOGOUT', None, 'User logged out')
 
 def delete_all_user_sessions(username):
     """Delete all sessions for a user (force logout)"""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    
-    cursor.execute('DELETE FROM sessions WHERE username = ?', (username,))
-    
-    conn.commit()
-    conn.close()
+    with get_connection() as conn:
+        conn.execute('DELETE FROM sessions WHERE username = ?', (username,))
 
 def clean_expired_sessions():
-    """Remove expired sessions from database"""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    
-    cursor.execute(
-        'DELETE FROM sessions WHERE expires_at < ?',
-        (datetime.now(),)
-    )
-    
-    deleted_count = cursor.rowcount
-    conn.commit()
-    conn.close()
+    """
+    Remove all expired sessions from database
+    
+    Not needed in normal operation: trg_sessions_gc already removes expired
+    sessions in small batches whenever a session is created.
+    """
+    with get_connection() as conn:
+        cursor = conn.execute(
+            "DELETE FROM sessions WHERE expires_at < CAST(strftime('%s', 'now') AS INTEGER)"
+        )
     
-    return deleted_count
+    return cursor.rowcount
 
 # ============================================================================
 # UAV ASSIGNMENT MANAGEMENT
@@ -442,27 +570,14 @@ def assign_uav(admin_username, username, uav_supi):
         return {'success': False, 'message': 'Unauthorized: Admin access required'}
     
     try:
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        
-        # Check if assignment already exists
-        cursor.execute(
-            'SELECT id FROM uav_assignments WHERE username = ? AND uav_supi = ?',
-            (username, uav_supi)
-        )
+        with get_connection() as conn:
+            # UNIQUE(username, uav_supi) turns an existing assignment into a
+            # no-op, so the existence check and the insert are one statement
+            cursor = conn.execute(SQL_ASSIGN_UAV, (username, uav_supi, admin_username))
         
-        if cursor.fetchone():
-            conn.close()
+        if cursor.rowcount == 0:
             return {'success': False, 'message': f'UAV {uav_supi} already assigned to {username}'}
         
-        cursor.execute(
-            'INSERT INTO uav_assignments (username, uav_supi, assigned_by, is_active) VALUES (?, ?, ?, ?)',
-            (username, uav_supi, admin_username, 1)
-        )
-        
-        conn.commit()
-        conn.close()
-        
         log_activity(admin_username, 'UAV_ASSIGNED', username, f'Assigned UAV {uav_supi}')
         
         return {'success': True, 'message': f'UAV {uav_supi} assigned to {username}'}
@@ -470,26 +585,50 @@ def assign_uav(admin_username, username, uav_supi):
     except Exception as e:
         return {'success': False, 'message': f'Failed to assign UAV: {str(e)}'}
 
-def unassign_uav(admin_username, username, uav_supi):
-    """Remove UAV assignment from user (admin only)"""
+def assign_uavs_bulk(admin_username, assignments):
+    """
+    Assign many UAVs in one transaction (admin only)
+    
+    Args:
+        admin_username: Admin performing the assignment
+        assignments: Iterable of (username, uav_supi) pairs
+    
+    Pairs that are already assigned are skipped; the result reports how many
+    new assignments were made.
+    """
     if not is_admin(admin_username):
         return {'success': False, 'message': 'Unauthorized: Admin access required'}
     
     try:
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        
-        cursor.execute(
-            'DELETE FROM uav_assignments WHERE username = ? AND uav_supi = ?',
-            (username, uav_supi)
-        )
+        # One prepared statement and one commit for the whole batch
+        with get_connection() as conn:
+            cursor = conn.executemany(
+                SQL_ASSIGN_UAV,
+                ((username, uav_supi, admin_username) for username, uav_supi in assignments)
+            )
         
-        if cursor.rowcount == 0:
-            conn.close()
-            return {'success': False, 'message': 'Assignment not found'}
+        assigned = cursor.rowcount
+        log_activity(admin_username, 'UAV_ASSIGNED_BULK', None, f'Assigned {assigned} UAVs')
         
-        conn.commit()
-        conn.close()
+        return {'success': True, 'assigned': assigned, 'message': f'{assigned} UAV assignments created'}
+    
+    except Exception as e:
+        return {'success': False, 'message': f'Failed to assign UAVs: {str(e)}'}
+
+def unassign_uav(admin_username, username, uav_supi):
+    """Remove UAV assignment from user (admin only)"""
+    if not is_admin(admin_username):
+        return {'success': False, 'message': 'Unauthorized: Admin access required'}
+    
+    try:
+        with get_connection() as conn:
+            cursor = conn.execute(
+                'DELETE FROM uav_assignments WHERE username = ? AND uav_supi = ?',
+                (username, uav_supi)
+            )
+            
+            if cursor.rowcount == 0:
+                return {'success': False, 'message': 'Assignment not found'}
         
         log_activity(admin_username, 'UAV_UNASSIGNED', username, f'Unassigned UAV {uav_supi}')
         
@@ -500,59 +639,39 @@ def unassign_uav(admin_username, username, uav_supi):
 
 def get_user_uavs(username):
     """Get all UAVs assigned to a user"""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    
-    cursor.execute(
-        'SELECT uav_supi, assigned_at, assigned_by FROM uav_assignments WHERE username = ? AND is_active = 1',
+    cursor = get_connection().execute(
+        SQL_USER_UAVS,
         (username,)
     )
     
-    uavs = []
-    for row in cursor.fetchall():
-        uavs.append({
-            'uav_supi': row[0],
-            'assigned_at': row[1],
-            'assigned_by': row[2]
-        })
-    
-    conn.close()
-    return uavs
+    return [
+        {'uav_supi': uav_supi, 'assigned_at': assigned_at, 'assigned_by': assigned_by}
+        for uav_supi, assigned_at, assigned_by in cursor
+    ]
 
 def get_uav_assignments():
     """Get all UAV assignments (admin only)"""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    
-    cursor.execute(
+    cursor = get_connection().execute(
         'SELECT username, uav_supi, assigned_at, assigned_by, is_active FROM uav_assignments ORDER BY assigned_at DESC'
     )
     
-    assignments = []
-    for row in cursor.fetchall():
-        assignments.append({
-            'username': row[0],
-            'uav_supi': row[1],
-            'assigned_at': row[2],
-            'assigned_by': row[3],
-            'is_active': bool(row[4])
-        })
-    
-    conn.close()
-    return assignments
+    return [
+        {
+            'username': username,
+            'uav_supi': uav_supi,
+            'assigned_at': assigned_at,
+            'assigned_by': assigned_by,
+            'is_active': bool(is_active)
+        }
+        for username, uav_supi, assigned_at, assigned_by, is_active in cursor
+    ]
 
 def is_uav_assigned_to_user(username, uav_supi):
     """Check if a specific UAV is assigned to a user"""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    
-    cursor.execute(
-        'SELECT id FROM uav_assignments WHERE username = ? AND uav_supi = ? AND is_active = 1',
+    result = get_connection().execute(
+        SQL_UAV_ASSIGNED,
         (username, uav_supi)
-    )
-    
-    result = cursor.fetchone()
-    conn.close()
+    ).fetchone()
     
     return result is not None
 
@@ -560,89 +679,110 @@ def is_uav_assigned_to_user(username, uav_supi):
 # LOGGING & AUDITING
 # ============================================================================
 
+# Audit rows are queued and written by one background thread, many rows per
+# commit, so logins and admin actions never wait on a log fsync. Readers of
+# the logs call flush_logs() first to see their own writes.
+_log_queue = queue.Queue()
+
+def _log_writer():
+    """Background thread writing queued audit rows in batches"""
+    while True:
+        items = [_log_queue.get()]
+        deadline = time.monotonic() + LOG_FLUSH_INTERVAL
+        
+        while len(items) < LOG_BATCH_MAX:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                items.append(_log_queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        
+        try:
+            logins = [row for sql, row in items if sql is SQL_LOG_LOGIN]
+            activities = [row for sql, row in items if sql is SQL_LOG_ACTIVITY]
+            with get_connection() as conn:
+                if logins:
+                    conn.executemany(SQL_LOG_LOGIN, logins)
+                if activities:
+                    conn.executemany(SQL_LOG_ACTIVITY, activities)
+        except Exception as e:
+            print(f"⚠️  Failed to write {len(items)} audit log entries: {e}")
+        finally:
+            for _ in items:
+                _log_queue.task_done()
+
+def flush_logs():
+    """Wait until every queued audit row has been written"""
+    _log_queue.join()
+
+threading.Thread(target=_log_writer, name='auth-log-writer', daemon=True).start()
+atexit.register(flush_logs)
+
 def log_login(username, ip_address=None, user_agent=None, success=True):
-    """Log login attempt"""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    
-    cursor.execute(
-        'INSERT INTO login_history (username, ip_address, user_agent, success) VALUES (?, ?, ?, ?)',
-        (username, ip_address, user_agent, success)
-    )
-    
-    conn.commit()
-    conn.close()
+    """Log login attempt (queued)"""
+    _log_queue.put((SQL_LOG_LOGIN, (username, ip_address, user_agent, success)))
 
 def log_activity(username, action, target=None, details=None):
-    """Log user activity"""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    
-    cursor.execute(
-        'INSERT INTO activity_log (username, action, target, details) VALUES (?, ?, ?, ?)',
-        (username, action, target, details)
-    )
-    
-    conn.commit()
-    conn.close()
+    """Log user activity (queued)"""
+    _log_queue.put((SQL_LOG_ACTIVITY, (username, action, target, details)))
 
-def get_login_history(username=None, limit=50):
-    """Get login history"""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
+def get_login_history(username=None, limit=50, offset=0):
+    """Get a page of login history, newest first"""
+    flush_logs()
+    conn = get_connection()
     
+    # Both orderings are served straight from the (username, login_time) and
+    # (login_time) indexes, so paging never sorts the whole table
     if username:
-        cursor.execute(
-            'SELECT username, login_time, ip_address, user_agent, success FROM login_history WHERE username = ? ORDER BY login_time DESC LIMIT ?',
-            (username, limit)
+        cursor = conn.execute(
+            SQL_LOGIN_HISTORY_USER,
+            (username, limit, offset)
         )
     else:
-        cursor.execute(
-            'SELECT username, login_time, ip_address, user_agent, success FROM login_history ORDER BY login_time DESC LIMIT ?',
-            (limit,)
+        cursor = conn.execute(
+            SQL_LOGIN_HISTORY_ALL,
+            (limit, offset)
         )
     
-    history = []
-    for row in cursor.fetchall():
-        history.append({
-            'username': row[0],
-            'login_time': row[1],
-            'ip_address': row[2],
-            'user_agent': row[3],
-            'success': bool(row[4])
-        })
-    
-    conn.close()
-    return history
+    return [
+        {
+            'username': user,
+            'login_time': login_time,
+            'ip_address': ip_address,
+            'user_agent': user_agent,
+            'success': bool(success)
+        }
+        for user, login_time, ip_address, user_agent, success in cursor
+    ]
 
-def get_activity_log(username=None, limit=100):
-    """Get activity log"""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
+def get_activity_log(username=None, limit=100, offset=0):
+    """Get a page of the activity log, newest first"""
+    flush_logs()
+    conn = get_connection()
     
     if username:
-        cursor.execute(
-            'SELECT username, action, target, details, timestamp FROM activity_log WHERE username = ? ORDER BY timestamp DESC LIMIT ?',
-            (username, limit)
+        cursor = conn.execute(
+            SQL_ACTIVITY_LOG_USER,
+            (username, limit, offset)
         )
     else:
-        cursor.execute(
-            'SELECT username, action, target, details, timestamp FROM activity_log ORDER BY timestamp DESC LIMIT ?',
-            (limit,)
+        cursor = conn.execute(
+            SQL_ACTIVITY_LOG_ALL,
+            (limit, offset)
         )
     
-    activities = []
-    for row in cursor.fetchall():
-        activities.append({
-            'username': row[0],
-            'action': row[1],
-            'target': row[2],
-            'details': row[3],
-            'timestamp': row[4]
-        })
-    
-    conn.close()
-    return activities
+    return [
+        {
+            'username': user,
+            'action': action,
+            'target': target,
+            'details': details,
+            'timestamp': timestamp
+        }
+        for user, action, target, details, timestamp in cursor
+    ]
 
 # ============================================================================
 # SYSTEM STATISTICS
@@ -650,32 +790,16 @@ def get_activity_log(username=None, limit=100):
 
 def get_system_stats():
     """Get comprehensive system statistics"""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    
-    # Total users
-    cursor.execute('SELECT COUNT(*) FROM users WHERE is_active = 1')
-    total_users = cursor.fetchone()[0]
-    
-    # Total admins
-    cursor.execute('SELECT COUNT(*) FROM users WHERE role = "admin" AND is_active = 1')
-    total_admins = cursor.fetchone()[0]
-    
-    # Active sessions
-    cursor.execute('SELECT COUNT(*) FROM sessions WHERE expires_at > ?', (datetime.now(),))
-    active_sessions = cursor.fetchone()[0]
+    flush_logs()
     
-    # Total UAV assignments
-    cursor.execute('SELECT COUNT(*) FROM uav_assignments WHERE is_active = 1')
-    total_assignments = cursor.fetchone()[0]
-    
-    # Recent logins (last 24 hours)
-    from datetime import timedelta
-    yesterday = datetime.now() - timedelta(hours=24)
-    cursor.execute('SELECT COUNT(*) FROM login_history WHERE login_time > ? AND success = 1', (yesterday,))
-    recent_logins = cursor.fetchone()[0]
-    
-    conn.close()
+    # Active users, active admins, live sessions, UAV assignments and
+    # successful logins in the last 24 hours, in one statement. Both cut-offs
+    # are computed by SQLite: login_time is written by CURRENT_TIMESTAMP (UTC),
+    # so comparing it with a Python local datetime was off by the UTC offset.
+    (total_users, total_admins, active_sessions,
+     total_assignments, recent_logins) = get_connection().execute(
+        SQL_SYSTEM_STATS
+    ).fetchone()
     
     return {
         'total_users': total_users,
@@ -697,15 +821,29 @@ def backup_database(backup_path='backups'):
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
     backup_file = os.path.join(backup_path, f'uav_users_{timestamp}.db')
     
-    import shutil
-    shutil.copy2(DB_FILE, backup_file)
+    # SQLite's online backup copies a consistent snapshot page by page,
+    # including anything still in the write-ahead log
+    flush_logs()
+    backup_conn = sqlite3.connect(backup_file)
+    try:
+        get_connection().backup(backup_conn)
+    finally:
+        backup_conn.close()
     
     return backup_file
 
 def reset_database():
     """Reset database (DANGEROUS - USE WITH CAUTION)"""
-    if os.path.exists(DB_FILE):
-        os.remove(DB_FILE)
+    global _generation
+    
+    # Other threads reopen their connections on next use; only call this
+    # while the server is not handling requests
+    flush_logs()
+    close_connection()
+    _generation += 1
+    for path in (DB_FILE, DB_FILE + '-wal', DB_FILE + '-shm'):
+        if os.path.exists(path):
+            os.remove(path)
     init_db()
 
 # ============================================================================
@@ -730,4 +868,4 @@ if __name__ == '__main__':
     print(f"   Recent Logins (24h): {stats['recent_logins']}")
     print("\n✅ Database ready for use")
 else:
-    init_db()
\ No newline at end of file
+    init_db()
@@ -2,11 +2,18 @@ import hashlib
 import json
 import time
 
+from fast_sha256 import poh_chain
+
 # --- Configuration (Can be adapted later for election simulation) ---
 UAV_IDENTIFIER = 'UAV_A1'
 NODE_ID = 'Leader_Node_1'
 # ------------------------------------------------------------------
 
+# Built once: json.dumps(..., sort_keys=True) constructs a new encoder per call.
+# The stdlib encoder defines the hashed bytes (see canonical_json in
+# GCS_LeaderNode.py for why it is not orjson).
+_canonical_encoder = json.JSONEncoder(sort_keys=True)
+
 class EPOH_Core:
     """
     Implements the simplified Proof-of-History (PoH) function.
@@ -16,16 +23,14 @@ class EPOH_Core:
     def __init__(self, difficulty=5):
         # Difficulty represents the number of sequential hash iterations between blocks
         self.difficulty = difficulty 
-        self.latest_hash = '0' * 64 # Initial hash sequence seed
+        self.latest_hash = bytes(32) # Initial hash sequence seed (raw 32-byte state)
         self.sequence_count = 0
 
     def generate_sequential_hash(self):
         """Generates the next hash in the sequence."""
-        data = self.latest_hash.encode('utf-8')
-        new_hash = hashlib.sha256(data).hexdigest()
-        self.latest_hash = new_hash
+        self.latest_hash = hashlib.sha256(self.latest_hash).digest()
         self.sequence_count += 1
-        return new_hash
+        return self.latest_hash.hex()
 
     def embed_transaction(self, data_payload):
         """
@@ -33,15 +38,15 @@ class EPOH_Core:
         This simulates the PoH Generator receiving a transaction and embedding it.
         """
         # Ensure the data is deterministic for consistent hashing
-        data_string = json.dumps(data_payload, sort_keys=True)
-        combined_data = (self.latest_hash + data_string).encode('utf-8')
+        data_bytes = _canonical_encoder.encode(data_payload).encode('utf-8')
+        combined_data = self.latest_hash + data_bytes
         
         # Hash the combined data
-        self.latest_hash = hashlib.sha256(combined_data).hexdigest()
+        self.latest_hash = hashlib.sha256(combined_data).digest()
         self.sequence_count += 1
         
         # Return the time and hash at which the event was recorded
-        return time.time(), self.latest_hash
+        return time.time(), self.latest_hash.hex()
 
     def create_block(self, transactions, previous_hash):
         """
@@ -50,15 +55,18 @@ class EPOH_Core:
         after a series of sequential operations.
         """
         # 1. Start the sequential hashing sequence
-        self.latest_hash = previous_hash
+        # The state stays raw bytes between steps; hex is only produced for
+        # the hashes written into the block
+        self.latest_hash = bytes.fromhex(previous_hash)
         self.sequence_count = 0
         
         event_log = []
         
         for tx in transactions:
-            # Generate intermediate hashes (simulating time delay)
-            for _ in range(self.difficulty):
-                self.generate_sequential_hash()
+            # Generate intermediate hashes (simulating time delay). The steps
+            # stay sequential, since that is what makes the timeline verifiable
+            self.latest_hash = poh_chain(self.latest_hash, self.difficulty)
+            self.sequence_count += self.difficulty
             
             # 2. Embed the transaction data (The EPOH step)
             tx_time, tx_hash = self.embed_transaction(tx)
@@ -80,7 +88,7 @@ class EPOH_Core:
         }
         
         # The block hash is based on the final PoH-linked state (latest_hash)
-        final_block['current_hash'] = self.latest_hash 
+        final_block['current_hash'] = self.latest_hash.hex()
         return final_block
 
 # --- Simplified ECC Simulation for Authentication (ECC) ---
@@ -0,0 +1,44 @@
+"""
+Gunicorn Configuration for the GCS Leader Node
+Author: Muntasir Al Mamun
+Date: 2025-11-03
+
+Usage:
+    gunicorn wsgi:app
+
+Gunicorn picks this file up automatically from the working directory.
+
+The blockchain state (active chains, transaction pools, EPOH cores and
+pending authentications) lives in the memory of the server process, so the
+server must run as ONE worker process. Concurrency comes from the thread
+pool inside that worker: mining runs outside the global lock, so one
+flight's block does not hold up requests for the others. The threads
+interleave rather than hash in parallel: the PoH chain feeds hashlib
+32-byte states, and hashlib keeps the GIL for inputs under 2 KiB
+(see fast_sha256.poh_chain).
+Scaling out to several workers would need the chain state moved into a
+shared store (e.g. Redis) first.
+
+Telemetry arrives as a steady stream of small POSTs from every UAV, so
+connections are kept alive between ticks. Setting GCS_WORKER_CLASS=gevent
+switches the single worker to greenlets for very large UAV fan-in.
+"""
+
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('GCS_PORT', '5000')}"
+wsgi_app = 'wsgi:app'
+
+# Single process: flights must not be split across workers
+workers = 1
+worker_class = os.environ.get('GCS_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('GCS_THREADS', multiprocessing.cpu_count() * 4))
+worker_connections = 1000  # gevent only
+
+# Reuse UAV connections across telemetry ticks
+keepalive = 30
+
+# Archiving a flight mines, writes and verifies its ledger on the request;
+# retraining runs in the background, so this matches the clients' 30 s wait
+timeout = 30
@@ -4,6 +4,7 @@ reset_flights.py
 Safely backup and clear flight archives/active ledgers and reset flight_count.
 Run this while GCS and UAV clients are stopped.
 """
+import errno
 import os
 import shutil
 from datetime import datetime
@@ -26,12 +27,20 @@ def move_matches(src_dir, pattern_prefix):
     if not os.path.isdir(src_dir):
         return []
     moved = []
-    for fname in os.listdir(src_dir):
-        if fname.startswith(pattern_prefix) and fname.endswith(".json"):
-            src = os.path.join(src_dir, fname)
-            dst = os.path.join(backup_dir, os.path.basename(src_dir), fname)
-            shutil.move(src, dst)
-            moved.append(fname)
+    dst_dir = os.path.join(backup_dir, os.path.basename(src_dir))
+    with os.scandir(src_dir) as entries:
+        for entry in entries:
+            fname = entry.name
+            if fname.startswith(pattern_prefix) and fname.endswith((".json", ".msgpack", ".ndjson")):
+                dst = os.path.join(dst_dir, fname)
+                # The backup lives under ROOT, so this is normally a plain rename
+                try:
+                    os.replace(entry.path, dst)
+                except OSError as e:
+                    if e.errno != errno.EXDEV:
+                        raise
+                    shutil.move(entry.path, dst)
+                moved.append(fname)
     return moved
 
 print("Backing up flight archives and active ledgers to:", backup_dir)
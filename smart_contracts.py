@@ -5,24 +5,62 @@ Date: 2025-10-25
 """
 
 import time
-from datetime import datetime
+from collections import deque
+from dataclasses import dataclass
+
+import numpy as np
+
+# Column layout of the (N, K) telemetry buffers taken by evaluate_batch();
+# the flight_id column is optional
+COL_X, COL_Y, COL_Z, COL_VEL, COL_FLIGHT = range(5)
+VIOLATION_HISTORY = 1024  # most recent violations kept per contract
+TELEMETRY_COLUMNS = ('x_pos', 'y_pos', 'z_alt', 'vel_mag', 'flight_id')
+
+@dataclass(slots=True)
+class Violation:
+    """One contract violation; slotted since every contract keeps a history"""
+    contract: str
+    timestamp: float
+    data: dict
+    result: dict
+    
+    def as_dict(self):
+        """Returns the violation as a plain dict, for JSON and ledger records"""
+        return {
+            'contract': self.contract,
+            'timestamp': self.timestamp,
+            'data': self.data,
+            'result': self.result
+        }
+
+def telemetry_row(row):
+    """Returns the telemetry dict of one buffer row."""
+    data = dict(zip(TELEMETRY_COLUMNS, row.tolist()))
+    if 'flight_id' in data:
+        data['flight_id'] = int(data['flight_id'])
+    return data
 
 class SmartContract:
     """Base class for smart contracts"""
     
+    # Bumped whenever any contract is enabled or disabled, so managers know
+    # to rebuild their dispatch snapshot
+    state_version = 0
+    
     def __init__(self, name, description):
         self.name = name
         self.description = description
         self.enabled = True
-        self.violations = []
+        self.violations = deque(maxlen=VIOLATION_HISTORY)
+        self.violation_count = 0  # all violations, including those rotated out
         self.execution_count = 0
     
     def evaluate(self, data):
         """Override this method in subclasses"""
         raise NotImplementedError
     
-    def execute(self, data):
-        """Execute the contract"""
+    def execute(self, data, now=None):
+        """Execute the contract; now is the shared timestamp of the sample"""
         if not self.enabled:
             return None
         
@@ -30,16 +68,53 @@ class SmartContract:
         result = self.evaluate(data)
         
         if result:
-            violation = {
-                'contract': self.name,
-                'timestamp': time.time(),
-                'data': data,
-                'result': result
-            }
+            violation = Violation(self.name, time.time() if now is None else now, data, result)
             self.violations.append(violation)
+            self.violation_count += 1
             return violation
         
         return None
+    
+    @property
+    def enabled(self):
+        return self._enabled
+    
+    @enabled.setter
+    def enabled(self, value):
+        self._enabled = value
+        SmartContract.state_version += 1
+    
+    def evaluate_batch(self, buf):
+        """
+        Override with a vectorized check returning a boolean mask of the
+        rows that may violate the contract. None means no vectorized form:
+        every row is evaluated one at a time.
+        """
+        return None
+    
+    def execute_batch(self, buf, now=None):
+        """Execute the contract over a telemetry buffer; returns {row: violation}"""
+        if not self.enabled:
+            return {}
+        
+        if now is None:
+            now = time.time()
+        self.execution_count += len(buf)
+        mask = self.evaluate_batch(buf)
+        rows = range(len(buf)) if mask is None else np.flatnonzero(mask).tolist()
+        
+        # Only flagged rows become dicts; evaluate() builds the usual details
+        violations = {}
+        for i in rows:
+            data = telemetry_row(buf[i])
+            result = self.evaluate(data)
+            if result:
+                violation = Violation(self.name, now, data, result)
+                self.violations.append(violation)
+                self.violation_count += 1
+                violations[i] = violation
+        
+        return violations
 
 class GeofenceContract(SmartContract):
     """Geofencing smart contract"""
@@ -53,11 +128,28 @@ class GeofenceContract(SmartContract):
         self.max_y = max_y
         self.min_altitude = min_altitude
         self.max_altitude = max_altitude
+        
+        # Squared limits: x*x > max_x**2 is abs(x) > max_x without the call
+        self._max_x2 = max_x * max_x
+        self._max_y2 = max_y * max_y
     
     def evaluate(self, data):
-        x = data.get('x_pos', 0)
-        y = data.get('y_pos', 0)
-        z = data.get('z_alt', 0)
+        # Subscripts are cheaper than dict.get() calls; only a partial sample
+        # pays for the fallback to the per-field defaults
+        try:
+            x = data['x_pos']
+            y = data['y_pos']
+            z = data['z_alt']
+        except KeyError:
+            x = data.get('x_pos', 0)
+            y = data.get('y_pos', 0)
+            z = data.get('z_alt', 0)
+        
+        # Nearly every sample is inside the fence: settle that before any
+        # message is formatted
+        if not (x * x > self._max_x2 or y * y > self._max_y2
+                or z < self.min_altitude or z > self.max_altitude):
+            return None
         
         violations = []
         
@@ -81,6 +173,13 @@ class GeofenceContract(SmartContract):
             }
         
         return None
+    
+    def evaluate_batch(self, buf):
+        x = buf[:, COL_X]
+        y = buf[:, COL_Y]
+        z = buf[:, COL_Z]
+        return ((x * x > self._max_x2) | (y * y > self._max_y2)
+                | (z < self.min_altitude) | (z > self.max_altitude))
 
 class SpeedLimitContract(SmartContract):
     """Speed limit enforcement contract"""
@@ -93,20 +192,32 @@ class SpeedLimitContract(SmartContract):
         self.max_speed = max_speed
     
     def evaluate(self, data):
-        speed = data.get('vel_mag', 0)
+        try:
+            speed = data['vel_mag']
+        except KeyError:
+            speed = 0
         
-        if speed > self.max_speed:
-            return {
-                'severity': 'MEDIUM',
-                'message': f"Speed limit exceeded: {speed:.2f} m/s (limit: {self.max_speed} m/s)",
-                'speed': speed
-            }
+        if not speed > self.max_speed:
+            return None
         
-        return None
+        return {
+            'severity': 'MEDIUM',
+            'message': f"Speed limit exceeded: {speed:.2f} m/s (limit: {self.max_speed} m/s)",
+            'speed': speed
+        }
+    
+    def evaluate_batch(self, buf):
+        return buf[:, COL_VEL] > self.max_speed
 
 class AltitudeSafetyContract(SmartContract):
     """Altitude safety monitoring"""
     
+    # (severity, message template) indexed by "above the critical threshold"
+    ALERTS = (
+        ('WARNING', "Warning: Low altitude detected: {:.2f}m"),
+        ('CRITICAL', "CRITICAL: Altitude dangerously low: {:.2f}m"),
+    )
+    
     def __init__(self, warning_threshold=-3, critical_threshold=-1):
         super().__init__(
             "Altitude Safety Monitor",
@@ -114,25 +225,29 @@ class AltitudeSafetyContract(SmartContract):
         )
         self.warning_threshold = warning_threshold
         self.critical_threshold = critical_threshold
+        
+        # Lowest altitude that raises anything (normally the warning level)
+        self._alert_floor = min(warning_threshold, critical_threshold)
     
     def evaluate(self, data):
-        altitude = data.get('z_alt', -10)
+        try:
+            altitude = data['z_alt']
+        except KeyError:
+            altitude = -10
         
-        if altitude > self.critical_threshold:
-            return {
-                'severity': 'CRITICAL',
-                'message': f"CRITICAL: Altitude dangerously low: {altitude:.2f}m",
-                'altitude': altitude
-            }
-        
-        if altitude > self.warning_threshold:
-            return {
-                'severity': 'WARNING',
-                'message': f"Warning: Low altitude detected: {altitude:.2f}m",
-                'altitude': altitude
-            }
+        # Common case first: safely high, nothing to build
+        if not altitude > self._alert_floor:
+            return None
         
-        return None
+        severity, template = self.ALERTS[altitude > self.critical_threshold]
+        return {
+            'severity': severity,
+            'message': template.format(altitude),
+            'altitude': altitude
+        }
+    
+    def evaluate_batch(self, buf):
+        return buf[:, COL_Z] > min(self.warning_threshold, self.critical_threshold)
 
 class FlightDurationContract(SmartContract):
     """Flight duration monitoring"""
@@ -149,11 +264,8 @@ class FlightDurationContract(SmartContract):
         flight_id = data.get('flight_id')
         current_time = time.time()
         
-        if flight_id not in self.flight_start_times:
-            self.flight_start_times[flight_id] = current_time
-            return None
-        
-        duration = current_time - self.flight_start_times[flight_id]
+        # The first sample of a flight starts its clock (duration 0)
+        duration = current_time - self.flight_start_times.setdefault(flight_id, current_time)
         
         if duration > self.max_duration:
             return {
@@ -170,35 +282,99 @@ class ContractManager:
     def __init__(self):
         self.contracts = []
         self.total_violations = 0
+        self._log_second = None  # (int second, formatted) of the last log line
+        self._dispatch = None    # (state_version, ((contract, evaluate), ...))
     
     def add_contract(self, contract):
         """Add a new contract"""
         self.contracts.append(contract)
+        self._dispatch = None
         print(f"✅ Smart Contract Added: {contract.name}")
     
     def remove_contract(self, contract_name):
         """Remove a contract"""
         self.contracts = [c for c in self.contracts if c.name != contract_name]
+        self._dispatch = None
+    
+    def _enabled_contracts(self):
+        """Returns the (contract, bound evaluate) pairs of enabled contracts"""
+        dispatch = self._dispatch
+        if dispatch is None or dispatch[0] != SmartContract.state_version:
+            dispatch = self._dispatch = (
+                SmartContract.state_version,
+                tuple((c, c.evaluate) for c in self.contracts if c.enabled)
+            )
+        return dispatch[1]
     
     def evaluate_all(self, data):
         """Evaluate all contracts"""
         violations = []
+        now = time.time()
         
-        for contract in self.contracts:
-            result = contract.execute(data)
+        # Same bookkeeping as SmartContract.execute(), inlined over the
+        # snapshot of enabled contracts
+        for contract, evaluate in self._enabled_contracts():
+            contract.execution_count += 1
+            result = evaluate(data)
             if result:
-                violations.append(result)
-                self.total_violations += 1
-                self.log_violation(result)
+                violation = Violation(contract.name, now, data, result)
+                contract.violations.append(violation)
+                contract.violation_count += 1
+                violations.append(violation)
+        
+        if violations:
+            self.total_violations += len(violations)
+            self.log_violations(violations)
         
         return violations
     
+    def evaluate_batch(self, buf):
+        """
+        Evaluate all contracts over an (N, K) telemetry buffer
+        
+        Columns follow COL_X, COL_Y, COL_Z, COL_VEL and optionally
+        COL_FLIGHT. Vectorized contracts test the whole buffer at once and
+        only the flagged rows are turned into violation records.
+        
+        Returns:
+            (matrix, violations): (N, contracts) boolean violation matrix
+            and the violation records in contract order
+        """
+        buf = np.asarray(buf, dtype=np.float64)
+        matrix = np.zeros((len(buf), len(self.contracts)), dtype=bool)
+        violations = []
+        now = time.time()
+        
+        for c, contract in enumerate(self.contracts):
+            for row, violation in contract.execute_batch(buf, now).items():
+                matrix[row, c] = True
+                violations.append(violation)
+        
+        if violations:
+            self.total_violations += len(violations)
+            self.log_violations(violations)
+        
+        return matrix, violations
+    
     def log_violation(self, violation):
         """Log a contract violation"""
-        timestamp = datetime.fromtimestamp(violation['timestamp']).strftime('%Y-%m-%d %H:%M:%S')
-        print(f"⚠️  Smart Contract Violation [{timestamp}]")
-        print(f"   Contract: {violation['contract']}")
-        print(f"   Details: {violation['result']}")
+        self.log_violations((violation,))
+    
+    def log_violations(self, violations):
+        """Log contract violations with a single write"""
+        lines = []
+        for violation in violations:
+            # Violations of one burst share their second: format it once
+            second = int(violation.timestamp)
+            cached = self._log_second
+            if cached is None or cached[0] != second:
+                cached = self._log_second = (second, time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(second)))
+            
+            lines.append(f"⚠️  Smart Contract Violation [{cached[1]}]")
+            lines.append(f"   Contract: {violation.contract}")
+            lines.append(f"   Details: {violation.result}")
+        
+        print('\n'.join(lines))
     
     def get_statistics(self):
         """Get contract statistics"""
@@ -214,7 +390,7 @@ class ContractManager:
                 'description': contract.description,
                 'enabled': contract.enabled,
                 'executions': contract.execution_count,
-                'violations': len(contract.violations)
+                'violations': contract.violation_count
             })
         
         return stats
\ No newline at end of file
@@ -5,9 +5,86 @@ Date: 2025-10-26
 Prevents landing on trees, water, or unsafe surfaces
 """
 
+import importlib.util
+import math
 import numpy as np
 import random
 
+# Numba compiles the safe-ground search on large maps and the batch hazard
+# check; plain Python / NumPy otherwise. Every UAV client imports this
+# module, so Numba itself is only imported, and each kernel compiled, the
+# first time a kernel is needed
+NUMBA_AVAILABLE = importlib.util.find_spec('numba') is not None
+
+# Below this many hazards a plain loop beats NumPy's per-call overhead
+VECTORIZE_MIN_HAZARDS = 32
+
+# Larger maps are bucketed into a uniform grid. Each hazard is filed under
+# every cell its radius plus GRID_MARGIN reaches, so one cell lookup finds
+# all hazards that can matter for a safety radius up to GRID_MARGIN
+GRID_MARGIN = 2.0
+
+# Safe-ground search pattern: rings every SEARCH_STEP metres, 12 bearings each
+SEARCH_STEP = 2.0
+SEARCH_COS = np.cos(np.linspace(0, 2*np.pi, 12))
+SEARCH_SIN = np.sin(np.linspace(0, 2*np.pi, 12))
+SEARCH_BEARINGS = tuple(zip(SEARCH_COS.tolist(), SEARCH_SIN.tolist()))
+
+_search_kernel = None
+_batch_kernel = None
+
+def _search_ground_kernel():
+    """Returns the ring-search kernel, compiling it on first use."""
+    global _search_kernel
+    if _search_kernel is None:
+        from numba import njit
+        
+        @njit(cache=True)
+        def _search(sx, sy, arena, hx, hy, hr, safety_radius, search_radius, step, cos_t, sin_t):
+            """Returns (x, y, found) of the first safe point of the ring search."""
+            rings = int(np.ceil(search_radius / step))
+            for i in range(rings):
+                radius = i * step
+                for k in range(cos_t.shape[0]):
+                    tx = sx + radius * cos_t[k]
+                    ty = sy + radius * sin_t[k]
+                    
+                    if 0 <= tx <= arena and 0 <= ty <= arena:
+                        safe = True
+                        for j in range(hx.shape[0]):
+                            reach = hr[j] + safety_radius
+                            if (tx - hx[j])**2 + (ty - hy[j])**2 < reach * reach:
+                                safe = False
+                                break
+                        if safe:
+                            return tx, ty, True
+            return sx, sy, False
+        
+        _search_kernel = _search
+    return _search_kernel
+
+def _is_safe_batch_kernel():
+    """Returns the parallel batch hazard kernel, compiling it on first use."""
+    global _batch_kernel
+    if _batch_kernel is None:
+        from numba import njit, prange
+        
+        @njit(parallel=True, cache=True)
+        def _is_safe_batch(xs, ys, hx, hy, reach2):
+            """Returns a boolean mask of the points clear of every hazard."""
+            out = np.ones(xs.shape[0], dtype=np.bool_)
+            for i in prange(xs.shape[0]):
+                for j in range(hx.shape[0]):
+                    dx = xs[i] - hx[j]
+                    dy = ys[i] - hy[j]
+                    if dx * dx + dy * dy < reach2[j]:
+                        out[i] = False
+                        break
+            return out
+        
+        _batch_kernel = _is_safe_batch
+    return _batch_kernel
+
 class LandingZoneSelector:
     """Intelligent landing zone selection system"""
     
@@ -18,6 +95,7 @@ class LandingZoneSelector:
         
         # Define unsafe zones (trees, water, obstacles)
         self._initialize_hazard_map()
+        self._build_hazard_arrays()
     
     def _initialize_hazard_map(self):
         """Initialize known hazard locations"""
@@ -37,27 +115,124 @@ class LandingZoneSelector:
             {'x': 25, 'y': 25, 'radius': 4, 'priority': 'medium'},
         ]
     
+    def _build_hazard_arrays(self):
+        """Mirror unsafe_zones into column arrays for the distance checks"""
+        self._haz_x = np.array([h['x'] for h in self.unsafe_zones], dtype=np.float64)
+        self._haz_y = np.array([h['y'] for h in self.unsafe_zones], dtype=np.float64)
+        self._haz_r = np.array([h['radius'] for h in self.unsafe_zones], dtype=np.float64)
+        self._haz_type = [h['type'] for h in self.unsafe_zones]
+        self._hazards = list(zip(self._haz_x.tolist(), self._haz_y.tolist(),
+                                 self._haz_r.tolist(), self._haz_type))
+        self._build_hazard_grid()
+        self._check_small_map = self._compile_hazard_check()
+    
+    def _compile_hazard_check(self):
+        """
+        Generate the small-map hazard check with the hazards baked in
+        
+        The hazard map is fixed for a mission, so the loop over hazard tuples
+        is unrolled into straight-line code with the coordinates as literals.
+        Returns None for maps large enough to use the grid instead (or whose
+        values have no literal form, such as inf).
+        """
+        if len(self._hazards) >= VECTORIZE_MIN_HAZARDS:
+            return None
+        if not all(math.isfinite(v) for h in self._hazards for v in h[:3]):
+            return None
+        
+        lines = ["def check(x, y, safety_radius):"]
+        for hx, hy, radius, hazard_type in self._hazards:
+            lines.append(f"    reach = {radius!r} + safety_radius")
+            lines.append(f"    if (x - {hx!r})**2 + (y - {hy!r})**2 < reach * reach:")
+            lines.append(f"        return False, {f'Too close to {hazard_type}'!r}")
+        lines.append("    return True, 'Safe landing zone'")
+        
+        namespace = {}
+        exec(compile('\n'.join(lines), '<hazard map>', 'exec'), namespace)
+        return namespace['check']
+    
+    def _build_hazard_grid(self):
+        """Bucket hazards by grid cell; cells keep map order for reporting"""
+        self._grid = {}
+        self._grid_cell = (max(self._haz_r.tolist(), default=0.0) + GRID_MARGIN) or 1.0
+        cell = self._grid_cell
+        
+        for hazard in self._hazards:
+            hx, hy, radius, _ = hazard
+            reach = radius + GRID_MARGIN
+            for cx in range(int((hx - reach) // cell), int((hx + reach) // cell) + 1):
+                for cy in range(int((hy - reach) // cell), int((hy + reach) // cell) + 1):
+                    self._grid.setdefault((cx, cy), []).append(hazard)
+    
     def is_safe_landing_zone(self, x, y, safety_radius=2.0):
         """Check if a position is safe for landing"""
-        for hazard in self.unsafe_zones:
-            distance = np.sqrt((x - hazard['x'])**2 + (y - hazard['y'])**2)
-            if distance < (hazard['radius'] + safety_radius):
-                return False, f"Too close to {hazard['type']}"
+        # Squared distances throughout, so no sqrt per hazard
+        if self._check_small_map is not None:
+            return self._check_small_map(x, y, safety_radius)
+        
+        if safety_radius <= GRID_MARGIN:
+            cell = self._grid_cell
+            candidates = self._grid.get((int(x // cell), int(y // cell)), ())
+        else:
+            candidates = None
+        
+        if candidates is not None:
+            for hx, hy, radius, hazard_type in candidates:
+                reach = radius + safety_radius
+                if (x - hx)**2 + (y - hy)**2 < reach * reach:
+                    return False, f"Too close to {hazard_type}"
+            
+            return True, "Safe landing zone"
+        
+        dx = self._haz_x - x
+        dy = self._haz_y - y
+        reach = self._haz_r + safety_radius
+        too_close = np.flatnonzero(dx * dx + dy * dy < reach * reach)
+        
+        if too_close.size:
+            # Report the first hazard in map order, as the loop does
+            return False, f"Too close to {self._haz_type[too_close[0]]}"
         
         return True, "Safe landing zone"
     
+    def is_safe_batch(self, xs, ys, safety_radius=2.0):
+        """
+        Check many candidate landing points at once
+        
+        Args:
+            xs, ys: Candidate coordinates (array-likes of equal length)
+            safety_radius: Clearance required around every hazard
+        
+        Returns:
+            Boolean array, True where the point is safe for landing
+        """
+        xs = np.ascontiguousarray(xs, dtype=np.float64)
+        ys = np.ascontiguousarray(ys, dtype=np.float64)
+        reach = self._haz_r + safety_radius
+        reach2 = reach * reach
+        
+        if NUMBA_AVAILABLE:
+            # Points are split across cores; each scans the hazard columns
+            return _is_safe_batch_kernel()(xs, ys, self._haz_x, self._haz_y, reach2)
+        
+        dx = xs[:, None] - self._haz_x
+        dy = ys[:, None] - self._haz_y
+        return ~(dx * dx + dy * dy < reach2).any(axis=1)
+    
     def find_nearest_safe_zone(self, current_x, current_y):
         """Find the nearest safe landing zone"""
         best_zone = None
-        min_distance = float('inf')
+        min_distance2 = math.inf
         
-        # First, check designated safe zones
+        # First, check designated safe zones (ranked by squared distance)
         for zone in self.safe_zones:
-            distance = np.sqrt((current_x - zone['x'])**2 + (current_y - zone['y'])**2)
-            if distance < min_distance:
+            dx = current_x - zone['x']
+            dy = current_y - zone['y']
+            distance2 = dx * dx + dy * dy
+            if distance2 < min_distance2:
                 is_safe, _ = self.is_safe_landing_zone(zone['x'], zone['y'])
                 if is_safe:
-                    min_distance = distance
+                    min_distance2 = distance2
                     best_zone = {'x': zone['x'], 'y': zone['y'], 'type': 'designated'}
         
         # If no designated zone found, search for safe ground
@@ -68,12 +243,26 @@ class LandingZoneSelector:
     
     def _search_for_safe_ground(self, start_x, start_y, search_radius=10):
         """Search for safe ground near current position"""
-        # Grid search for safe landing
-        step = 2.0
-        for radius in np.arange(0, search_radius, step):
-            for angle in np.linspace(0, 2*np.pi, 12):
-                test_x = start_x + radius * np.cos(angle)
-                test_y = start_y + radius * np.sin(angle)
+        # Small maps are searched faster by the Python loop over the
+        # generated hazard check than by dispatching into the kernel
+        if NUMBA_AVAILABLE and len(self._hazards) >= VECTORIZE_MIN_HAZARDS:
+            test_x, test_y, found = _search_ground_kernel()(
+                float(start_x), float(start_y), float(self.arena_size),
+                self._haz_x, self._haz_y, self._haz_r,
+                2.0, float(search_radius), SEARCH_STEP, SEARCH_COS, SEARCH_SIN
+            )
+            if found:
+                return {'x': test_x, 'y': test_y, 'type': 'found'}
+            return {'x': start_x, 'y': start_y, 'type': 'emergency'}
+        
+        # Grid search for safe landing; rings and bearings come from the
+        # precomputed tables, with the same points np.arange/np.cos gave
+        step = SEARCH_STEP
+        for ring in range(math.ceil(search_radius / step)):
+            radius = ring * step
+            for cos_a, sin_a in SEARCH_BEARINGS:
+                test_x = start_x + radius * cos_a
+                test_y = start_y + radius * sin_a
                 
                 # Check if within bounds
                 if 0 <= test_x <= self.arena_size and 0 <= test_y <= self.arena_size:
@@ -99,7 +288,7 @@ class LandingZoneSelector:
         else:
             # Find safe alternative
             safe_zone = self.find_nearest_safe_zone(current_x, current_y)
-            distance = np.sqrt((current_x - safe_zone['x'])**2 + (current_y - safe_zone['y'])**2)
+            distance = math.hypot(current_x - safe_zone['x'], current_y - safe_zone['y'])
             
             return {
                 'action': 'redirect',
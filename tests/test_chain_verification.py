@@ -0,0 +1,118 @@
+"""
+Chain Verification Tests
+Author: Muntasir Al Mamun
+Date: 2025-11-03
+
+Runs the Numba and the pure-Python link checks of the GCS verifier on the
+same chains and expects identical results, for intact and tampered chains.
+
+Usage:
+    python -m unittest discover tests
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+gcs = None
+_cwd = None
+_tmp = None
+
+def setUpModule():
+    """Imports the GCS from a scratch directory; it creates its data folders on import."""
+    global gcs, _cwd, _tmp
+    _cwd = os.getcwd()
+    _tmp = tempfile.TemporaryDirectory()
+    os.chdir(_tmp.name)
+    import GCS_LeaderNode
+    gcs = GCS_LeaderNode
+
+def tearDownModule():
+    os.chdir(_cwd)
+    _tmp.cleanup()
+
+def build_chain(length=13):
+    """Builds a correctly linked chain of the given length."""
+    chain = []
+    previous_hash = '0' * 64
+    for i in range(length):
+        block = {
+            'index': i,
+            'timestamp': 1700000000.0 + i,
+            'transactions': [{'type': 'TELEMETRY_TX', 'tx_id': f'TELEM_{i}'}],
+            'event_log': [],
+            'previous_hash': previous_hash
+        }
+        block['current_hash'] = gcs.hash_block(block)
+        previous_hash = block['current_hash']
+        chain.append(block)
+    return chain
+
+
+class ChainVerificationTests(unittest.TestCase):
+    """Numba and Python verification paths must agree on every chain"""
+
+    def verify_both(self, chain):
+        """Returns the (Python, Numba) verification results of a chain."""
+        saved = gcs.NUMBA_AVAILABLE
+        try:
+            gcs.NUMBA_AVAILABLE = False
+            python_result = gcs.batch_verify([chain])[0]
+            gcs.NUMBA_AVAILABLE = saved
+            numba_result = gcs.batch_verify([chain])[0]
+        finally:
+            gcs.NUMBA_AVAILABLE = saved
+        return python_result, numba_result
+
+    def assert_same(self, chain, secured):
+        python_result, numba_result = self.verify_both(chain)
+        self.assertEqual(python_result, numba_result)
+        self.assertEqual(python_result['secured'], secured)
+        return python_result
+
+    def test_intact_chain(self):
+        self.assert_same(build_chain(), secured=True)
+
+    def test_uppercase_tip_link(self):
+        chain = build_chain()
+        chain[-1]['previous_hash'] = chain[-1]['previous_hash'].upper()
+        result = self.assert_same(chain, secured=False)
+        self.assertIn(f'Block #{len(chain) - 1}', result['message'])
+
+    def test_uppercase_middle_link(self):
+        chain = build_chain()
+        chain[3]['previous_hash'] = chain[3]['previous_hash'].upper()
+        result = self.assert_same(chain, secured=False)
+        self.assertIn('Block #3.', result['message'])
+
+    def test_whitespace_in_link(self):
+        chain = build_chain()
+        chain[5]['previous_hash'] = ' ' + chain[5]['previous_hash']
+        result = self.assert_same(chain, secured=False)
+        self.assertIn('Block #5.', result['message'])
+
+    def test_changed_link(self):
+        chain = build_chain()
+        chain[7]['previous_hash'] = 'f' * 64
+        result = self.assert_same(chain, secured=False)
+        self.assertIn('Link broken at Block #7.', result['message'])
+
+    def test_chronology_violation(self):
+        chain = build_chain()
+        chain[9]['timestamp'] = chain[8]['timestamp']
+        chain[9]['current_hash'] = gcs.hash_block(chain[9])
+        chain[10]['previous_hash'] = chain[9]['current_hash']
+        for i in range(10, len(chain)):
+            chain[i]['current_hash'] = gcs.hash_block(chain[i])
+            if i + 1 < len(chain):
+                chain[i + 1]['previous_hash'] = chain[i]['current_hash']
+        result = self.assert_same(chain, secured=False)
+        self.assertIn('Chronology violation at Block #9.', result['message'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+"""
+Client Chain Verification Tests
+Author: Muntasir Al Mamun
+Date: 2025-11-03
+
+Mines a local flight chain with the UAV client's leader node and checks
+that LeaderNodeLocal.verify_chain accepts it intact and rejects tampered
+links, block hashes and PoH event hashes.
+
+Usage:
+    python -m unittest discover tests
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+client = None
+_cwd = None
+_tmp = None
+
+def setUpModule():
+    """Imports the client from a scratch directory; its ledger files live in the cwd."""
+    global client, _cwd, _tmp
+    _cwd = os.getcwd()
+    _tmp = tempfile.TemporaryDirectory()
+    os.chdir(_tmp.name)
+    import UAV_Client
+    client = UAV_Client
+
+def tearDownModule():
+    os.chdir(_cwd)
+    _tmp.cleanup()
+
+def mine_flight(blocks=3, per_block=4):
+    """Mines a flight chain of genesis plus the given number of blocks."""
+    node = client.LeaderNodeLocal(1)
+    for i in range(blocks * per_block):
+        tx = {
+            'type': 'TELEMETRY_TX',
+            'data': {'x_pos': float(i), 'y_pos': 2.0, 'z_alt': -10.0},
+            'tx_id': f'TELEM_{i}'
+        }
+        node.transaction_pool.append(tx)
+        node.payload_pool.append(client.canonical_payload(tx))
+        if len(node.transaction_pool) == per_block:
+            node.mine_block()
+    node.flush()
+    return node
+
+
+class ClientChainVerificationTests(unittest.TestCase):
+    """verify_chain must accept mined chains and reject every kind of tampering"""
+
+    def test_intact_chain(self):
+        node = mine_flight()
+        self.assertEqual(len(node.chain), 4)
+        self.assertTrue(node.verify_chain())
+
+    def test_changed_transaction(self):
+        node = mine_flight()
+        node.chain[2]['transactions'][1]['data']['x_pos'] = 99.0
+        self.assertFalse(node.verify_chain())
+
+    def test_rehashed_transaction(self):
+        # The block hash is recomputed, so only the PoH event hashes catch it
+        node = mine_flight()
+        block = node.chain[-1]
+        block['transactions'][0]['data']['x_pos'] = 99.0
+        block['current_hash'] = client.hash_block(block)
+        self.assertFalse(node.verify_chain())
+
+    def test_changed_event_hash(self):
+        node = mine_flight()
+        node.chain[1]['event_log'][2]['hash_at_event'] = 'f' * 64
+        node.chain[1]['current_hash'] = client.hash_block(node.chain[1])
+        node.chain[2]['previous_hash'] = node.chain[1]['current_hash']
+        self.assertFalse(node.verify_chain())
+
+    def test_broken_link(self):
+        node = mine_flight()
+        node.chain[2]['previous_hash'] = '0' * 64
+        self.assertFalse(node.verify_chain())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+"""
+Flight Metadata Tests
+Author: Muntasir Al Mamun
+Date: 2025-11-03
+
+Checks that the streamed archive summary matches the one built from the
+full chain, including archives whose telemetry carries chain-like keys.
+
+Usage:
+    python -m unittest discover tests
+"""
+
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+gcs = None
+_cwd = None
+_tmp = None
+
+def setUpModule():
+    """Imports the GCS from a scratch directory; it creates its data folders on import."""
+    global gcs, _cwd, _tmp
+    _cwd = os.getcwd()
+    _tmp = tempfile.TemporaryDirectory()
+    os.chdir(_tmp.name)
+    import GCS_LeaderNode
+    gcs = GCS_LeaderNode
+
+def tearDownModule():
+    os.chdir(_cwd)
+    _tmp.cleanup()
+
+def write_archive(directory, telemetry):
+    """Writes a three-block JSON archive whose blocks carry the given telemetry."""
+    chain = [{
+        'index': 0,
+        'timestamp': 1700000000.0,
+        'event_log': [{'event_type': 'CHAIN_START', 'uav_supi': 'UAV_A1', 'operator': 'pilot'}],
+        'transactions': [],
+        'previous_hash': '0' * 64,
+        'current_hash': '1' * 64
+    }]
+    for i in (1, 2):
+        chain.append({
+            'index': i,
+            'timestamp': 1700000000.0 + i,
+            'event_log': [],
+            'transactions': [{'type': 'TELEMETRY_TX', 'data': telemetry, 'tx_id': f'TELEM_{i}'}],
+            'previous_hash': chain[-1]['current_hash'],
+            'current_hash': str(i + 1) * 64
+        })
+    path = os.path.join(directory, 'Flight_1.json')
+    with open(path, 'w') as f:
+        json.dump(chain, f)
+    return path, chain
+
+
+class FlightMetaTests(unittest.TestCase):
+    """The streamed summary must count blocks, not keys inside transactions"""
+
+    def assert_meta(self, telemetry):
+        with tempfile.TemporaryDirectory() as directory:
+            path, chain = write_archive(directory, telemetry)
+            meta = gcs._read_flight_meta(path)
+        self.assertEqual(meta, gcs._extract_flight_meta('Flight_1.json', chain))
+        self.assertEqual(meta['blocks'], 3)
+
+    def test_plain_telemetry(self):
+        self.assert_meta({'x_pos': 1.0, 'y_pos': 2.0})
+
+    def test_telemetry_with_chain_keys(self):
+        self.assert_meta({'previous_hash': 'a' * 64, 'nested': [{'previous_hash': 'b'}]})
+
+
+if __name__ == '__main__':
+    unittest.main()
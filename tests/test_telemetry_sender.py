@@ -0,0 +1,132 @@
+"""
+Telemetry Sender Tests
+Author: Muntasir Al Mamun
+Date: 2025-11-03
+
+Drives the background telemetry sender of both UAV clients against an
+in-process fake GCS: single records, the per-record fallback and retries
+after the GCS could not be reached.
+
+Usage:
+    python -m unittest discover tests
+"""
+
+import importlib
+import importlib.util
+import json
+import os
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+CLIENT_DEPS = all(importlib.util.find_spec(name) for name in ('airsim', 'requests', 'urllib3'))
+
+if CLIENT_DEPS:
+    import requests
+
+
+class FakeResponse:
+    def __init__(self, status_code, result):
+        self.status_code = status_code
+        self.content = json.dumps(result).encode()
+        self.text = self.content.decode()
+
+
+class FakeGCS:
+    """Answers telemetry posts, refusing the first `unreachable` connections."""
+
+    def __init__(self, unreachable=0):
+        self.unreachable = unreachable
+        self.posts = []
+
+    def post(self, url, data=None, timeout=None):
+        if self.unreachable > 0:
+            self.unreachable -= 1
+            raise requests.exceptions.ConnectionError('GCS down')
+        body = json.loads(data)
+        endpoint = url.rsplit('/', 1)[1]
+        self.posts.append((endpoint, body))
+        if endpoint == 'log_telemetry_bulk':
+            return FakeResponse(200, {'status': 'TX_RECEIVED', 'results': [{}] * len(body['batch'])})
+        return FakeResponse(200, {'status': 'TX_RECEIVED'})
+
+    def tx_ids(self):
+        ids = []
+        for endpoint, body in self.posts:
+            if endpoint == 'log_telemetry_bulk':
+                ids.extend(record['tx_id'] for record in body['batch'])
+            else:
+                ids.append(body['tx_id'])
+        return ids
+
+
+@unittest.skipUnless(CLIENT_DEPS, 'airsim, requests and urllib3 are required')
+class TelemetrySenderTests(unittest.TestCase):
+    """Every queued record reaches the GCS before flush_telemetry reports success"""
+
+    MODULES = ('UAV_Client_1', 'UAV_Client_2')
+
+    def make_client(self, module, gcs):
+        """Builds a client without an AirSim connection, posting to gcs."""
+        class OfflineClient(module.UAVClient):
+            def connect_airsim(self):
+                pass
+
+        client = OfflineClient()
+        client.http = gcs
+        client.flight_id = 1
+        return client
+
+    def run_clients(self, check, unreachable=0):
+        for name in self.MODULES:
+            with self.subTest(client=name):
+                module = importlib.import_module(name)
+                saved = module.TELEMETRY_BACKOFF_BASE
+                module.TELEMETRY_BACKOFF_BASE = 0.01
+                try:
+                    gcs = FakeGCS(unreachable)
+                    check(self.make_client(module, gcs), gcs)
+                finally:
+                    module.TELEMETRY_BACKOFF_BASE = saved
+
+    def queue(self, client, count):
+        for i in range(count):
+            client.queue_telemetry({'x_pos': float(i)}, f'TELEM_TEST_{i}')
+        return [f'TELEM_TEST_{i}' for i in range(count)]
+
+    def test_single_record(self):
+        def check(client, gcs):
+            tx_ids = self.queue(client, 1)
+            self.assertTrue(client.flush_telemetry(timeout=5))
+            self.assertEqual(gcs.tx_ids(), tx_ids)
+            self.assertEqual(gcs.posts[0][0], 'log_telemetry')
+            self.assertTrue(client._sender.is_alive())
+        self.run_clients(check)
+
+    def test_bulk_batch(self):
+        def check(client, gcs):
+            tx_ids = self.queue(client, 5)
+            self.assertTrue(client.flush_telemetry(timeout=5))
+            self.assertEqual(gcs.tx_ids(), tx_ids)
+        self.run_clients(check)
+
+    def test_per_record_fallback(self):
+        def check(client, gcs):
+            client._bulk_supported = False
+            tx_ids = self.queue(client, 3)
+            self.assertTrue(client.flush_telemetry(timeout=5))
+            self.assertEqual(gcs.tx_ids(), tx_ids)
+        self.run_clients(check)
+
+    def test_unreachable_gcs_is_retried(self):
+        def check(client, gcs):
+            tx_ids = self.queue(client, 1)
+            self.assertTrue(client.flush_telemetry(timeout=5))
+            self.assertEqual(gcs.tx_ids(), tx_ids)
+        self.run_clients(check, unreachable=2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -6,11 +6,25 @@ Version: 3.0.0 - AirSim Drone Control
 """
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import time
 import hashlib
-import json
+import itertools
+import atexit
 import math
+import numpy as np
+import queue
+import sys
 import threading
+import traceback
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    import json
+    ORJSON_AVAILABLE = False
 
 # Import AirSim
 try:
@@ -21,6 +35,18 @@ except ImportError:
     AIRSIM_AVAILABLE = False
     print("⚠️  AirSim not found. Install with: pip install airsim")
 
+# AirSim RPCs are msgpack-encoded; every state read pays the decode, and the
+# pure-Python msgpack fallback is many times slower than the C extension
+if AIRSIM_AVAILABLE:
+    try:
+        import msgpack
+        MSGPACK_C_EXTENSION = msgpack.Unpacker.__module__ != 'msgpack.fallback'
+    except ImportError:
+        MSGPACK_C_EXTENSION = False
+    
+    if not MSGPACK_C_EXTENSION:
+        print("⚠️  msgpack C extension not loaded - AirSim RPCs will be slow. Reinstall with: pip install --force-reinstall msgpack")
+
 # Try to import smart landing (optional)
 try:
     from smart_landing import LandingZoneSelector
@@ -28,10 +54,91 @@ try:
 except ImportError:
     SMART_LANDING_AVAILABLE = False
 
+TELEMETRY_QUEUE_SIZE = 64  # unsent telemetry kept while the GCS is slow (oldest dropped)
+TELEMETRY_BATCH_SIZE = 5   # samples coalesced into one /log_telemetry_bulk POST
+TELEMETRY_MAX_DELAY = 5.0  # seconds a sample may wait for its batch to fill
+
+STATE_CACHE_TTL = 0.05     # seconds a fetched MultirotorState is reused
+MIN_PATH_LEG = 0.1         # meters; shorter legs are dropped from a flown path
+
+RES_STAR_LABEL = b'Expected'  # suffix the GCS appends to RAND when deriving XRES*
+
+# Hover samples that barely differ from the last logged one are skipped,
+# but one is always logged per heartbeat so the chain shows the UAV alive
+STATIONARY_POSITION_EPS = 0.25  # meters, summed over |dx| + |dy| + |dz|
+STATIONARY_SPEED_EPS = 0.1      # m/s
+TELEMETRY_HEARTBEAT = 5.0       # seconds
+
+_FLUSH = object()  # queue marker: send the current batch right away
+
+
+# =============================================================================
+# JSON ENCODING
+# =============================================================================
+
+if ORJSON_AVAILABLE:
+    json_dumps = orjson.dumps
+    json_loads = orjson.loads
+else:
+    def json_dumps(obj):
+        """Serialize a request body to compact UTF-8 JSON bytes."""
+        return json.dumps(obj, separators=(',', ':')).encode('utf-8')
+    
+    json_loads = json.loads
+
+
+def response_text(response):
+    """Decode a GCS response body for error messages."""
+    # The GCS always answers in UTF-8; response.text would run requests'
+    # charset detection because JSON responses carry no charset
+    return response.content.decode('utf-8', 'replace')
+
+
+# =============================================================================
+# CONSOLE OUTPUT
+# =============================================================================
+
+# Client messages are written by one background thread, so the flight,
+# sampling and sender threads never block on the stdout lock or a slow
+# terminal; a single queue also keeps lines from all threads in order
+_log_queue = queue.Queue()
+
+def log(message=''):
+    """Queue one console line for the writer thread."""
+    _log_queue.put(message)
+
+def flush_log():
+    """Wait until every queued console line has been written."""
+    _log_queue.join()
+
+def _log_writer():
+    """Background thread writing queued console lines in batches."""
+    while True:
+        lines = [_log_queue.get()]
+        while True:
+            try:
+                lines.append(_log_queue.get_nowait())
+            except queue.Empty:
+                break
+        
+        try:
+            sys.stdout.write('\n'.join(lines) + '\n')
+            sys.stdout.flush()
+        except Exception:
+            pass
+        finally:
+            for _ in lines:
+                _log_queue.task_done()
+
+threading.Thread(target=_log_writer, daemon=True).start()
+atexit.register(flush_log)
+
 
 class AirSimDrone:
     """AirSim drone controller."""
     
+    __slots__ = ('client', 'vehicle_name', '_state_cache')
+    
     def __init__(self, vehicle_name="Drone1"):
         """Initialize AirSim drone connection."""
         if not AIRSIM_AVAILABLE:
@@ -43,32 +150,40 @@ class AirSimDrone:
         self.client.armDisarm(True, vehicle_name)
         self.vehicle_name = vehicle_name
         
-        print(f"✅ Connected to AirSim - Vehicle: {vehicle_name}")
+        # (monotonic_time, MultirotorState) of the last state RPC; replaced
+        # as a whole so the telemetry thread never sees a torn pair
+        self._state_cache = (0.0, None)
+        
+        log(f"✅ Connected to AirSim - Vehicle: {vehicle_name}")
     
     def takeoff(self, altitude=10.0):
         """Takeoff to specified altitude."""
-        print(f"🛫 Taking off to {altitude}m...")
+        log(f"🛫 Taking off to {altitude}m...")
         self.client.takeoffAsync(vehicle_name=self.vehicle_name).join()
         
         # Move to altitude
         self.client.moveToZAsync(-altitude, velocity=2, vehicle_name=self.vehicle_name).join()
         time.sleep(1)
-        print(f"✅ Reached altitude {altitude}m")
+        log(f"✅ Reached altitude {altitude}m")
     
-    def goto(self, target, velocity=4.0):
+    def goto(self, target, velocity=4.0, precomputed_distance=None):
         """Fly to target position [x, y, z]."""
         target_x, target_y, target_z = target
         
-        # Calculate distance
-        state = self.client.getMultirotorState(vehicle_name=self.vehicle_name)
-        current_pos = state.kinematics_estimated.position
-        
-        dx = target_x - current_pos.x_val
-        dy = target_y - current_pos.y_val
-        dz = target_z - current_pos.z_val
-        distance = math.sqrt(dx**2 + dy**2 + dz**2)
+        # Calculate distance, unless the caller already knows it
+        if precomputed_distance is None:
+            state = self.client.getMultirotorState(vehicle_name=self.vehicle_name)
+            current_pos = state.kinematics_estimated.position
+            
+            distance = math.hypot(
+                target_x - current_pos.x_val,
+                target_y - current_pos.y_val,
+                target_z - current_pos.z_val
+            )
+        else:
+            distance = precomputed_distance
         
-        print(f"🎯 Flying to ({target_x:.1f}, {target_y:.1f}, {abs(target_z):.1f}m altitude) - Distance: {distance:.1f}m")
+        log(f"🎯 Flying to ({target_x:.1f}, {target_y:.1f}, {abs(target_z):.1f}m altitude) - Distance: {distance:.1f}m")
         
         # Move to position
         self.client.moveToPositionAsync(
@@ -77,18 +192,44 @@ class AirSimDrone:
             vehicle_name=self.vehicle_name
         ).join()
         
-        print(f"✅ Arrived at waypoint")
+        log(f"✅ Arrived at waypoint")
+    
+    def fly_path(self, waypoints, velocity=4.0):
+        """Fly through [x, y, z] waypoints in order with a single path command."""
+        points = np.asarray(waypoints, dtype=float)
+        legs = np.linalg.norm(np.diff(points, axis=0), axis=1)
+        
+        # Repeated points add nothing to the path follower
+        points = points[np.concatenate(([True], legs >= MIN_PATH_LEG))]
+        
+        log(f"🎯 Flying {legs.sum():.1f}m path through {len(points)} waypoints at {velocity:.1f} m/s")
+        
+        # One RPC for the whole polyline; AirSim plans through the corners
+        # instead of stopping at every waypoint
+        path = [airsim.Vector3r(x, y, z) for x, y, z in points.tolist()]
+        self.client.moveOnPathAsync(path, velocity, vehicle_name=self.vehicle_name).join()
+        
+        log(f"✅ Path complete")
     
     def land(self):
         """Land the drone."""
-        print("🛬 Landing...")
+        log("🛬 Landing...")
         self.client.landAsync(vehicle_name=self.vehicle_name).join()
         time.sleep(2)
-        print("✅ Landed")
+        log("✅ Landed")
+    
+    def get_state_cached(self, ttl=STATE_CACHE_TTL):
+        """Get the multirotor state, reusing one fetched within the last ttl seconds."""
+        fetched_at, state = self._state_cache
+        now = time.monotonic()
+        if state is None or now - fetched_at > ttl:
+            state = self.client.getMultirotorState(vehicle_name=self.vehicle_name)
+            self._state_cache = (now, state)
+        return state
     
     def get_position(self):
         """Get current position."""
-        state = self.client.getMultirotorState(vehicle_name=self.vehicle_name)
+        state = self.get_state_cached()
         pos = state.kinematics_estimated.position
         
         return {
@@ -99,10 +240,10 @@ class AirSimDrone:
     
     def get_velocity(self):
         """Get current velocity."""
-        state = self.client.getMultirotorState(vehicle_name=self.vehicle_name)
+        state = self.get_state_cached()
         vel = state.kinematics_estimated.linear_velocity
         
-        magnitude = math.sqrt(vel.x_val**2 + vel.y_val**2 + vel.z_val**2)
+        magnitude = math.hypot(vel.x_val, vel.y_val, vel.z_val)
         
         return {
             'x': vel.x_val,
@@ -121,6 +262,14 @@ class AirSimDrone:
 class UAVClientBase:
     """Base class for UAV clients with blockchain integration."""
     
+    # Default square pattern waypoints
+    WAYPOINTS = [
+        [20, 0, -10],
+        [20, 20, -10],
+        [0, 20, -10],
+        [0, 0, -10]
+    ]
+    
     def __init__(self, uav_id, uav_supi, long_term_key, flight_duration=60, 
                  api_base='http://127.0.0.1:5000/api', vehicle_name="Drone1"):
         """
@@ -137,25 +286,41 @@ class UAVClientBase:
         self.uav_id = uav_id
         self.uav_supi = uav_supi
         self.long_term_key = long_term_key
+        # SHA-256 state after absorbing the long-term key; RES* only adds RAND
+        self._res_prefix = hashlib.sha256(long_term_key.encode('utf-8'))
         self.flight_duration = flight_duration
         self.api_base = api_base
         
         self.flight_id = None
         self.session_key = None
         self.authenticated = False
+        self._tx_prefix = f'TELEM_{uav_id}_'
+        self._tx_seq = itertools.count()  # unique per-client tx id suffix
+        self._last_logged = None  # (x, y, z, vel_mag, monotonic_time) of the last queued sample
+        
+        # One pooled keep-alive session for every GCS request; connection
+        # errors are retried, POSTs are never re-sent after reaching the GCS
+        self.http = requests.Session()
+        self.http.headers.update({'Content-Type': 'application/json', 'Connection': 'keep-alive'})
+        adapter = HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=8,
+            max_retries=Retry(total=2, backoff_factor=0.1, status_forcelist=[502, 503, 504])
+        )
+        self.http.mount(api_base.split('://', 1)[0] + '://', adapter)
         
         # Initialize AirSim drone
         try:
             self.drone = AirSimDrone(vehicle_name=vehicle_name)
         except Exception as e:
-            print(f"❌ Failed to connect to AirSim: {e}")
-            print("⚠️  Make sure AirSim/Unreal Engine is running!")
+            log(f"❌ Failed to connect to AirSim: {e}")
+            log("⚠️  Make sure AirSim/Unreal Engine is running!")
             raise
         
         # Initialize Smart Landing (if available)
         if SMART_LANDING_AVAILABLE:
             self.landing_selector = LandingZoneSelector()
-            print("✅ Smart Landing System Initialized")
+            log("✅ Smart Landing System Initialized")
         else:
             self.landing_selector = None
         
@@ -163,7 +328,31 @@ class UAVClientBase:
         self.flight_active = False
         self.start_time = None
         self.telemetry_thread = None
-        self.stop_telemetry = False
+        self._stop_event = threading.Event()  # set to end telemetry sampling
+        
+        # Telemetry is posted by a background sender so sampling never
+        # waits on a GCS round trip
+        self._tx_queue = queue.Queue(maxsize=TELEMETRY_QUEUE_SIZE)
+        self._bulk_supported = True
+        # Request bodies reused for every send; only the sender thread fills
+        # and encodes them. Samples themselves stay separate dicts because
+        # they wait in the queue.
+        self._tx_template = {'flight_id': None, 'telemetry': None, 'tx_id': None}
+        self._bulk_template = {'flight_id': None, 'batch': None}
+        self._sender = threading.Thread(target=self._telemetry_sender, daemon=True)
+        self._sender.start()
+        
+        self.preconnect()
+    
+    def preconnect(self):
+        """Open the pooled GCS connection ahead of the first flight request."""
+        # The TCP (and TLS) handshake happens here instead of on start_flight;
+        # the cheap, cached status endpoint leaves the socket in the pool
+        try:
+            self.http.get(f"{self.api_base}/system_status", timeout=2)
+            return True
+        except Exception:
+            return False
     
     # =========================================================================
     # FLIGHT INITIALIZATION
@@ -172,24 +361,24 @@ class UAVClientBase:
     def start_flight(self):
         """Start a new flight and create blockchain."""
         try:
-            response = requests.post(f"{self.api_base}/start_flight", json={
+            response = self.http.post(f"{self.api_base}/start_flight", data=json_dumps({
                 'uav_supi': self.uav_supi
-            }, timeout=5)
+            }), timeout=5)
             
             if response.status_code == 200:
-                data = response.json()
+                data = json_loads(response.content)
                 self.flight_id = data['flight_id']
                 self.start_time = time.time()
                 self.flight_active = True
-                print(f"✈️  Flight {self.flight_id} started")
-                print(f"🔗 Genesis Hash: {data['genesis_hash'][:16]}...")
+                log(f"✈️  Flight {self.flight_id} started")
+                log(f"🔗 Genesis Hash: {data['genesis_hash'][:16]}...")
                 return True
             else:
-                print(f"❌ Failed to start flight: {response.text}")
+                log(f"❌ Failed to start flight: {response_text(response)}")
                 return False
                 
         except Exception as e:
-            print(f"❌ Error starting flight: {e}")
+            log(f"❌ Error starting flight: {e}")
             return False
     
     # =========================================================================
@@ -200,100 +389,204 @@ class UAVClientBase:
         """Perform 5G-AKA authentication with GCS."""
         try:
             # Step 1: Request authentication challenge
-            response = requests.post(f"{self.api_base}/authenticate", json={
+            response = self.http.post(f"{self.api_base}/authenticate", data=json_dumps({
                 'flight_id': self.flight_id,
                 'uav_supi': self.uav_supi,
                 'step': 1
-            }, timeout=5)
+            }), timeout=5)
             
             if response.status_code != 200:
-                print(f"❌ Authentication challenge failed: {response.text}")
+                log(f"❌ Authentication challenge failed: {response_text(response)}")
                 return False
             
-            challenge = response.json()
+            challenge = json_loads(response.content)
             rand = challenge['rand']
             
             # Step 2: Calculate response (RES*)
             res_star = self.calculate_res_star(rand)
             
             # Step 3: Send response to GCS
-            response = requests.post(f"{self.api_base}/authenticate", json={
+            response = self.http.post(f"{self.api_base}/authenticate", data=json_dumps({
                 'flight_id': self.flight_id,
                 'uav_supi': self.uav_supi,
                 'step': 2,
                 'res_star': res_star
-            }, timeout=5)
+            }), timeout=5)
             
             if response.status_code == 200:
-                auth_result = response.json()
+                auth_result = json_loads(response.content)
                 if auth_result['status'] == 'AUTH_SUCCESS':
                     self.session_key = auth_result['session_key']
                     self.authenticated = True
-                    print(f"🔐 Authenticated | Session Key: {self.session_key[:16]}...")
+                    log(f"🔐 Authenticated | Session Key: {self.session_key[:16]}...")
                     return True
                 else:
-                    print(f"❌ Authentication failed: {auth_result.get('reason', 'Unknown')}")
+                    log(f"❌ Authentication failed: {auth_result.get('reason', 'Unknown')}")
                     return False
             else:
-                print(f"❌ Authentication verification failed: {response.text}")
+                log(f"❌ Authentication verification failed: {response_text(response)}")
                 return False
                 
         except Exception as e:
-            print(f"❌ Authentication error: {e}")
+            log(f"❌ Authentication error: {e}")
             return False
     
     def calculate_res_star(self, rand):
         """Calculate RES* from challenge."""
-        xres_data = (self.long_term_key + str(rand) + 'Expected').encode('utf-8')
-        return hashlib.sha256(xres_data).hexdigest()[:10]
+        h = self._res_prefix.copy()
+        h.update(str(rand).encode('ascii'))
+        h.update(RES_STAR_LABEL)
+        return h.hexdigest()[:10]
     
     # =========================================================================
     # TELEMETRY LOGGING
     # =========================================================================
     
     def log_telemetry(self):
-        """Log current telemetry to blockchain."""
+        """Sample current telemetry and queue it for logging to the blockchain."""
         if not self.authenticated:
             return False
         
         try:
-            # Get current position and velocity from AirSim
-            position = self.drone.get_position()
-            velocity = self.drone.get_velocity()
-            
-            telemetry = {
-                'x_pos': position['x'],
-                'y_pos': position['y'],
-                'z_alt': position['z'],
-                'vel_mag': velocity['magnitude'],
-                'timestamp': time.time()
-            }
+            # Position and velocity come from one AirSim state RPC
+            kinematics = self.drone.get_state_cached().kinematics_estimated
+        except Exception:
+            return False
+        
+        pos = kinematics.position
+        vel = kinematics.linear_velocity
+        x, y, z = pos.x_val, pos.y_val, pos.z_val
+        vel_mag = math.hypot(vel.x_val, vel.y_val, vel.z_val)
+        now = time.monotonic()
+        
+        # Skip near-identical hover samples until the heartbeat is due
+        last = self._last_logged
+        if (last is not None
+                and now - last[4] < TELEMETRY_HEARTBEAT
+                and abs(x - last[0]) + abs(y - last[1]) + abs(z - last[2]) < STATIONARY_POSITION_EPS
+                and abs(vel_mag - last[3]) < STATIONARY_SPEED_EPS):
+            return True
+        self._last_logged = (x, y, z, vel_mag, now)
+        
+        telemetry = {
+            'x_pos': x,
+            'y_pos': y,
+            'z_alt': z,
+            'vel_mag': vel_mag,
+            'timestamp': time.time()
+        }
+        self.queue_telemetry({
+            'telemetry': telemetry,
+            'tx_id': f'{self._tx_prefix}{next(self._tx_seq)}'
+        })
+        return True
+    
+    def queue_telemetry(self, record):
+        """Queue a telemetry record for the sender, dropping the oldest if full."""
+        while True:
+            try:
+                self._tx_queue.put_nowait(record)
+                return
+            except queue.Full:
+                try:
+                    self._tx_queue.get_nowait()
+                    self._tx_queue.task_done()
+                except queue.Empty:
+                    pass
+    
+    def flush_telemetry(self):
+        """Send any partial batch now and wait until all queued telemetry is sent."""
+        self._tx_queue.put(_FLUSH)
+        self._tx_queue.join()
+    
+    def _telemetry_sender(self):
+        """Background thread posting queued telemetry to the GCS in batches, in order."""
+        while True:
+            items = [self._tx_queue.get()]
+            deadline = time.monotonic() + TELEMETRY_MAX_DELAY
             
-            # Send to GCS
-            response = requests.post(f"{self.api_base}/log_telemetry", json={
-                'flight_id': self.flight_id,
-                'telemetry': telemetry,
-                'tx_id': f'TELEM_{self.uav_id}_{int(time.time() * 1000)}'
-            }, timeout=5)
+            # Fill the batch until it is full, its oldest sample is due or a
+            # flush is requested
+            while items[-1] is not _FLUSH and len(items) < TELEMETRY_BATCH_SIZE:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    items.append(self._tx_queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
             
-            if response.status_code == 200:
-                result = response.json()
+            try:
+                batch = [item for item in items if item is not _FLUSH]
+                if batch:
+                    self.send_telemetry_batch(batch)
+            finally:
+                for _ in items:
+                    self._tx_queue.task_done()
+    
+    def send_telemetry_batch(self, batch):
+        """Post queued telemetry records in one bulk request."""
+        if self._bulk_supported and len(batch) > 1:
+            try:
+                payload = self._bulk_template
+                payload['flight_id'] = self.flight_id
+                payload['batch'] = batch
+                response = self.http.post(f"{self.api_base}/log_telemetry_bulk", data=json_dumps(payload), timeout=10)
                 
-                # Check for smart contract violations
-                if result.get('violations'):
-                    for violation in result['violations']:
-                        print(f"⚠️  {violation['contract']}: {violation['message']}")
+                if response.status_code == 200:
+                    result = json_loads(response.content)
+                    for tx_result in result.get('results', []):
+                        self.report_telemetry_result(tx_result)
+                    
+                    # Block mined notification
+                    if result['status'] == 'TX_BLOCK_ACK':
+                        log(f"📦 Block mined | Hash: {result['hash']}...")
+                    return True
+                
+                if response.status_code != 404:
+                    log(f"⚠️  Telemetry batch failed: {response.status_code}")
+                    return False
                 
-                # Check for anomalies
-                if result.get('anomaly', {}).get('anomaly'):
-                    anomaly = result['anomaly']
-                    # Only show HIGH and CRITICAL anomalies to reduce noise
-                    if anomaly.get('severity') in ['HIGH', 'CRITICAL']:
-                        print(f"🚨 ANOMALY - Severity: {anomaly.get('severity')}")
+                # Older GCS without the bulk endpoint: send one by one from now on
+                self._bulk_supported = False
+            except Exception as e:
+                log(f"⚠️  Telemetry batch error: {e}")
+                return False
+        
+        for record in batch:
+            self.send_telemetry(record)
+        return True
+    
+    def report_telemetry_result(self, result):
+        """Print the violations and anomalies the GCS reported for one sample."""
+        # Check for smart contract violations
+        if result.get('violations'):
+            for violation in result['violations']:
+                log(f"⚠️  {violation['contract']}: {violation['message']}")
+        
+        # Check for anomalies
+        if result.get('anomaly', {}).get('anomaly'):
+            anomaly = result['anomaly']
+            # Only show HIGH and CRITICAL anomalies to reduce noise
+            if anomaly.get('severity') in ['HIGH', 'CRITICAL']:
+                log(f"🚨 ANOMALY - Severity: {anomaly.get('severity')}")
+    
+    def send_telemetry(self, record):
+        """Post one queued telemetry record to the blockchain."""
+        payload = self._tx_template
+        payload['flight_id'] = self.flight_id
+        payload['telemetry'] = record['telemetry']
+        payload['tx_id'] = record['tx_id']
+        try:
+            response = self.http.post(f"{self.api_base}/log_telemetry", data=json_dumps(payload), timeout=5)
+            
+            if response.status_code == 200:
+                result = json_loads(response.content)
+                self.report_telemetry_result(result)
                 
                 # Block mined notification
                 if result['status'] == 'TX_BLOCK_ACK':
-                    print(f"📦 Block mined | Hash: {result['hash']}...")
+                    log(f"📦 Block mined | Hash: {result['hash']}...")
                 
                 return True
             else:
@@ -303,10 +596,17 @@ class UAVClientBase:
             return False
     
     def telemetry_logger_thread(self):
-        """Background thread for continuous telemetry logging."""
+        """
+        Background thread for continuous telemetry sampling.
+        
+        Only the AirSim state read happens here; the sample is queued and
+        posted by the sender thread, so tick N's HTTP POST overlaps tick
+        N+1's AirSim RPC without any extra worker pool.
+        """
         log_interval = 1  # Log every 1 second
+        next_tick = time.monotonic()
         
-        while not self.stop_telemetry and self.flight_active:
+        while self.flight_active:
             self.log_telemetry()
             
             # Show countdown
@@ -314,9 +614,13 @@ class UAVClientBase:
             remaining = self.flight_duration - elapsed
             
             if remaining > 0 and int(remaining) % 10 == 0 and int(remaining) != self.flight_duration:
-                print(f"⏳ {int(remaining)}s remaining...")
+                log(f"⏳ {int(remaining)}s remaining...")
             
-            time.sleep(log_interval)
+            # Fixed cadence without catch-up bursts after a slow sample;
+            # wakes at once when the flight ends
+            next_tick = max(next_tick + log_interval, time.monotonic())
+            if self._stop_event.wait(max(0.0, next_tick - time.monotonic())):
+                break
     
     # =========================================================================
     # FLIGHT EXECUTION
@@ -327,50 +631,40 @@ class UAVClientBase:
         Execute flight pattern. Override in subclasses.
         Default: Square pattern.
         """
-        print("🛫 Executing square flight pattern...")
+        log("🛫 Executing square flight pattern...")
         
         # Takeoff
         self.drone.takeoff(altitude=10.0)
         
-        # Square pattern waypoints
-        waypoints = [
-            [20, 0, -10],
-            [20, 20, -10],
-            [0, 20, -10],
-            [0, 0, -10]
-        ]
-        
-        for i, waypoint in enumerate(waypoints, 1):
-            print(f"📍 Waypoint {i}/4")
-            self.drone.goto(waypoint, velocity=4.0)
+        self.drone.fly_path(self.WAYPOINTS, velocity=4.0)
     
     def run(self):
         """Main flight execution loop."""
-        print(f"\n{'='*60}")
-        print(f"🚁 UAV Client - {self.uav_id}")
-        print(f"📋 SUPI: {self.uav_supi}")
-        print(f"⏱️  Duration: {self.flight_duration}s")
-        print(f"🔗 GCS API: {self.api_base}")
-        print(f"{'='*60}\n")
+        log(f"\n{'='*60}")
+        log(f"🚁 UAV Client - {self.uav_id}")
+        log(f"📋 SUPI: {self.uav_supi}")
+        log(f"⏱️  Duration: {self.flight_duration}s")
+        log(f"🔗 GCS API: {self.api_base}")
+        log(f"{'='*60}\n")
         
         # Step 1: Start flight
         if not self.start_flight():
-            print("❌ Flight start failed. Aborting.")
+            log("❌ Flight start failed. Aborting.")
             return False
         
         time.sleep(0.5)
         
         # Step 2: Authenticate
         if not self.authenticate():
-            print("❌ Authentication failed. Aborting.")
+            log("❌ Authentication failed. Aborting.")
             self.emergency_shutdown()
             return False
         
         time.sleep(0.5)
         
         # Step 3: Start telemetry logging thread
-        print(f"\n📡 Starting telemetry logging (every 1s for {self.flight_duration}s)...\n")
-        self.stop_telemetry = False
+        log(f"\n📡 Starting telemetry logging (every 1s for {self.flight_duration}s)...\n")
+        self._stop_event.clear()
         self.telemetry_thread = threading.Thread(target=self.telemetry_logger_thread, daemon=True)
         self.telemetry_thread.start()
         
@@ -383,40 +677,41 @@ class UAVClientBase:
             remaining = max(0, self.flight_duration - elapsed)
             
             if remaining > 0:
-                print(f"\n⏳ Hovering for {int(remaining)}s...")
+                log(f"\n⏳ Hovering for {int(remaining)}s...")
                 time.sleep(remaining)
             
             # Stop telemetry logging
-            self.stop_telemetry = True
+            self._stop_event.set()
             if self.telemetry_thread:
                 self.telemetry_thread.join(timeout=2)
             
             # Step 6: Smart Landing
-            print(f"\n{'='*60}")
-            print("🛬 Initiating landing sequence...")
-            print(f"{'='*60}")
+            log(f"\n{'='*60}")
+            log("🛬 Initiating landing sequence...")
+            log(f"{'='*60}")
             
             self.execute_smart_landing()
             
         except KeyboardInterrupt:
-            print("\n⚠️  Flight interrupted by user!")
-            self.stop_telemetry = True
+            log("\n⚠️  Flight interrupted by user!")
+            self._stop_event.set()
             self.emergency_shutdown()
             return False
         except Exception as e:
-            print(f"\n❌ Flight error: {e}")
-            import traceback
-            traceback.print_exc()
-            self.stop_telemetry = True
+            log(f"\n❌ Flight error: {e}")
+            self._stop_event.set()
             self.emergency_shutdown()
+            # Formatted only once the drone is down; landing comes first
+            flush_log()
+            traceback.print_exception(e)
             return False
         
         # Step 7: End flight and archive
         self.end_flight()
         
-        print(f"\n{'='*60}")
-        print(f"✅ Flight {self.flight_id} completed successfully")
-        print(f"{'='*60}\n")
+        log(f"\n{'='*60}")
+        log(f"✅ Flight {self.flight_id} completed successfully")
+        log(f"{'='*60}\n")
         
         return True
     
@@ -428,7 +723,7 @@ class UAVClientBase:
         """Execute smart landing with safety checks."""
         if not SMART_LANDING_AVAILABLE or self.landing_selector is None:
             # Fallback to simple landing
-            print("🛬 Landing at current position...")
+            log("🛬 Landing at current position...")
             self.drone.land()
             return
         
@@ -436,12 +731,12 @@ class UAVClientBase:
         current_pos = self.drone.get_position()
         x, y, z = current_pos['x'], current_pos['y'], current_pos['z']
         
-        print(f"📍 Current position: ({x:.2f}, {y:.2f}, {abs(z):.2f}m altitude)")
+        log(f"📍 Current position: ({x:.2f}, {y:.2f}, {abs(z):.2f}m altitude)")
         
         # Get smart landing instructions
         instructions = self.landing_selector.get_landing_instructions(x, y, z)
         
-        print(instructions['message'])
+        log(instructions['message'])
         
         if instructions['action'] == 'redirect':
             # Need to fly to safe zone first
@@ -449,20 +744,21 @@ class UAVClientBase:
             safe_y = instructions['y']
             distance = instructions['distance']
             
-            print(f"🔄 Redirecting to safe landing zone ({safe_x:.1f}, {safe_y:.1f})")
-            print(f"📏 Distance: {distance:.1f}m")
+            log(f"🔄 Redirecting to safe landing zone ({safe_x:.1f}, {safe_y:.1f})")
+            log(f"📏 Distance: {distance:.1f}m")
             
             # Fly to safe zone
-            self.drone.goto([safe_x, safe_y, z], velocity=2.0)
+            # Same altitude, so the planner's horizontal distance is the leg
+            self.drone.goto([safe_x, safe_y, z], velocity=2.0, precomputed_distance=distance)
             
             # Verify arrival
             new_pos = self.drone.get_position()
-            print(f"✅ Arrived at safe zone: ({new_pos['x']:.2f}, {new_pos['y']:.2f})")
+            log(f"✅ Arrived at safe zone: ({new_pos['x']:.2f}, {new_pos['y']:.2f})")
         
         # Execute landing
-        print("🛬 Landing at safe zone...")
+        log("🛬 Landing at safe zone...")
         self.drone.land()
-        print("✅ Landed safely")
+        log("✅ Landed safely")
     
     # =========================================================================
     # FLIGHT TERMINATION
@@ -473,46 +769,73 @@ class UAVClientBase:
         if not self.flight_id:
             return
         
+        # Telemetry still in the queue must reach the chain before it is archived
+        self.flush_telemetry()
+        
         try:
-            response = requests.post(f"{self.api_base}/end_flight", json={
+            response = self.http.post(f"{self.api_base}/end_flight", data=json_dumps({
                 'flight_id': self.flight_id
-            }, timeout=10)  # Increased timeout
+            }), timeout=10)  # Increased timeout
             
             if response.status_code == 200:
-                print(f"📦 Flight {self.flight_id} archived successfully")
+                log(f"📦 Flight {self.flight_id} archived successfully")
                 self.flight_active = False
                 return True
             else:
-                print(f"⚠️  Failed to archive flight: {response.text}")
+                log(f"⚠️  Failed to archive flight: {response_text(response)}")
                 return False
                 
         except Exception as e:
-            print(f"⚠️  Error ending flight: {e}")
+            log(f"⚠️  Error ending flight: {e}")
             return False
     
     def emergency_shutdown(self):
         """Emergency shutdown procedure."""
-        print("\n" + "!"*60)
-        print("⚠️  EMERGENCY SHUTDOWN")
-        print("!"*60)
+        log("\n" + "!"*60)
+        log("⚠️  EMERGENCY SHUTDOWN")
+        log("!"*60)
         
         try:
             # Stop telemetry
-            self.stop_telemetry = True
+            self._stop_event.set()
             
             # Emergency land
-            print("🛬 Emergency landing...")
+            log("🛬 Emergency landing...")
             self.drone.land()
             
             # Try to end flight gracefully
             if self.flight_id:
-                print("📦 Archiving flight data...")
+                log("📦 Archiving flight data...")
                 self.end_flight()
             
-            print("✅ Emergency shutdown complete")
+            log("✅ Emergency shutdown complete")
             
         except Exception as e:
-            print(f"❌ Emergency shutdown error: {e}")
+            log(f"❌ Emergency shutdown error: {e}")
+
+
+# =============================================================================
+# WAYPOINT GENERATION
+# =============================================================================
+
+def circle_waypoints(n, radius, cx, cy, z):
+    """Returns n [x, y, z] waypoints evenly spaced on a circle."""
+    angles = np.linspace(0, 2 * np.pi, n, endpoint=False)
+    return np.stack([
+        cx + radius * np.cos(angles),
+        cy + radius * np.sin(angles),
+        np.full(n, z)
+    ], axis=1).tolist()
+
+def figure_eight_waypoints(n, radius, cx, cy, z):
+    """Returns n [x, y, z] waypoints along a figure-eight (lemniscate of Gerono)."""
+    t = np.linspace(0, 2 * np.pi, n, endpoint=False)
+    sin_t = np.sin(t)
+    return np.stack([
+        cx + radius * sin_t,
+        cy + radius * sin_t * np.cos(t),
+        np.full(n, z)
+    ], axis=1).tolist()
 
 
 # =============================================================================
@@ -524,63 +847,41 @@ class SquarePatternUAV(UAVClientBase):
     
     def execute_flight_pattern(self):
         """Execute square flight pattern."""
-        print("🛫 Square Pattern (20m x 20m)\n")
+        log("🛫 Square Pattern (20m x 20m)\n")
         
         self.drone.takeoff(altitude=10.0)
         
-        waypoints = [
-            [20, 0, -10],
-            [20, 20, -10],
-            [0, 20, -10],
-            [0, 0, -10]
-        ]
-        
-        for i, wp in enumerate(waypoints, 1):
-            print(f"\n📍 Waypoint {i}/4")
-            self.drone.goto(wp, velocity=4.0)
+        self.drone.fly_path(self.WAYPOINTS, velocity=4.0)
 
 
 class CircularPatternUAV(UAVClientBase):
     """UAV that flies a circular pattern."""
     
+    # Circle with 8 points, precomputed once for every flight
+    WAYPOINTS = circle_waypoints(8, radius=15, cx=15, cy=15, z=-10)
+    
     def execute_flight_pattern(self):
         """Execute circular flight pattern."""
-        print("🛫 Circular Pattern (radius 15m)\n")
+        log("🛫 Circular Pattern (radius 15m)\n")
         
         self.drone.takeoff(altitude=10.0)
         
-        # Circle with 8 points
-        radius = 15
-        center_x, center_y = 15, 15
-        
-        for i in range(8):
-            angle = (2 * math.pi * i) / 8
-            x = center_x + radius * math.cos(angle)
-            y = center_y + radius * math.sin(angle)
-            
-            print(f"\n📍 Waypoint {i+1}/8")
-            self.drone.goto([x, y, -10], velocity=4.0)
+        self.drone.fly_path(self.WAYPOINTS, velocity=4.0)
 
 
 class FigureEightPatternUAV(UAVClientBase):
     """UAV that flies a figure-eight pattern."""
     
+    # 16 points, precomputed once for every flight
+    WAYPOINTS = figure_eight_waypoints(16, radius=10, cx=15, cy=15, z=-10)
+    
     def execute_flight_pattern(self):
         """Execute figure-eight flight pattern."""
-        print("🛫 Figure-Eight Pattern\n")
+        log("🛫 Figure-Eight Pattern\n")
         
         self.drone.takeoff(altitude=10.0)
         
-        radius = 10
-        center_x, center_y = 15, 15
-        
-        for i in range(16):
-            t = (2 * math.pi * i) / 16
-            x = center_x + radius * math.sin(t)
-            y = center_y + radius * math.sin(t) * math.cos(t)
-            
-            print(f"\n📍 Waypoint {i+1}/16")
-            self.drone.goto([x, y, -10], velocity=4.0)
+        self.drone.fly_path(self.WAYPOINTS, velocity=4.0)
 
 
 # =============================================================================
@@ -0,0 +1,12 @@
+"""
+WSGI Entry Point for the GCS Leader Node
+Author: Muntasir Al Mamun
+Date: 2025-11-03
+
+Usage:
+    gunicorn wsgi:app
+"""
+
+from GCS_LeaderNode import app
+
+__all__ = ['app']